@@ -1,11 +1,20 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog, scrolledtext
+from tkinter import ttk, messagebox, simpledialog, scrolledtext, filedialog
 import subprocess
 import threading
 import os
 import socket
 import webbrowser
 import json
+import csv
+import errno
+import math
+import http.client
+import queue
+import selectors
+import signal
+import time
+from collections import deque
 
 # ================= CONFIGURACIÓN =================
 SERVER_DIR = "server"
@@ -13,6 +22,41 @@ CLIENT_DIR = "client"
 SERVER_PORT = "1002"
 CLIENT_PORT = "5173"
 
+# --- MONITOR DE PUERTOS ---
+MONITOR_PORTS = [("SERVER", SERVER_PORT), ("CLIENT", CLIENT_PORT)]  # (etiqueta, puerto); se sondean todos a la vez
+MONITOR_HOST = "127.0.0.1"
+MONITOR_INTERVAL = 5.0    # Segundos entre rondas de sondeo
+MONITOR_TIMEOUT = 0.5     # Segundos máximos por ronda (todos los puertos en paralelo)
+MONITOR_POLL_MS = 200     # Cada cuánto la UI recoge resultados de la cola
+MONITOR_HISTORY = 30      # Muestras de latencia por puerto en el sparkline
+
+# --- SALUD DE LA API (server/controllers/health.controller.js) ---
+HEALTH_PATH = "/api/health"
+HEALTH_INTERVAL = 2.0     # Segundos entre consultas (menos que el keep-alive de Node, 5 s: se reusa la conexión)
+HEALTH_TIMEOUT = 2.0
+HEALTH_WINDOWS = [("1 min", 60), ("5 min", 300), ("15 min", 900)]  # Ventanas deslizantes de percentiles
+HEALTH_KEEP_SAMPLES = 43200  # ~24 h de muestras para exportar a CSV
+HEALTH_SHOW_EVENTS = 6    # Transiciones visibles en el dashboard
+
+# --- COMANDOS EN SEGUNDO PLANO ---
+RUN_POLL_MS = 100         # Cada cuánto pasan a la consola las líneas de los comandos en curso
+RUN_BATCH_LINES = 5000    # Máximo de líneas por pasada; el resto espera a la siguiente
+
+# --- TRABAJOS (cola de comandos) ---
+JOB_MAX_CONCURRENCY = 3   # Comandos corriendo a la vez como máximo
+JOB_HISTORY = 200         # Trabajos terminados que se conservan en el panel
+LOCK_GIT = "git"          # Recursos con nombre: dos trabajos con el mismo lock nunca corren a la vez
+LOCK_NPM_CLIENT = "npm-client"
+LOCK_NPM_SERVER = "npm-server"
+LOCK_PROCS = "procesos"   # Matar/arrancar procesos de los servicios
+JOB_ACTIVE = ("en cola", "corriendo")
+
+# --- CONSOLA ---
+CONSOLE_MAX_LINES = 5000  # Tope del búfer circular (y de la consola): lo más viejo se descarta
+CONSOLE_FRAME_MS = 16     # La consola se vuelca como mucho una vez por cuadro (~60 fps)
+CONSOLE_FILTERS = [("Todo", None), ("Comandos", "cmd"), ("Errores", "error"), ("Éxitos", "success"), ("Salida", "norm")]
+CONSOLE_PREFIX = {"cmd": ("> ", "cmd"), "error": ("❌ ", "err"), "success": ("✅ ", "suc")} # type -> (prefijo, tag)
+
 # --- PALETA DE COLORES "MATERIAL CYBER" ---
 COL_BG = "#121212"        # Fondo Principal (Casi negro)
 COL_SURFACE = "#1E1E1E"   # Fondo de Tarjetas/Paneles
@@ -27,6 +71,388 @@ COL_OFF = "#424242"       # Gris Apagado (Puerto cerrado)
 
 APP_TITLE = "MQERK COMMANDER v5.0 Ultimate"
 
+# connect_ex en un socket no bloqueante: "conectando" (Windows usa WSAEWOULDBLOCK)
+_CONNECT_PENDING = {errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY, getattr(errno, "WSAEWOULDBLOCK", errno.EWOULDBLOCK)}
+
+
+class PortMonitor(threading.Thread):
+    """Hilo que sondea todos los puertos a la vez cada `interval` segundos.
+
+    Abre un socket no bloqueante por puerto y espera a todos juntos con selectors, así
+    que una ronda dura como mucho `timeout` aunque haya muchos puertos. No toca Tk:
+    deja (puerto, latencia en ms o None si está cerrado, hora) en `results`.
+    """
+
+    def __init__(self, ports, interval=MONITOR_INTERVAL, timeout=MONITOR_TIMEOUT, host=MONITOR_HOST):
+        super().__init__(daemon=True)
+        self.ports = list(ports)
+        self.interval = interval
+        self.timeout = timeout
+        self.host = host
+        self.results = queue.Queue()
+        self.stopped = threading.Event()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        while not self.stopped.is_set():
+            now = time.time()
+            for port, latency in self.probe_all().items():
+                self.results.put((port, latency, now))
+            self.stopped.wait(self.interval)
+
+    def probe_all(self):
+        """{puerto: ms hasta aceptar la conexión, o None si no escucha o no contestó a tiempo}"""
+        results = {}
+        sel = selectors.DefaultSelector()
+        try:
+            for port in self.ports:
+                results[port] = None # Cualquier fallo al sondear cuenta como cerrado
+                s = None
+                try:
+                    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                    s.setblocking(False)
+                    start = time.perf_counter()
+                    err = s.connect_ex((self.host, int(port)))
+                    if err in _CONNECT_PENDING:
+                        sel.register(s, selectors.EVENT_WRITE, (port, start))
+                        s = None # Ahora lo cierra quien lo saque del selector
+                    elif err == 0:
+                        results[port] = (time.perf_counter() - start) * 1000
+                except Exception:
+                    pass
+                finally:
+                    if s is not None: s.close()
+            deadline = time.perf_counter() + self.timeout
+            while sel.get_map():
+                left = deadline - time.perf_counter()
+                if left <= 0:
+                    break
+                for key, _ in sel.select(left):
+                    port, start = key.data
+                    try:
+                        if key.fileobj.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                            results[port] = (time.perf_counter() - start) * 1000
+                    except Exception:
+                        pass
+                    finally:
+                        sel.unregister(key.fileobj)
+                        key.fileobj.close()
+        finally:
+            # Los que no contestaron a tiempo (o quedaron tras un error) se quedan como cerrados
+            for key in list(sel.get_map().values()):
+                sel.unregister(key.fileobj)
+                key.fileobj.close()
+            sel.close()
+        return results
+
+
+class HealthMonitor(threading.Thread):
+    """Hilo que consulta /api/health cada `interval` segundos con una sola conexión keep-alive.
+
+    Cada consulta deja en `results` un dict con time, latency_ms, status, api_ok, db_ok,
+    error y server_time. Si el servidor cerró la conexión reutilizada se reintenta una
+    vez con una nueva; cualquier otro fallo cuenta como API caída.
+    """
+
+    def __init__(self, host=MONITOR_HOST, port=SERVER_PORT, path=HEALTH_PATH, interval=HEALTH_INTERVAL, timeout=HEALTH_TIMEOUT):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = int(port)
+        self.path = path
+        self.interval = interval
+        self.timeout = timeout
+        self.conn = None
+        self.results = queue.Queue()
+        self.stopped = threading.Event()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.results.put(self.check())
+            self.stopped.wait(self.interval)
+        self._close()
+
+    def _close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def check(self):
+        sample = {"time": time.time(), "latency_ms": None, "status": None, "api_ok": False,
+                  "db_ok": None, "error": None, "server_time": None}
+        for attempt in (0, 1):
+            reused = self.conn is not None
+            try:
+                if self.conn is None:
+                    self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                start = time.perf_counter()
+                self.conn.request("GET", self.path, headers={"Connection": "keep-alive"})
+                resp = self.conn.getresponse()
+                body = resp.read() # Leer todo para poder reutilizar la conexión
+                sample["latency_ms"] = (time.perf_counter() - start) * 1000
+                sample["status"] = resp.status
+                break
+            except (ConnectionResetError, BrokenPipeError, http.client.RemoteDisconnected) as e:
+                self._close()
+                if reused and not attempt: continue # El servidor cerró la conexión ociosa
+                sample["error"] = str(e) or type(e).__name__
+                return sample
+            except (OSError, http.client.HTTPException) as e:
+                self._close()
+                sample["error"] = str(e) or type(e).__name__
+                return sample
+        try:
+            data = json.loads(body)
+        except ValueError:
+            sample["error"] = "respuesta no JSON"
+            return sample
+        if not isinstance(data, dict): # JSON válido pero no el objeto de /health (p. ej. null o una lista)
+            sample["error"] = "respuesta JSON inesperada"
+            return sample
+        db = data.get("db")
+        if not isinstance(db, dict): db = {}
+        sample["api_ok"] = sample["status"] == 200
+        sample["db_ok"] = bool(db.get("ok"))
+        sample["error"] = db.get("error")
+        sample["server_time"] = data.get("timestamp")
+        return sample
+
+
+def percentile(sorted_values, pct):
+    """Percentil por rango más cercano de una lista ya ordenada."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+class HealthStats:
+    """Historial de muestras de /health: percentiles por ventana, transiciones y CSV. Sólo lo usa el hilo de Tk."""
+
+    def __init__(self, keep=HEALTH_KEEP_SAMPLES):
+        self.samples = deque(maxlen=keep)
+        self.state = None # "ok", "db caída" o "api caída"
+        self.since = None
+
+    @staticmethod
+    def state_of(sample):
+        if not sample["api_ok"]: return "api caída"
+        return "ok" if sample["db_ok"] else "db caída"
+
+    def add(self, sample):
+        """Guarda la muestra; devuelve el texto de la transición si cambió el estado."""
+        state = self.state_of(sample)
+        sample["event"] = None
+        if state != self.state:
+            if self.state is not None: sample["event"] = f"{self.state} -> {state}"
+            self.state, self.since = state, sample["time"]
+        self.samples.append(sample)
+        return sample["event"]
+
+    def percentiles(self, seconds, now=None):
+        """(n, p50, p95, p99) de las latencias de los últimos `seconds` segundos."""
+        cutoff = (now or time.time()) - seconds
+        values = []
+        for s in reversed(self.samples):
+            if s["time"] < cutoff: break
+            if s["latency_ms"] is not None: values.append(s["latency_ms"])
+        values.sort()
+        return len(values), percentile(values, 50), percentile(values, 95), percentile(values, 99)
+
+    def events(self):
+        return [s for s in self.samples if s["event"]]
+
+    def write_csv(self, path):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["fecha", "latencia_ms", "http", "api_ok", "db_ok", "estado", "evento", "error", "hora_servidor"])
+            for s in self.samples:
+                w.writerow([time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(s["time"])),
+                            f"{s['latency_ms']:.1f}" if s["latency_ms"] is not None else "",
+                            s["status"] or "", int(s["api_ok"]), "" if s["db_ok"] is None else int(s["db_ok"]),
+                            self.state_of(s), s["event"] or "", s["error"] or "", s["server_time"] or ""])
+
+
+class StreamedProcess:
+    """Comando de shell con stdout y stderr leídos línea a línea por dos hilos.
+
+    Los hilos sólo leen de las tuberías (en Windows no hay lectura no bloqueante de
+    pipes) y dejan (flujo, línea) en `lines`; el hilo de Tk las recoge con drain().
+    """
+
+    def __init__(self, cmd, cwd=None):
+        self.cmd = cmd
+        self.lines = queue.Queue()
+        self.start = time.perf_counter()
+        self._open = 2 # Tuberías que aún no llegaron a EOF
+        # En POSIX, sesión propia para poder matar el grupo entero (la shell y sus hijos)
+        self.proc = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd,
+                                     text=True, errors="replace", bufsize=1, start_new_session=(os.name != "nt"))
+        for stream, pipe in (("out", self.proc.stdout), ("err", self.proc.stderr)):
+            threading.Thread(target=self._read, args=(stream, pipe), daemon=True).start()
+
+    def _read(self, stream, pipe):
+        with pipe:
+            for line in pipe:
+                self.lines.put((stream, line.rstrip("\r\n")))
+        self.lines.put((stream, None))
+
+    def drain(self, limit=RUN_BATCH_LINES):
+        """Hasta `limit` líneas (flujo, texto) pendientes, sin esperar."""
+        out = []
+        try:
+            while len(out) < limit:
+                stream, line = self.lines.get_nowait()
+                if line is None: self._open -= 1
+                else: out.append((stream, line))
+        except queue.Empty:
+            pass
+        return out
+
+    @property
+    def finished(self):
+        return self._open == 0 and self.lines.empty() and self.proc.poll() is not None
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def kill_tree(self):
+        """Mata la shell y todo lo que lanzó (npm, node, git…), sin esperar"""
+        if self.proc.poll() is not None: return
+        if os.name == "nt":
+            # taskkill tarda: en un hilo para no congelar la UI
+            threading.Thread(target=subprocess.run, args=(f"taskkill /F /T /PID {self.proc.pid}",),
+                             kwargs={"shell": True, "capture_output": True}, daemon=True).start()
+        else:
+            try: os.killpg(self.proc.pid, signal.SIGTERM)
+            except ProcessLookupError: pass
+
+
+class Job:
+    """Un comando en la cola de JobScheduler, con su estado y tiempos."""
+
+    _ids = 0
+
+    def __init__(self, cmd, cwd=None, name=None, locks=(), after=(), on_done=None, check=True):
+        Job._ids += 1
+        self.id = Job._ids
+        self.cmd = cmd
+        self.cwd = cwd
+        self.name = name or cmd
+        self.locks = frozenset(locks)
+        self.after = list(after) # Trabajos que deben terminar bien antes
+        self.on_done = on_done # on_done(job) en el hilo de Tk al terminar (en cualquier estado)
+        self.check = check # False: termina "ok" con cualquier código de salida (p. ej. matar algo que no corría)
+        self.status = "en cola" # en cola, corriendo, ok, error, cancelado, omitido
+        self.proc = None
+        self.returncode = None
+        self.error = None # Por qué no se pudo lanzar
+        self.cancelled = False
+        self.created = time.time()
+        self.started = None # perf_counter
+        self.ended = None
+
+    @property
+    def duration(self):
+        if self.started is None: return None
+        return (self.ended or time.perf_counter()) - self.started
+
+
+class JobScheduler:
+    """Cola de trabajos que maneja el hilo de Tk (no tiene hilo propio).
+
+    schedule() arranca, en orden de llegada, los que están listos: dependencias
+    terminadas bien, ninguno de sus locks ocupado y menos de `max_concurrency`
+    corriendo. Un trabajo en cola reserva sus locks para los que llegaron después,
+    así los comandos que comparten recurso (p. ej. git) corren en el orden pedido.
+    """
+
+    def __init__(self, max_concurrency=JOB_MAX_CONCURRENCY, history=JOB_HISTORY):
+        self.max_concurrency = max_concurrency
+        self.history = history
+        self.jobs = [] # En orden de llegada
+
+    def submit(self, cmd, cwd=None, name=None, locks=(), after=(), on_done=None, check=True):
+        job = Job(cmd, cwd, name, locks, after, on_done, check)
+        self.jobs.append(job)
+        return job
+
+    @property
+    def running(self):
+        return [j for j in self.jobs if j.status == "corriendo"]
+
+    def schedule(self):
+        """Arranca lo que se pueda; devuelve (arrancados, terminados sin correr: omitidos o fallidos al lanzar)."""
+        started, dropped = [], []
+        busy = set().union(*(j.locks for j in self.running))
+        slots = self.max_concurrency - len(self.running)
+        for job in self.jobs:
+            if job.status != "en cola": continue
+            if any(d.status in ("error", "cancelado", "omitido") for d in job.after):
+                self._finish(job, "omitido")
+                dropped.append(job)
+                continue
+            ready = slots > 0 and all(d.status == "ok" for d in job.after) and not (job.locks & busy)
+            busy |= job.locks # Corra o no, nadie posterior se le adelanta en esos recursos
+            if not ready: continue
+            try:
+                job.proc = StreamedProcess(job.cmd, job.cwd)
+            except Exception as e:
+                job.error = str(e)
+                self._finish(job, "error")
+                dropped.append(job)
+                continue
+            job.status = "corriendo"
+            job.started = job.proc.start
+            slots -= 1
+            started.append(job)
+        return started, dropped
+
+    def reap(self, job):
+        """Si el proceso del trabajo ya terminó, lo cierra con su estado. Devuelve True si terminó."""
+        if job.status != "corriendo" or not job.proc.finished: return False
+        job.returncode = job.proc.proc.returncode
+        self._finish(job, "cancelado" if job.cancelled else ("ok" if job.returncode == 0 or not job.check else "error"))
+        return True
+
+    def cancel(self, job):
+        """En cola: se descarta. Corriendo: se mata el árbol de procesos y queda cancelado al salir."""
+        if job.status == "en cola":
+            self._finish(job, "cancelado")
+        elif job.status == "corriendo":
+            job.cancelled = True
+            job.proc.kill_tree()
+
+    def _finish(self, job, status):
+        job.status = status
+        job.ended = time.perf_counter()
+        if job.started is None: job.started = job.ended
+
+    def prune(self):
+        """Olvida los terminados más viejos por encima de `history`."""
+        done = [j for j in self.jobs if j.status not in JOB_ACTIVE]
+        drop = set(map(id, done[:max(0, len(done) - self.history)]))
+        if drop: self.jobs = [j for j in self.jobs if id(j) not in drop]
+
+    def clear_finished(self):
+        self.jobs = [j for j in self.jobs if j.status in JOB_ACTIVE]
+
+
+def default_locks(cmd, cwd=None):
+    """Recursos que toca un comando, deducidos de cómo empieza y de su carpeta"""
+    c = cmd.strip().lower()
+    if c.startswith("git "): return {LOCK_GIT}
+    if c.startswith("npm "):
+        folder = os.path.basename(os.path.normpath(cwd or os.getcwd()))
+        return {LOCK_NPM_SERVER} if folder == SERVER_DIR else {LOCK_NPM_CLIENT}
+    return set()
+
+
 class MqerkCommander:
     def __init__(self, root):
         self.root = root
@@ -36,15 +462,27 @@ class MqerkCommander:
         
         self.local_ip = self.get_local_ip()
         self.is_busy = False
-        self.port_status = {SERVER_PORT: False, CLIENT_PORT: False}
+        self.jobs = JobScheduler()
+        self.job_rows = {} # Job -> iid en el panel de trabajos
+        self.console_queue = queue.SimpleQueue() # (type, msg) desde cualquier hilo; sólo Tk la vacía
+        self.console_lines = deque(maxlen=CONSOLE_MAX_LINES) # Búfer circular: el filtro y la búsqueda trabajan aquí
+        self.console_shown = 0 # Líneas que hay ahora en el widget
+        self.port_status = {port: False for _, port in MONITOR_PORTS}
+        self.port_history = {port: deque(maxlen=MONITOR_HISTORY) for _, port in MONITOR_PORTS} # Latencias (ms o None)
         self.indicators = {} # Referencias a los widgets canvas
+        self.monitor = None
+        self.health = None
+        self.health_stats = HealthStats()
 
         self.setup_styles()
         self.create_ui()
         
         # Init Loops
+        self.flush_console()
+        self.pump_jobs()
         self.check_git_status()
         self.start_port_monitor() # Iniciar el loop del monitor
+        self.start_health_monitor()
         self.log("✨ MQERK COMMANDER v5.0 Cargado.", "success")
 
     def get_local_ip(self):
@@ -86,6 +524,11 @@ class MqerkCommander:
         style.configure("Info.TButton", foreground=COL_ACCENT)
         style.map("Info.TButton", background=[("active", COL_ACCENT)], foreground=[("active", "black")])
 
+        # Tabla de trabajos
+        style.configure("Treeview", background=COL_SURFACE, fieldbackground=COL_SURFACE, foreground=COL_TEXT, borderwidth=0, rowheight=22)
+        style.configure("Treeview.Heading", background=COL_BTN_BG, foreground="gray", borderwidth=0, font=("Segoe UI", 8, "bold"))
+        style.map("Treeview", background=[("selected", COL_BTN_HOVER)], foreground=[("selected", COL_ACCENT)])
+
     # ================= CONSTRUCCIÓN UI =================
     def create_ui(self):
         # 1. HEADER
@@ -107,10 +550,12 @@ class MqerkCommander:
         self.tab_dash = ttk.Frame(self.notebook, style="Card.TFrame"); self.notebook.add(self.tab_dash, text="DASHBOARD")
         self.tab_git = ttk.Frame(self.notebook, style="Card.TFrame"); self.notebook.add(self.tab_git, text="GIT CONTROL")
         self.tab_tools = ttk.Frame(self.notebook, style="Card.TFrame"); self.notebook.add(self.tab_tools, text="HERRAMIENTAS")
+        self.tab_jobs = ttk.Frame(self.notebook, style="Card.TFrame"); self.notebook.add(self.tab_jobs, text="TRABAJOS")
         
         self.build_dashboard()
         self.build_git()
         self.build_tools()
+        self.build_jobs()
 
         # 3. CONSOLA
         console_frame = tk.Frame(self.root, bg=COL_BG)
@@ -121,11 +566,24 @@ class MqerkCommander:
         tk.Label(bar, text="TERMINAL OUTPUT", font=("Consolas", 7, "bold"), fg="#555", bg=COL_BG).pack(side="left")
         tk.Button(bar, text="✖ Limpiar", command=self.clear_console, bg=COL_BG, fg="gray", bd=0, font=("Arial", 7), cursor="hand2").pack(side="right")
 
+        # Filtro por nivel y búsqueda (sobre el búfer, no sobre el widget)
+        self.lbl_console_count = tk.Label(bar, text="", font=("Consolas", 7), fg="#555", bg=COL_BG)
+        self.lbl_console_count.pack(side="right", padx=10)
+        self.console_search = tk.StringVar()
+        self.console_search.trace_add("write", lambda *_: self.refresh_console())
+        tk.Entry(bar, textvariable=self.console_search, width=18, bg="#222", fg=COL_TEXT, insertbackground=COL_TEXT, bd=0, font=("Consolas", 8)).pack(side="right", padx=4)
+        tk.Label(bar, text="🔍", bg=COL_BG, fg="gray", font=("Arial", 7)).pack(side="right")
+        self.console_filter = tk.StringVar(value=CONSOLE_FILTERS[0][0])
+        cb = ttk.Combobox(bar, textvariable=self.console_filter, values=[name for name, _ in CONSOLE_FILTERS], state="readonly", width=9)
+        cb.pack(side="right", padx=4)
+        cb.bind("<<ComboboxSelected>>", lambda _: self.refresh_console())
+
         self.console = scrolledtext.ScrolledText(console_frame, height=6, bg="#0F0F0F", fg=COL_SUCCESS, font=("Consolas", 9), state='disabled', bd=0, highlightthickness=0)
         self.console.pack(fill="x")
         self.console.tag_config("err", foreground=COL_DANGER)
         self.console.tag_config("cmd", foreground="gray")
         self.console.tag_config("suc", foreground=COL_SUCCESS)
+        self.console.tag_config("hit", background="#3A3A00")
 
     # ================= DASHBOARD + MONITOR EN VIVO =================
     def build_dashboard(self):
@@ -138,12 +596,10 @@ class MqerkCommander:
         
         tk.Label(f_monitor, text="ESTADO DE PUERTOS (LIVE)", fg="gray", bg=COL_SURFACE, font=("Segoe UI", 8, "bold")).pack(side="left")
         
-        # Indicador Server
-        self.create_indicator(f_monitor, "SERVER", SERVER_PORT)
-        # Separador
-        tk.Frame(f_monitor, width=20, bg=COL_SURFACE).pack(side="left")
-        # Indicador Client
-        self.create_indicator(f_monitor, "CLIENT", CLIENT_PORT)
+        # Un indicador por puerto configurado, con separador entre ellos
+        for i, (label_text, port) in enumerate(MONITOR_PORTS):
+            if i: tk.Frame(f_monitor, width=20, bg=COL_SURFACE).pack(side="left")
+            self.create_indicator(f_monitor, label_text, port)
 
         # --- SECCION 1: SERVICIOS ---
         lbl = ttk.Label(container, text="CONTROL DE SERVICIOS", foreground=COL_ACCENT, background=COL_SURFACE, font=("Segoe UI", 10, "bold"))
@@ -182,6 +638,23 @@ class MqerkCommander:
         btn_hard = ttk.Button(container, text="☢️ Hard Reset", command=self.hard_reset, style="Danger.TButton")
         btn_hard.grid(row=6, column=2, sticky="ew", padx=2)
 
+        # --- SECCION 4: SALUD DE LA API ---
+        lbl4 = ttk.Label(container, text=f"API {HEALTH_PATH} (LIVE)", foreground=COL_ACCENT, background=COL_SURFACE, font=("Segoe UI", 10, "bold"))
+        lbl4.grid(row=7, column=0, sticky="w", pady=(20, 10))
+        ttk.Button(container, text="📊 Exportar CSV", command=self.export_health_csv).grid(row=7, column=2, sticky="e", padx=2, pady=(20, 10))
+
+        f_health = tk.Frame(container, bg=COL_SURFACE)
+        f_health.grid(row=8, column=0, columnspan=3, sticky="ew")
+        self.lbl_health_state = tk.Label(f_health, text="DB: —", fg="gray", bg=COL_SURFACE, font=("Consolas", 9, "bold"), anchor="w")
+        self.lbl_health_state.grid(row=0, column=0, sticky="w")
+        self.lbl_health_windows = []
+        for i, (name, _secs) in enumerate(HEALTH_WINDOWS):
+            l = tk.Label(f_health, text=f"{name}: —", fg=COL_TEXT, bg=COL_SURFACE, font=("Consolas", 9), anchor="w")
+            l.grid(row=1 + i, column=0, sticky="w")
+            self.lbl_health_windows.append(l)
+        self.lbl_health_events = tk.Label(f_health, text="", fg="gray", bg=COL_SURFACE, font=("Consolas", 8), justify="left", anchor="nw")
+        self.lbl_health_events.grid(row=0, column=1, rowspan=1 + len(HEALTH_WINDOWS), sticky="nw", padx=(30, 0))
+
         container.columnconfigure(0, weight=1); container.columnconfigure(1, weight=1); container.columnconfigure(2, weight=1)
 
     def create_indicator(self, parent, label_text, port):
@@ -196,8 +669,14 @@ class MqerkCommander:
         
         lbl = tk.Label(f, text=f"{label_text} :{port}", fg=COL_TEXT, bg=COL_SURFACE, font=("Consolas", 9))
         lbl.pack(side="left")
-        
-        self.indicators[port] = {"canvas": c, "id": circle}
+
+        # Historial de latencia (sparkline) y última medida
+        spark = tk.Canvas(f, width=64, height=16, bg=COL_SURFACE, highlightthickness=0)
+        spark.pack(side="left", padx=(8, 4))
+        lbl_ms = tk.Label(f, text="—", fg="gray", bg=COL_SURFACE, font=("Consolas", 8), width=7, anchor="w")
+        lbl_ms.pack(side="left")
+
+        self.indicators[port] = {"canvas": c, "id": circle, "spark": spark, "ms": lbl_ms}
 
     # ================= GIT CONTROL + DIFF VIEW =================
     def build_git(self):
@@ -262,64 +741,291 @@ class MqerkCommander:
         
         f_conf.columnconfigure(0, weight=1); f_conf.columnconfigure(1, weight=1)
 
+    # ================= PANEL DE TRABAJOS =================
+    def build_jobs(self):
+        container = tk.Frame(self.tab_jobs, bg=COL_SURFACE)
+        container.pack(fill="both", expand=True, padx=20, pady=20)
+
+        top = tk.Frame(container, bg=COL_SURFACE); top.pack(fill="x", pady=(0, 10))
+        ttk.Button(top, text="⛔ Cancelar", command=self.cancel_selected_jobs, style="Danger.TButton").pack(side="left", padx=2)
+        ttk.Button(top, text="🧹 Limpiar terminados", command=self.clear_finished_jobs).pack(side="left", padx=2)
+        self.job_max = tk.IntVar(value=JOB_MAX_CONCURRENCY)
+        tk.Spinbox(top, from_=1, to=16, width=3, textvariable=self.job_max, command=self.on_job_max_change,
+                   bg="#222", fg=COL_TEXT, buttonbackground=COL_BTN_BG, bd=0).pack(side="right")
+        tk.Label(top, text="Máx. simultáneos:", fg="gray", bg=COL_SURFACE, font=("Segoe UI", 8)).pack(side="right", padx=5)
+
+        cols = ("estado", "locks", "duracion", "codigo")
+        self.jobs_tree = ttk.Treeview(container, columns=cols, selectmode="extended")
+        self.jobs_tree.heading("#0", text="COMANDO", anchor="w")
+        for col, text, width in (("estado", "ESTADO", 90), ("locks", "RECURSOS", 130), ("duracion", "DURACIÓN", 80), ("codigo", "CÓDIGO", 60)):
+            self.jobs_tree.heading(col, text=text, anchor="w")
+            self.jobs_tree.column(col, width=width, stretch=False, anchor="w")
+        self.jobs_tree.column("#0", width=380)
+        sb = ttk.Scrollbar(container, orient="vertical", command=self.jobs_tree.yview)
+        self.jobs_tree.configure(yscrollcommand=sb.set)
+        sb.pack(side="right", fill="y")
+        self.jobs_tree.pack(fill="both", expand=True)
+        for status, col in (("en cola", "gray"), ("corriendo", COL_WARN), ("ok", COL_SUCCESS), ("error", COL_DANGER), ("cancelado", COL_DANGER), ("omitido", "gray")):
+            self.jobs_tree.tag_configure(status, foreground=col)
+
+    def job_values(self, job):
+        d = job.duration
+        return (job.status, ", ".join(sorted(job.locks)) or "—",
+                f"{d:.1f} s" if d is not None else "", "" if job.returncode is None else job.returncode)
+
+    def refresh_jobs_panel(self):
+        """Sincroniza la tabla con la cola: filas nuevas, borradas y las que cambiaron"""
+        tree = self.jobs_tree
+        alive = set(self.jobs.jobs)
+        for job in [j for j in self.job_rows if j not in alive]:
+            tree.delete(self.job_rows.pop(job))
+        for job in self.jobs.jobs:
+            iid = self.job_rows.get(job)
+            values = self.job_values(job)
+            if iid is None:
+                self.job_rows[job] = tree.insert("", "end", text=f"#{job.id}  {job.name}", values=values, tags=(job.status,))
+            elif tuple(tree.item(iid, "values")) != tuple(str(v) for v in values):
+                tree.item(iid, values=values, tags=(job.status,))
+
+    def cancel_selected_jobs(self):
+        rows = {iid: job for job, iid in self.job_rows.items()}
+        for iid in self.jobs_tree.selection():
+            job = rows.get(iid)
+            if job is not None and job.status in JOB_ACTIVE:
+                self.jobs.cancel(job)
+                self.log(f"Cancelando #{job.id}: {job.name}", "error")
+
+    def clear_finished_jobs(self):
+        self.jobs.clear_finished()
+        self.refresh_jobs_panel()
+
+    def on_job_max_change(self):
+        try: self.jobs.max_concurrency = max(1, int(self.job_max.get()))
+        except (tk.TclError, ValueError): pass
+
     # ================= LOGICA CORE =================
     def start_port_monitor(self):
-        """Monitor de puertos en hilo secundario no bloqueante con socket"""
-        def check():
-            for port in [SERVER_PORT, CLIENT_PORT]:
-                try:
-                    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    sock.settimeout(0.5) # Timeout rápido para no congelar
-                    result = sock.connect_ex(('127.0.0.1', int(port)))
-                    is_open = (result == 0)
-                    sock.close()
-                    
-                    final_col = COL_SUCCESS if is_open else COL_OFF
-                    self.indicators[port]["canvas"].itemconfig(self.indicators[port]["id"], fill=final_col)
-                except:
-                    pass
-            
-            self.root.after(5000, check)
-        
-        self.root.after(1000, check)
+        """Arranca el sondeo de puertos en segundo plano; la UI sólo lee su cola"""
+        self.monitor = PortMonitor([port for _, port in MONITOR_PORTS])
+        self.monitor.start()
+        self.root.after(MONITOR_POLL_MS, self.poll_port_monitor)
+
+    def poll_port_monitor(self):
+        """Hilo de Tk: vacía la cola del monitor y redibuja sólo los puertos que cambiaron"""
+        changed = set()
+        try:
+            while True:
+                port, latency, _when = self.monitor.results.get_nowait()
+                self.port_status[port] = latency is not None
+                self.port_history[port].append(latency)
+                changed.add(port)
+        except queue.Empty:
+            pass
+        for port in changed:
+            self.update_indicator(port)
+        self.root.after(MONITOR_POLL_MS, self.poll_port_monitor)
+
+    def start_health_monitor(self):
+        self.health = HealthMonitor()
+        self.health.start()
+        self.root.after(MONITOR_POLL_MS, self.poll_health_monitor)
+
+    def poll_health_monitor(self):
+        """Hilo de Tk: pasa las muestras de /health a HealthStats y refresca el panel si llegó alguna"""
+        got = False
+        try:
+            while True:
+                sample = self.health.results.get_nowait()
+                event = self.health_stats.add(sample)
+                if event: self.log(f"/health: {event}" + (f" ({sample['error']})" if sample["error"] else ""), "error" if event.endswith("caída") else "success")
+                got = True
+        except queue.Empty:
+            pass
+        if got: self.update_health_panel()
+        self.root.after(MONITOR_POLL_MS, self.poll_health_monitor)
+
+    def update_health_panel(self):
+        st = self.health_stats
+        since = time.strftime("%H:%M:%S", time.localtime(st.since))
+        col = {"ok": COL_SUCCESS, "db caída": COL_WARN}.get(st.state, COL_DANGER)
+        self.lbl_health_state.config(text=f"{st.state.upper()} desde {since}", fg=col)
+        now = time.time()
+        for l, (name, secs) in zip(self.lbl_health_windows, HEALTH_WINDOWS):
+            n, p50, p95, p99 = st.percentiles(secs, now)
+            l.config(text=f"{name:>6}: p50 {p50:6.1f}  p95 {p95:6.1f}  p99 {p99:6.1f} ms  (n={n})" if n else f"{name:>6}: sin respuestas")
+        events = st.events()[-HEALTH_SHOW_EVENTS:]
+        self.lbl_health_events.config(text="\n".join(
+            f"{time.strftime('%H:%M:%S', time.localtime(s['time']))}  {s['event']}" for s in reversed(events)) or "Sin cambios de estado")
+
+    def export_health_csv(self):
+        if not self.health_stats.samples: return messagebox.showwarning("CSV", "Todavía no hay muestras de /health.")
+        path = filedialog.asksaveasfilename(title="Exportar /health", defaultextension=".csv", filetypes=[("CSV", "*.csv")],
+                                            initialfile=time.strftime("health_%Y%m%d_%H%M.csv"))
+        if not path: return
+        try:
+            self.health_stats.write_csv(path)
+            self.log(f"{len(self.health_stats.samples)} muestras de /health exportadas a {path}", "success")
+        except OSError as e: self.log(f"No se pudo exportar: {e}", "error")
+
+    def update_indicator(self, port):
+        ind = self.indicators[port]
+        latency = self.port_history[port][-1]
+        ind["canvas"].itemconfig(ind["id"], fill=COL_SUCCESS if latency is not None else COL_OFF)
+        ind["ms"].config(text=f"{latency:.0f} ms" if latency is not None else "cerrado",
+                         fg=COL_TEXT if latency is not None else "gray")
+        self.draw_sparkline(ind["spark"], self.port_history[port])
+
+    def draw_sparkline(self, c, history):
+        """Línea de latencias escalada al máximo de la ventana; las caídas, como marcas rojas abajo"""
+        c.delete("all")
+        w, h = int(c["width"]), int(c["height"])
+        step = w / max(MONITOR_HISTORY - 1, 1)
+        x0 = w - step * (len(history) - 1) # Las muestras nuevas entran por la derecha
+        top = max((v for v in history if v is not None), default=0) or 1
+        points = []
+        for i, v in enumerate(history):
+            x = x0 + i * step
+            if v is None:
+                if len(points) >= 4: c.create_line(*points, fill=COL_ACCENT)
+                points = []
+                c.create_line(x, h - 3, x, h, fill=COL_DANGER)
+                continue
+            points += [x, h - 2 - (h - 4) * v / top]
+        if len(points) >= 4: c.create_line(*points, fill=COL_ACCENT)
+        elif points: c.create_oval(points[0] - 1, points[1] - 1, points[0] + 1, points[1] + 1, fill=COL_ACCENT, outline="")
 
     def clear_console(self):
+        self.console_lines.clear()
+        self.refresh_console()
+
+    def log(self, msg, type="norm"):
+        """Se puede llamar desde cualquier hilo: sólo encola; el hilo de Tk lo vuelca en flush_console"""
+        self.enqueue_console(type, msg)
+
+    def log_batch(self, entries):
+        for msg, type in entries:
+            self.enqueue_console(type, msg)
+
+    def enqueue_console(self, type, msg):
+        """Una entrada por línea del widget (type, texto, continuación): así el búfer y el recorte
+        cuentan lo mismo aunque el mensaje traiga varias líneas (tracebacks, salida de npm)"""
+        lines = str(msg).rstrip("\n").split("\n")
+        for i, line in enumerate(lines):
+            self.console_queue.put((type, line.rstrip("\r"), i > 0))
+
+    def flush_console(self):
+        """Hilo de Tk, una vez por cuadro: pasa lo encolado al búfer y añade a la consola lo que pasa el filtro"""
+        new = []
+        try:
+            while True: new.append(self.console_queue.get_nowait())
+        except queue.Empty:
+            pass
+        if new:
+            self.console_lines.extend(new)
+            self.append_console([e for e in new[-CONSOLE_MAX_LINES:] if self.console_match(e)])
+        self.root.after(CONSOLE_FRAME_MS, self.flush_console)
+
+    def console_match(self, entry):
+        type, msg, _ = entry
+        want = dict(CONSOLE_FILTERS).get(self.console_filter.get())
+        if want is not None and type != want: return False
+        needle = self.console_search.get().strip().casefold()
+        return not needle or needle in msg.casefold()
+
+    def refresh_console(self):
+        """Rehace la consola desde el búfer con el filtro y la búsqueda actuales"""
         self.console.config(state='normal')
         self.console.delete(1.0, tk.END)
         self.console.config(state='disabled')
+        self.console_shown = 0
+        self.append_console([e for e in self.console_lines if self.console_match(e)], force_scroll=True)
 
-    def log(self, msg, type="norm"):
+    def append_console(self, entries, force_scroll=False):
+        """Inserta las líneas en bloques por tag, recorta lo que exceda el tope y resalta la búsqueda"""
+        at_bottom = force_scroll or self.console.yview()[1] >= 0.999
         self.console.config(state='normal')
-        if type == "cmd": self.console.insert(tk.END, f"> {msg}\n", "cmd")
-        elif type == "error": self.console.insert(tk.END, f"❌ {msg}\n", "err")
-        elif type == "success": self.console.insert(tk.END, f"✅ {msg}\n", "suc")
-        else: self.console.insert(tk.END, f"{msg}\n")
-        self.console.see(tk.END)
+        start = self.console.index("end-1c")
+        run, run_tag = [], None
+        for type, msg, cont in entries:
+            prefix, tag = CONSOLE_PREFIX.get(type, ("", None))
+            if cont: prefix = "   " # Continuación de un mensaje de varias líneas: sin repetir el prefijo
+            if tag != run_tag and run:
+                self.console.insert(tk.END, "".join(run), run_tag or ())
+                run = []
+            run_tag = tag
+            run.append(f"{prefix}{msg}\n")
+        if run: self.console.insert(tk.END, "".join(run), run_tag or ())
+        self.console_shown += len(entries)
+        excess = self.console_shown - CONSOLE_MAX_LINES
+        if excess > 0:
+            self.console.delete("1.0", f"{excess + 1}.0")
+            self.console_shown -= excess
+            start = "1.0" if self.console.compare(start, "<", f"{excess + 1}.0") else f"{start} - {excess} lines"
+        needle = self.console_search.get().strip()
+        if needle and entries:
+            count = tk.IntVar()
+            pos = self.console.search(needle, start, stopindex=tk.END, nocase=True, count=count)
+            while pos:
+                end = f"{pos}+{count.get()}c"
+                self.console.tag_add("hit", pos, end)
+                pos = self.console.search(needle, end, stopindex=tk.END, nocase=True, count=count)
+        if at_bottom: self.console.see(tk.END)
         self.console.config(state='disabled')
-        self.root.update_idletasks()
+        self.lbl_console_count.config(text=f"{self.console_shown} / {len(self.console_lines)} líneas")
 
     def set_busy(self, busy):
         self.is_busy = busy
-        if busy:
+        self.update_busy()
+
+    def update_busy(self):
+        """Estado de la cabecera: trabajos en curso con el tiempo del más antiguo, o READY"""
+        running = self.jobs.running
+        queued = sum(1 for j in self.jobs.jobs if j.status == "en cola")
+        if running:
+            job = running[0]
+            short = job.name if len(job.name) <= 40 else job.name[:39] + "…"
+            more = f" (+{len(running) - 1})" if len(running) > 1 else ""
+            more += f" · {queued} en cola" if queued else ""
+            self.lbl_status.config(text=f"⏱ {job.duration:.0f}s · {short}{more}", fg=COL_WARN)
+            self.root.config(cursor="watch")
+        elif self.is_busy:
             self.lbl_status.config(text="BUSY...", fg=COL_WARN)
             self.root.config(cursor="watch")
         else:
             self.lbl_status.config(text="READY", fg=COL_SUCCESS)
             self.root.config(cursor="")
 
-    def run_bg(self, cmd, cwd=None):
-        def task():
-            self.set_busy(True)
-            self.log(cmd, "cmd")
-            try:
-                p = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd, text=True)
-                out, err = p.communicate()
-                if out: self.log(out.strip())
-                if err and "npm WARN" not in err: self.log(err.strip(), "error")
-                if "git" in cmd: self.root.after(500, self.check_git_status)
-            except Exception as e: self.log(str(e), "error")
-            finally: self.root.after(0, lambda: self.set_busy(False))
-        threading.Thread(target=task, daemon=True).start()
+    def run_bg(self, cmd, cwd=None, locks=None, after=(), name=None, on_done=None, check=True):
+        """Encola el comando; corre cuando haya hueco, sus recursos estén libres y sus dependencias hayan ido bien.
+        Por defecto los recursos se deducen del comando (git, npm en client/server). Devuelve el Job."""
+        job = self.jobs.submit(cmd, cwd, name, default_locks(cmd, cwd) if locks is None else locks, after, on_done, check)
+        self.pump_jobs(reschedule=False)
+        return job
+
+    def pump_jobs(self, reschedule=True):
+        """Hilo de Tk: vuelca la salida de lo que corre, cierra lo terminado y arranca lo siguiente"""
+        finished = []
+        for job in self.jobs.running:
+            batch = []
+            for stream, line in job.proc.drain():
+                if not line.strip(): continue
+                batch.append((line, "error" if stream == "err" and "npm WARN" not in line else "norm"))
+            if batch: self.log_batch(batch)
+            if self.jobs.reap(job): finished.append(job)
+        started, dropped = self.jobs.schedule()
+        for job in started:
+            self.log(job.cmd, "cmd")
+        for job in finished + dropped:
+            if job.status == "omitido": self.log(f"#{job.id} omitido (falló una dependencia): {job.name}", "error")
+            elif job.proc is None: self.log(f"#{job.id} no se pudo lanzar: {job.error}", "error")
+            else: self.log(f"Terminado en {job.duration:.1f} s (código {job.returncode}, {job.status}): {job.name}",
+                           "success" if job.status == "ok" else "error")
+            if LOCK_GIT in job.locks: self.root.after(500, self.check_git_status)
+            if job.on_done: job.on_done(job)
+        if finished or dropped: self.jobs.prune()
+        self.refresh_jobs_panel()
+        self.update_busy()
+        if reschedule: self.root.after(RUN_POLL_MS, self.pump_jobs)
 
     def run_git_cmd(self, args): self.run_bg(f"git {args}")
 
@@ -338,12 +1044,14 @@ class MqerkCommander:
         self.log("Terminales lanzadas.", "success")
 
     def stop_services(self):
+        """Los tres pasos comparten el recurso "procesos": corren uno detrás de otro, en este orden.
+        taskkill sale con error si no había nada que matar: eso también cuenta como bien."""
         cmds = [
             f'for /f "tokens=5" %a in (\'netstat -ano ^| findstr :{SERVER_PORT} ^| findstr LISTENING\') do taskkill /F /PID %a',
             f'for /f "tokens=5" %a in (\'netstat -ano ^| findstr :{CLIENT_PORT} ^| findstr LISTENING\') do taskkill /F /PID %a',
             "taskkill /F /IM node.exe"
         ]
-        for c in cmds: self.run_bg(c)
+        return [self.run_bg(c, locks={LOCK_PROCS}, check=False) for c in cmds]
 
     # GIT PUSH UI (MEJORADO CON DIFF)
     def git_push_ui(self):
@@ -504,8 +1212,8 @@ class MqerkCommander:
 
     def hard_reset(self):
         if messagebox.askyesno("⚠️", "Borrar node_modules?"):
-            self.stop_services()
-            self.run_bg(f'rmdir /s /q "{SERVER_DIR}\\node_modules" & del "{SERVER_DIR}\\package-lock.json" & rmdir /s /q "{CLIENT_DIR}\\node_modules" & del "{CLIENT_DIR}\\package-lock.json" & cd "{SERVER_DIR}" & npm install & cd ..\\"{CLIENT_DIR}" & npm install')
+            # Sólo cuando los killers terminaron (y no si se cancelaron), con los dos npm bloqueados
+            self.run_bg(after=self.stop_services(), locks={LOCK_PROCS, LOCK_NPM_SERVER, LOCK_NPM_CLIENT}, name="Hard reset (node_modules + npm install)", cmd=f'rmdir /s /q "{SERVER_DIR}\\node_modules" & del "{SERVER_DIR}\\package-lock.json" & rmdir /s /q "{CLIENT_DIR}\\node_modules" & del "{CLIENT_DIR}\\package-lock.json" & cd "{SERVER_DIR}" & npm install & cd ..\\"{CLIENT_DIR}" & npm install')
 
     # ================= PROTOCOLOS DE SEGURIDAD (AUTO-PROTECT) =================
  # ================= PROTOCOLOS DE SEGURIDAD (NO DESTRUCTIVO) =================
@@ -527,6 +1235,7 @@ class MqerkCommander:
         ]
 
         protected_count = 0
+        last_job = None
 
         for t in targets:
             full_path = os.path.abspath(t["path"])
@@ -547,13 +1256,17 @@ class MqerkCommander:
                 # PASO 3: Sacar el archivo real del index de Git (¡CRUCIAL!)
                 # "git rm --cached" borra el archivo de Git pero LO DEJA en tu disco.
                 # El "|| ver>nul" evita errores si el archivo no estaba trackeado antes.
-                self.run_bg(f"git rm --cached {t['path']} || ver>nul")
+                # Comparten el lock "git": corren en fila, sin pelear por .git/index.lock
+                last_job = self.run_bg(f"git rm --cached {t['path']} || ver>nul")
                 
                 protected_count += 1
             
-        # Mensaje final
-        self.root.after(1500, lambda: self.log(f"✅ {protected_count} archivos protegidos. Tu entorno local sigue funcionando.", "success"))
-        self.root.after(1500, lambda: messagebox.showinfo("Auto-Protect", "🛡️ ¡Protección Lista!\n\n1. Tus claves REALES siguen en tu carpeta (tu app funciona).\n2. Git ahora ignorará esos archivos.\n3. Se crearon archivos '.example' seguros.\n\nAHORA: Haz un nuevo Commit y Push."))
+        # Mensaje final, cuando termine el último "git rm"
+        def done(job=None):
+            self.log(f"✅ {protected_count} archivos protegidos. Tu entorno local sigue funcionando.", "success")
+            messagebox.showinfo("Auto-Protect", "🛡️ ¡Protección Lista!\n\n1. Tus claves REALES siguen en tu carpeta (tu app funciona).\n2. Git ahora ignorará esos archivos.\n3. Se crearon archivos '.example' seguros.\n\nAHORA: Haz un nuevo Commit y Push.")
+        if last_job is None: done()
+        else: last_job.on_done = done
         self.set_busy(False)
 
     def create_safe_json_example(self, filepath):
@@ -1,37 +1,73 @@
 import fitz  # PyMuPDF
+import json
 import os
+import queue
+import math
+import threading
+import time
+from collections import OrderedDict
+from fractions import Fraction
 import tkinter as tk
 from tkinter import filedialog, simpledialog, messagebox
 from tkinter import colorchooser
 from tkinter import font as tkfont
-from PIL import Image, ImageTk
 from typing import Any, Optional
 
+from pdf_engine import (
+    PAGE_GAP_PX, RENDER_COLORSPACE, RENDER_MODES, DiskRasterCache, PageLayout, PdfDocument, RenderCache,
+    Session, TextIndex, TextOverlay, compile_pdflib_module, format_bytes, get_pixmap, load_template, pixmap_ppm,
+    user_cache_dir, write_atomic,
+)
+
 # --- Variables globales ---
 doc = None
 page = None
 scale = 2.0  # Factor de escala para más calidad al mostrar
 MIN_SCALE = 0.5
 MAX_SCALE = 5.0
+RENDER_CACHE_MB = 256  # Presupuesto de memoria para páginas renderizadas
+PREFETCH_RADIUS = 1  # Páginas vecinas (N±k) que se precargan en segundo plano
+RENDER_POLL_MS = 30  # Cada cuánto el hilo de Tk recoge lo que renderizaron los workers
+TILE_SIZE = 512  # Lado de cada mosaico en píxeles de canvas
+TILE_MIN_PIXELS = 4_000_000  # A partir de este tamaño de página se renderiza por mosaicos
+TILE_CACHE_MB = 96  # Presupuesto de memoria para mosaicos
+TILE_MARGIN = 1  # Mosaicos extra alrededor de la zona visible
+ZOOM_DEBOUNCE_MS = 150  # Espera tras el último paso de zoom antes del render nítido
+PREVIEW_MAX_PIXELS = 500_000  # Tamaño máximo del render rápido de vista previa
+THUMB_WIDTH = 96  # Ancho de las miniaturas de la barra lateral, en píxeles
+THUMB_GAP = 22  # Separación entre miniaturas (deja sitio al número de página)
+THUMB_CACHE_MB = 24  # Presupuesto en memoria de miniaturas
+THUMB_DISK_CACHE_MB = 128  # Tope de las miniaturas en disco (~40 KB cada una)
+DISK_CACHE_MB = 1024  # Tope de la caché de páginas renderizadas en disco
+SNAP_RADIUS_PX = 12  # Distancia máxima (en pantalla) para ajustar un clic a un renglón
+APP_TITLE = "Herramienta PDF — Seleccionar coordenadas e insertar texto"
+OPEN_PROGRESS_PAGES = 200  # Cada cuántas páginas leídas se avisa del progreso de la apertura
+OUTLINE_MAX_ITEMS = 300  # Entradas del índice del PDF que caben en el menú
+OVERLAY_FRAME_MS = 16  # Como mucho un redibujado del overlay activo por cuadro (~60 fps)
+FONT_CACHE_SIZE = 64  # Fuentes Tk (familia, tamaño en píxeles) que se conservan creadas
+FIELD_MARGIN_PT = 36  # Margen derecho que se deja al proponer el ancho máximo de un campo
 start_x, start_y = 0, 0
 rect_coords = None
 rect_id = None
 selection_dragging = False
-pdf_path = None
-img = None
 tk_img = None
 current_page_index = 0
 page_label_var = None
-overlay_id = None
+session = None  # Session del documento abierto: overlays pendientes y archivo de salida
+active_overlay = None  # Overlay que editan los controles
+overlay_items = {}  # id de item del canvas -> Overlay (texto y fondo)
+overlay_redraw_job = None  # after() pendiente que redibuja el overlay activo
+overlay_fonts = OrderedDict()  # (familia, píxeles) -> (tkfont.Font, alto de línea, ascenso), LRU
+overlay_count_var = None
+compact_save_var = None  # Guardado completo con recolección de basura y compresión
+save_label_var = None
 overlay_text_var = None
 overlay_font_var = None  # PDF fontsize in pt
-overlay_pdf_pos = None  # (x_pt, y_pt)
 overlay_dragging = False
 overlay_drag_offset = (0, 0)
 overlay_color_var = None  # hex color string
 overlay_bg_enabled_var = None
 overlay_bg_color_var = None
-overlay_bg_id = None
 overlay_font_family_var = None
 align_h_var = None  # 'left'|'center'|'right'
 align_v_var = None  # 'top'|'middle'|'bottom'
@@ -42,45 +78,1002 @@ click_marker_tag = 'click_marker'
 auto_copy_rect_var = None
 show_rect_dialog_var = None
 rect_label_var = None
+doc_key = None  # Identidad del documento abierto para la caché de render
+cache_label_var = None
+cache_mb_var = None
+prefetch_radius_var = None
+template_json_path = None  # Última plantilla de campos usada (ver pdf_fill.py)
+prefetch_worker = None
+render_worker = None
+render_generation = 0  # Se incrementa con cada navegación/zoom; las peticiones viejas se descartan
+pending_view = None  # (x_frac, y_frac) a restaurar cuando llegue la página pedida
+tiled_var = None
+tiled_page = None  # (doc_key, page_index, scale, width, height) cuando se muestra por mosaicos
+tile_items = {}  # (tx, ty) -> id del item de canvas del mosaico dibujado
+tile_update_job = None
+zoom_job = None
+preview_img = None  # Vista previa reescalada mostrada mientras llega el render nítido
+preview_for = None  # (doc_key, page_index, scale) de la vista previa
+# PyMuPDF no es thread-safe: todo acceso a `doc` pasa por este candado
+doc_lock = threading.RLock()
+index_worker = None
+page_indexes = {}  # page_index -> PageIndex del documento actual (doc_key en page_indexes_key)
+page_indexes_key = None
+snap_var = None
+search_index = None  # TextIndex del documento abierto
+search_worker = None
+search_var = None
+search_label_var = None
+search_hits = []  # [(página, [fitz.Rect])] de la última búsqueda
+search_pos = -1  # Coincidencia seleccionada en search_hits
+search_version = -1  # Versión del índice con la que se calcularon search_hits
+continuous_var = None
+cont_layout = None  # PageLayout mientras se muestra el modo continuo; None en modo página
+cont_items = {}  # (página, None | (tx, ty) | "bg") -> (id de item, PhotoImage) dibujados
+cont_wanted = set()  # Claves de cont_items que cortan la zona visible más el margen
+selection_page = 0  # Página en la que empezó la selección actual
+root = None  # Ventana principal: la crea main()
+canvas = None
+v_scroll = None
+h_scroll = None
+thumb_canvas = None
+thumb_scroll = None
+thumb_worker = None
+thumb_layout = None  # PageLayout de la barra de miniaturas
+thumb_items = {}  # página -> (fondo, número, [imagen, PhotoImage]) dibujados en la barra
+thumb_update_job = None
+disk_cache_var = None
+render_colorspace = RENDER_COLORSPACE  # Sólo afecta a la vista: lo que se guarda en el PDF no cambia
+render_mode_var = None
+open_worker = None  # OpenWorker del archivo que se está abriendo
+open_timing = None  # Marcas de la última apertura: inicio, abrir (s), render, info (perf_counter)
+status_var = None
+outline_menu = None
+outline_button = None
+btn_cancel_open = None
+
+
+# Claves (doc_key, índice de página, escala, modo de color): cambiar de modo no tira las otras
+render_cache = RenderCache(RENDER_CACHE_MB * 1024 * 1024)
+# Claves de mosaico: (doc_key, índice de página, escala, modo de color, tx, ty)
+tile_cache = RenderCache(TILE_CACHE_MB * 1024 * 1024, label="Mosaicos")
+# Claves (doc_key, página, ancho)
+thumb_cache = RenderCache(THUMB_CACHE_MB * 1024 * 1024, label="Miniaturas")
+
+
+def _page_key(key_doc, page_index: int, scale_val: float, colorspace: Optional[str] = None) -> tuple:
+    """Clave de render_cache; sin modo, el de la vista actual."""
+    return key_doc, page_index, scale_val, colorspace or render_colorspace
+
+
+def _tile_key(key_doc, page_index: int, scale_val: float, tx: int, ty: int, colorspace: Optional[str] = None) -> tuple:
+    """Clave de tile_cache; sin modo, el de la vista actual."""
+    return key_doc, page_index, scale_val, colorspace or render_colorspace, tx, ty
+
+
+class PrefetchWorker(threading.Thread):
+    """Renderiza páginas vecinas en segundo plano para un documento y una escala.
+
+    El hilo sólo produce píxeles crudos; el hilo de Tk los convierte en imágenes
+    (Tk no puede usarse fuera del hilo principal) y los guarda en `render_cache`.
+    """
+
+    def __init__(self, document: PdfDocument, scale_val: float, colorspace: str = RENDER_COLORSPACE):
+        super().__init__(daemon=True)
+        self.document = document
+        self.doc_key = document.key
+        self.scale = scale_val
+        self.colorspace = colorspace
+        self.results: "queue.Queue[tuple]" = queue.Queue()
+        self._wanted: list = []
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    def request(self, page_indices):
+        """Reemplaza la lista de páginas pendientes (las anteriores ya no interesan)."""
+        with self._cond:
+            self._wanted = list(page_indices)
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._wanted = []
+            self._cond.notify()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._wanted and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                page_index = self._wanted.pop(0)
+            if render_cache.contains(_page_key(self.doc_key, page_index, self.scale, self.colorspace)):
+                continue
+            try:
+                result = self.document.render(page_index, self.scale, colorspace=self.colorspace,
+                                              abort=lambda: self._stopped)
+            except Exception:
+                continue
+            if result is None:
+                return
+            self.results.put((page_index,) + result)
+
+
+class RenderWorker(threading.Thread):
+    """Hilo de render en primer plano que sólo atiende la petición más reciente.
+
+    Cada petición lleva un número de generación y una lista de trabajos (la página
+    entera o los mosaicos visibles). Una petición nueva reemplaza a los trabajos
+    pendientes; los de una generación ya superada se descartan antes de empezar,
+    y si terminan tarde su resultado se tira sin tocar el canvas.
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.results: "queue.Queue[tuple]" = queue.Queue()
+        self._pending: list = []
+        self._cond = threading.Condition()
+
+    def submit(self, generation: int, document, key_doc, page_index: int, scale_val: float, tiles=None):
+        """Encola la página completa o, si se indican, sólo esos mosaicos (tx, ty, x0, y0, x1, y1)."""
+        with self._cond:
+            if tiles is None:
+                self._pending = [(generation, document, key_doc, page_index, scale_val, None)]
+            else:
+                self._pending = [(generation, document, key_doc, page_index, scale_val, t) for t in tiles]
+            self._cond.notify()
+
+    def submit_jobs(self, generation: int, document, key_doc, scale_val: float, jobs):
+        """Como submit, pero con varias páginas: `jobs` es [(página, mosaico o None)]."""
+        with self._cond:
+            self._pending = [(generation, document, key_doc, p, scale_val, t) for p, t in jobs]
+            self._cond.notify()
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                job = self._pending.pop(0)
+            generation, document, key_doc, page_index, scale_val, tile = job
+            if generation != render_generation:
+                continue
+            # Cambiar de modo sube la generación: un trabajo que empezó con el anterior se descarta
+            colorspace = render_colorspace
+            clip = None
+            if tile is not None:
+                _, _, x0, y0, x1, y1 = tile
+                clip = fitz.Rect(x0 / scale_val, y0 / scale_val, x1 / scale_val, y1 / scale_val)
+            try:
+                # Páginas completas: primero la caché en disco (los mosaicos no se guardan)
+                result = document.render(page_index, scale_val, clip=clip, colorspace=colorspace,
+                                         abort=lambda: generation != render_generation)
+                if result is None:
+                    continue
+                width, height, data = result
+            except Exception as e:
+                self.results.put((generation, key_doc, page_index, scale_val, colorspace, tile, 0, 0, None, e))
+                continue
+            if generation != render_generation:
+                continue
+            self.results.put((generation, key_doc, page_index, scale_val, colorspace, tile, width, height, data, None))
+
+
+class IndexWorker(threading.Thread):
+    """Construye en segundo plano el índice espacial de las páginas que se van mostrando."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.results: "queue.Queue[tuple]" = queue.Queue()
+        self._pending: list = []
+        self._cond = threading.Condition()
+
+    def request(self, document, key_doc, page_index: int):
+        """La página pedida más recientemente va primero."""
+        with self._cond:
+            self._pending = [j for j in self._pending if j[1:] != (key_doc, page_index)]
+            self._pending.insert(0, (document, key_doc, page_index))
+            self._cond.notify()
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                document, key_doc, page_index = self._pending.pop(0)
+            try:
+                with doc_lock:
+                    if document is not doc:
+                        continue  # Documento cerrado o reemplazado
+                    index = document.page_index(page_index)
+            except Exception:
+                continue
+            self.results.put((document, key_doc, page_index, index))
+
+
+class SearchWorker(threading.Thread):
+    """Extrae las palabras de cada página del documento abierto y las pasa a un TextIndex."""
+
+    def __init__(self, index: TextIndex):
+        super().__init__(daemon=True)
+        self.index = index
+        self._pending = list(range(index.page_count))
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    def reindex(self, page_indices):
+        """Vuelve a indexar páginas modificadas (van antes que las pendientes)."""
+        with self._cond:
+            self._pending = list(page_indices) + [p for p in self._pending if p not in page_indices]
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                page_index = self._pending.pop(0)
+            try:
+                # Una página por vez con el candado: el render de la vista no espera a todo el documento
+                with doc_lock:
+                    if self._stopped or doc_key != self.index.doc_key:
+                        return
+                    words = doc.words(page_index)
+            except Exception:
+                continue
+            self.index.add_page(page_index, words)
+
+
+class OpenWorker(threading.Thread):
+    """Abre un PDF fuera del hilo de Tk y después lee lo que la primera página no necesita.
+
+    Publica en `results`, en orden: ("doc", PdfDocument, segundos, reparado) en cuanto
+    fitz.open termina (incluida la reparación de archivos dañados), ("progress",
+    leídas, total) mientras lee el tamaño de las páginas e ("info", índice, metadatos)
+    al final; si el archivo no se puede abrir, ("error", excepción). Después, si no
+    estaba en la caché, calcula el hash del contenido (activa la caché en disco).
+    """
+
+    def __init__(self, path: str):
+        super().__init__(daemon=True)
+        self.path = path
+        self.results: "queue.Queue[tuple]" = queue.Queue()
+        self._stopped = False
+
+    def stop(self):
+        self._stopped = True
+
+    def run(self):
+        t0 = time.perf_counter()
+        try:
+            # Nadie más conoce aún este documento: abrirlo no necesita doc_lock
+            document = PdfDocument(self.path, lock=doc_lock, disk_cache=disk_cache)
+            repaired = document.is_repaired
+        except Exception as e:
+            self.results.put(("error", e))
+            return
+        if self._stopped:
+            document.close()
+            return
+        self.results.put(("doc", document, time.perf_counter() - t0, repaired))
+        # Desde aquí el documento es el de la vista: PdfDocument lee con el candado, página a página
+        toc, metadata = [], {}
+        try:
+            if document.page_sizes(self._progress) is None:
+                return
+            toc = document.outline()
+            metadata = document.metadata()
+        except Exception:
+            pass  # Lo que falte lo lee el hilo de Tk cuando le haga falta
+        if self._stopped:
+            return
+        self.results.put(("info", toc, metadata))
+        # El hash lee el archivo entero: después de pintar y de leer lo demás
+        document.content_hash()
+
+    def _progress(self, done: int, total: int) -> bool:
+        if done % OPEN_PROGRESS_PAGES == 0:
+            self.results.put(("progress", done, total))
+        return not self._stopped
+
+
+disk_cache = DiskRasterCache(user_cache_dir("raster"), DISK_CACHE_MB * 1024 * 1024)
+# Misma caché (LRU por fecha, con tope) para las miniaturas; la "escala" de la clave es el ancho
+thumb_disk_cache = DiskRasterCache(user_cache_dir("thumbs"), THUMB_DISK_CACHE_MB * 1024 * 1024)
+
+
+class ThumbWorker(threading.Thread):
+    """Miniaturas de baja resolución: del disco si ya existen, si no se renderizan y se guardan.
+
+    En disco (thumb_disk_cache) se identifican por el hash del contenido del archivo,
+    no por su ruta: reabrir el mismo PDF (o una copia) las muestra sin volver a renderizar.
+    Mientras el hash no se conoce se renderizan sin pasar por el disco.
+    """
+
+    def __init__(self, document: PdfDocument, width: int = THUMB_WIDTH):
+        super().__init__(daemon=True)
+        self.document = document
+        self.doc_key = document.key
+        self.width = width
+        self.results: "queue.Queue[tuple]" = queue.Queue()
+        self._wanted: list = []
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    def request(self, page_indices):
+        with self._cond:
+            self._wanted = list(page_indices)
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._wanted = []
+            self._cond.notify()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped
+
+    def _disk_path(self, page_index: int) -> Optional[str]:
+        # Las páginas cambiadas en memoria ya no corresponden al hash del archivo
+        if page_index in self.document.modified_pages:
+            return None
+        h = self.document.known_content_hash
+        return thumb_disk_cache.path(h, page_index, self.width, RENDER_COLORSPACE) if h else None
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._wanted and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                page_index = self._wanted.pop(0)
+            disk = self._disk_path(page_index)
+            data = thumb_disk_cache.get(disk) if disk else None
+            if data is None:
+                try:
+                    with doc_lock:
+                        if self._stopped or doc_key != self.doc_key:
+                            return
+                        page_obj = self.document[page_index]
+                        pix: Any = get_pixmap(page_obj, self.width / page_obj.rect.width)
+                    data = pixmap_ppm(pix)
+                    del pix
+                except Exception:
+                    continue
+                if disk:
+                    thumb_disk_cache.put(disk, data)  # Sin disco la miniatura sigue sirviendo en memoria
+            self.results.put((page_index, data))
+
+
+def _update_cache_label():
+    if isinstance(cache_label_var, tk.StringVar):
+        cache_label_var.set(f"{render_cache.summary()}  |  {tile_cache.summary()}")
+
+
+def on_cache_budget_change():
+    """Aplica el presupuesto de caché (MB) elegido en la interfaz."""
+    try:
+        mb = max(16, int(_get_intvar(cache_mb_var, RENDER_CACHE_MB)))
+    except (tk.TclError, ValueError):
+        return
+    render_cache.set_max_bytes(mb * 1024 * 1024)
+    _update_cache_label()
+
+
+def on_render_mode_change(*args):
+    """Aplica el modo de render elegido (color, grises o blanco y negro) a la vista."""
+    global render_colorspace
+    label = _get_strvar(render_mode_var, RENDER_MODES[RENDER_COLORSPACE])
+    mode = next((k for k, v in RENDER_MODES.items() if v == label), RENDER_COLORSPACE)
+    if mode == render_colorspace:
+        return
+    render_colorspace = mode
+    # Las cachés (en memoria y en disco) llevan el modo en la clave: volver a un modo ya visto no re-renderiza
+    _stop_prefetch()
+    if doc is None:
+        return
+    view = (canvas.xview()[0], canvas.yview()[0])
+    if cont_layout is not None:
+        _leave_continuous()
+    load_page(current_page_index, view=view)
+
+
+def _stop_prefetch():
+    global prefetch_worker
+    if prefetch_worker is not None:
+        prefetch_worker.stop()
+        prefetch_worker = None
+
+
+def _schedule_prefetch(center: int):
+    """Pide al worker las páginas N±1..N±k que aún no están en caché."""
+    global prefetch_worker
+    if doc is None:
+        return
+    radius = max(0, _get_intvar(prefetch_radius_var, PREFETCH_RADIUS))
+    # Un cambio de documento o de escala invalida al worker actual
+    if prefetch_worker is not None and (prefetch_worker.doc_key != doc_key or prefetch_worker.scale != scale
+                                        or prefetch_worker.colorspace != render_colorspace):
+        _stop_prefetch()
+    # En modo mosaico no se precargan páginas completas (serían enormes)
+    if radius == 0 or tiled_page is not None:
+        _stop_prefetch()
+        return
+    wanted = []
+    for dist in range(1, radius + 1):
+        for idx in (center + dist, center - dist):
+            if 0 <= idx < doc.page_count and not render_cache.contains(_page_key(doc_key, idx, scale)):
+                wanted.append(idx)
+    if not wanted:
+        return
+    if prefetch_worker is None:
+        prefetch_worker = PrefetchWorker(doc, scale, render_colorspace)
+        prefetch_worker.start()
+    prefetch_worker.request(wanted)
+
+
+def _cache_ppm(key, width, height, data, cache=None):
+    """Crea la imagen Tk a partir del PPM y la guarda en caché (hilo de Tk)."""
+    photo = tk.PhotoImage(data=data, format="PPM")
+    # Sin tamaño (p. ej. una miniatura leída del disco) se toma el de la imagen
+    width, height = width or photo.width(), height or photo.height()
+    entry = (photo, width, height)
+    # Tk guarda la imagen a 4 bytes por píxel
+    (cache or render_cache).put(key, entry, width * height * 4)
+    return entry
+
+
+def _request_page_index(page_index: int):
+    """Pide el índice espacial de una página si aún no está (se construye una vez por documento)."""
+    global index_worker, page_indexes, page_indexes_key
+    if doc is None:
+        return
+    if page_indexes_key != doc_key:
+        page_indexes = {}
+        page_indexes_key = doc_key
+    if page_index in page_indexes:
+        return
+    if index_worker is None:
+        index_worker = IndexWorker()
+        index_worker.start()
+    index_worker.request(doc, doc_key, page_index)
+
+
+def _page_origin(page_index: int):
+    """Esquina superior izquierda de la página en el canvas (en modo continuo van apiladas)."""
+    if cont_layout is None:
+        return 0, 0
+    return cont_layout.origin(page_index)
+
+
+def _to_pdf(cx: float, cy: float, page_index: Optional[int] = None):
+    """Canvas -> (página, x, y en puntos PDF). Sin página, la que está bajo el punto."""
+    if page_index is None:
+        page_index = cont_layout.page_at(cy) if cont_layout is not None else current_page_index
+    ox, oy = _page_origin(page_index)
+    return page_index, (cx - ox) / scale, (cy - oy) / scale
+
+
+def _to_canvas(page_index: int, x_pdf: float, y_pdf: float):
+    ox, oy = _page_origin(page_index)
+    return ox + x_pdf * scale, oy + y_pdf * scale
+
+
+def _snap(x_pdf: float, y_pdf: float, page_index: Optional[int] = None):
+    """Ajusta un punto (en puntos PDF) al renglón más cercano si el índice de la página ya está listo."""
+    if not _get_boolvar(snap_var, True) or page_indexes_key != doc_key:
+        return x_pdf, y_pdf, None
+    index = page_indexes.get(current_page_index if page_index is None else page_index)
+    if index is None:
+        return x_pdf, y_pdf, None
+    return index.snap(x_pdf, y_pdf, SNAP_RADIUS_PX / scale)
+
+
+def _poll_workers():
+    """Recoge en el hilo de Tk lo que renderizaron el worker principal y el de precarga."""
+    if render_worker is not None:
+        latest = None
+        while True:
+            try:
+                latest = render_worker.results.get_nowait()
+            except queue.Empty:
+                break
+            # Sólo la generación vigente llega al canvas
+            if latest[0] == render_generation:
+                _deliver_render(latest)
+    worker = prefetch_worker
+    if worker is not None:
+        added = False
+        while True:
+            try:
+                page_index, width, height, data = worker.results.get_nowait()
+            except queue.Empty:
+                break
+            if worker.stopped:
+                continue
+            _cache_ppm(_page_key(worker.doc_key, page_index, worker.scale, worker.colorspace), width, height, data)
+            del data
+            added = True
+        if added:
+            _update_cache_label()
+    if index_worker is not None:
+        while True:
+            try:
+                document, key_doc, page_index, index = index_worker.results.get_nowait()
+            except queue.Empty:
+                break
+            if document is doc and key_doc == page_indexes_key:
+                page_indexes[page_index] = index
+    worker = thumb_worker
+    if worker is not None:
+        while True:
+            try:
+                page_index, data = worker.results.get_nowait()
+            except queue.Empty:
+                break
+            if worker.stopped or worker.doc_key != doc_key:
+                continue
+            entry = _cache_ppm((doc_key, page_index, worker.width), 0, 0, data, cache=thumb_cache)
+            _draw_thumb(page_index, entry[0])
+    worker = open_worker
+    if worker is not None:
+        while worker is open_worker:
+            try:
+                msg = worker.results.get_nowait()
+            except queue.Empty:
+                break
+            _deliver_open(worker, msg)
+        if open_worker is not None:
+            _update_open_status()
+    # El índice de búsqueda creció: refrescar coincidencias y progreso
+    if search_index is not None and search_index.version != search_version:
+        _run_search()
+    root.after(RENDER_POLL_MS, _poll_workers)
+
+
+def _deliver_render(result):
+    generation, key_doc, page_index, scale_val, colorspace, tile, width, height, data, error = result
+    if error is not None:
+        messagebox.showerror("Error", f"No se pudo cargar la página {page_index}:\n{error}")
+        return
+    if cont_layout is not None:
+        _deliver_continuous(key_doc, page_index, scale_val, colorspace, tile, width, height, data)
+        return
+    if key_doc != doc_key or page_index != current_page_index or scale_val != scale or colorspace != render_colorspace:
+        return
+    if tile is not None:
+        tx, ty = tile[0], tile[1]
+        entry = _cache_ppm(_tile_key(key_doc, page_index, scale_val, tx, ty, colorspace), width, height, data, cache=tile_cache)
+        if tiled_page is not None and tiled_page[:3] == (key_doc, page_index, scale_val):
+            _draw_tile(tx, ty, tile[2], tile[3], entry[0])
+            _update_cache_label()
+        return
+    entry = _cache_ppm(_page_key(key_doc, page_index, scale_val, colorspace), width, height, data)
+    _show_page(*entry)
+
+
+def _deliver_continuous(key_doc, page_index, scale_val, colorspace, tile, width, height, data):
+    if key_doc != doc_key or scale_val != scale or colorspace != render_colorspace or cont_layout is None:
+        return
+    ox, oy = cont_layout.origin(page_index)
+    if tile is None:
+        entry = _cache_ppm(_page_key(key_doc, page_index, scale_val, colorspace), width, height, data)
+        item_key, x, y = (page_index, None), ox, oy
+    else:
+        entry = _cache_ppm(_tile_key(key_doc, page_index, scale_val, tile[0], tile[1], colorspace), width, height, data,
+                           cache=tile_cache)
+        item_key, x, y = (page_index, (tile[0], tile[1])), ox + tile[2], oy + tile[3]
+    # Si mientras tanto salió de la vista, queda en la caché para cuando vuelva
+    if item_key in cont_wanted and item_key not in cont_items:
+        _draw_continuous_item(item_key, x, y, entry[0])
+    _update_cache_label()
+
+
+# --- Render por mosaicos (zoom alto) ---
+def _use_tiles(page_obj, scale_val) -> bool:
+    """True si la página a esta escala es lo bastante grande para renderizarla por mosaicos."""
+    if not _get_boolvar(tiled_var, True):
+        return False
+    with doc_lock:
+        rect = page_obj.rect
+    return rect.width * scale_val * rect.height * scale_val > TILE_MIN_PIXELS
+
+
+def _show_tiled_page(width: int, height: int):
+    """Prepara el canvas para una página por mosaicos y pinta los que ya estén en caché."""
+    global tiled_page, tile_items, rect_coords, rect_id, pending_view, preview_img, cont_layout, cont_items
+    tiled_page = (doc_key, current_page_index, scale, width, height)
+    tile_items = {}
+    cont_layout, cont_items = None, {}
+    # La vista previa del zoom se queda debajo hasta que la cubran los mosaicos
+    if preview_img is not None and preview_for == (doc_key, current_page_index, scale):
+        for item in canvas.find_all():
+            if "preview" not in canvas.gettags(item):
+                canvas.delete(item)
+    else:
+        canvas.delete("all")
+        preview_img = None
+    canvas.config(scrollregion=(0, 0, width, height))
+    canvas.create_rectangle(0, 0, width, height, fill="white", outline="", tags="page_bg")
+    canvas.tag_lower("page_bg")
+    if pending_view is not None:
+        canvas.xview_moveto(pending_view[0])
+        canvas.yview_moveto(pending_view[1])
+        pending_view = None
+    rect_coords = None
+    rect_id = None
+    if page_label_var is not None and doc is not None:
+        page_label_var.set(f"Página {current_page_index + 1} / {doc.page_count} (mosaicos)")
+    _draw_overlays()
+    _draw_search_hits()
+    _schedule_prefetch(current_page_index)
+    _request_page_index(current_page_index)
+    _update_visible_tiles()
+
+
+def _visible_tiles():
+    """Mosaicos (tx, ty, x0, y0, x1, y1) que cortan la zona visible más un margen."""
+    if tiled_page is None:
+        return []
+    return _tiles_in_view(tiled_page[3], tiled_page[4])
+
+
+def _tiles_in_view(width: int, height: int, ox: int = 0, oy: int = 0):
+    """Mosaicos visibles de una página de width x height dibujada con su esquina en (ox, oy).
+
+    Las coordenadas de los mosaicos son relativas a la página.
+    """
+    vx0, vy0 = canvas.canvasx(0) - ox, canvas.canvasy(0) - oy
+    vx1, vy1 = vx0 + canvas.winfo_width(), vy0 + canvas.winfo_height()
+    cols = (width + TILE_SIZE - 1) // TILE_SIZE
+    rows = (height + TILE_SIZE - 1) // TILE_SIZE
+    tx0 = max(0, int(vx0 // TILE_SIZE) - TILE_MARGIN)
+    ty0 = max(0, int(vy0 // TILE_SIZE) - TILE_MARGIN)
+    tx1 = min(cols - 1, int(vx1 // TILE_SIZE) + TILE_MARGIN)
+    ty1 = min(rows - 1, int(vy1 // TILE_SIZE) + TILE_MARGIN)
+    tiles = []
+    for ty in range(ty0, ty1 + 1):
+        for tx in range(tx0, tx1 + 1):
+            x0, y0 = tx * TILE_SIZE, ty * TILE_SIZE
+            tiles.append((tx, ty, x0, y0, min(width, x0 + TILE_SIZE), min(height, y0 + TILE_SIZE)))
+    # Primero los del centro de la vista
+    cx, cy = (vx0 + vx1) / 2, (vy0 + vy1) / 2
+    tiles.sort(key=lambda t: abs((t[2] + t[4]) / 2 - cx) + abs((t[3] + t[5]) / 2 - cy))
+    return tiles
+
+
+def _update_visible_tiles():
+    """Dibuja los mosaicos visibles que están en caché, pide el resto y suelta los lejanos."""
+    global tile_update_job, render_worker
+    tile_update_job = None
+    if tiled_page is None or doc is None:
+        return
+    key_doc, page_index, scale_val = tiled_page[:3]
+    tiles = _visible_tiles()
+    wanted = {(t[0], t[1]) for t in tiles}
+    # Los mosaicos fuera de la zona visible salen del canvas (siguen en la caché LRU)
+    for pos in list(tile_items):
+        if pos not in wanted:
+            canvas.delete(tile_items.pop(pos))
+    missing = []
+    for t in tiles:
+        if (t[0], t[1]) in tile_items:
+            continue
+        cached = tile_cache.get(_tile_key(key_doc, page_index, scale_val, t[0], t[1]))
+        if cached is not None:
+            _draw_tile(t[0], t[1], t[2], t[3], cached[0])
+        else:
+            missing.append(t)
+    if missing:
+        if render_worker is None:
+            render_worker = RenderWorker()
+            render_worker.start()
+        render_worker.submit(render_generation, doc, key_doc, page_index, scale_val, tiles=missing)
+    _update_cache_label()
+
+
+def _draw_tile(tx: int, ty: int, x0: int, y0: int, photo):
+    if (tx, ty) in tile_items:
+        return
+    tile_items[(tx, ty)] = canvas.create_image(x0, y0, anchor=tk.NW, image=photo, tags="tile")
+    _note_first_render()
+    # Mosaicos por debajo de selección, marcas y overlay (y encima de la vista previa)
+    canvas.tag_lower("tile")
+    canvas.tag_lower("preview")
+    canvas.tag_lower("page_bg")
+
+
+# --- Modo continuo: todas las páginas apiladas, sólo se dibuja lo visible ---
+def _show_continuous(page_number: int, view=None):
+    """Entra al modo continuo (o cambia de página dentro de él) sin limpiar el canvas si no hace falta."""
+    global cont_layout, cont_items, cont_wanted, tiled_page, tile_items, tk_img, preview_img
+    global rect_coords, rect_id, pending_view
+    key = (doc_key, scale)
+    if cont_layout is None or cont_layout.key != key:
+        cont_layout = PageLayout(key, doc.page_sizes(), scale)
+        cont_items, cont_wanted = {}, set()
+        tiled_page, tile_items, tk_img, preview_img = None, {}, None, None
+        rect_coords, rect_id = None, None
+        canvas.delete("all")
+        canvas.config(scrollregion=(0, 0, cont_layout.width, cont_layout.height))
+        _draw_overlays()
+        _draw_search_hits()
+    pending_view = None
+    if view is not None:
+        canvas.xview_moveto(view[0])
+        canvas.yview_moveto(view[1])
+    else:
+        canvas.yview_moveto((cont_layout.offsets[page_number] - PAGE_GAP_PX) / cont_layout.height)
+    _update_continuous_view()
+
+
+def _leave_continuous():
+    """Vuelve al modo página: el canvas se limpia y los renders en vuelo van a la página actual."""
+    global cont_layout, cont_items, cont_wanted, rect_coords, rect_id
+    cont_layout, cont_items, cont_wanted = None, {}, set()
+    rect_coords, rect_id = None, None
+    canvas.delete("all")
+
+
+def _update_continuous_view():
+    """Dibuja lo visible (páginas o mosaicos) desde la caché, pide lo que falte y suelta lo lejano.
+
+    En el canvas sólo quedan las páginas cerca de la vista, así que la memoria no depende
+    del número de páginas: las imágenes viven en las cachés LRU con su presupuesto.
+    """
+    global tile_update_job, render_worker, cont_wanted, current_page_index, page
+    tile_update_job = None
+    layout = cont_layout
+    if layout is None or doc is None or layout.key != (doc_key, scale):
+        return  # Zoom en curso: _finish_zoom rehace el layout
+    view_h = canvas.winfo_height()
+    vy0 = canvas.canvasy(0)
+    first = layout.page_at(vy0 - view_h / 2)
+    last = layout.page_at(vy0 + view_h * 1.5)
+    # La página del centro de la vista pasa a ser la actual
+    center = layout.page_at(vy0 + view_h / 2)
+    if center != current_page_index:
+        current_page_index = center
+        with doc_lock:
+            page = doc[center]
+        _mark_current_thumb()
+    tiles_on = _get_boolvar(tiled_var, True)
+    wanted = {}  # clave -> (caché, clave de caché, x, y, mosaico)
+    for i in range(first, last + 1):
+        ox, oy = layout.origin(i)
+        w, h = layout.sizes[i]
+        wanted[(i, "bg")] = None
+        if tiles_on and w * h > TILE_MIN_PIXELS:
+            for t in _tiles_in_view(w, h, ox, oy):
+                wanted[(i, (t[0], t[1]))] = (tile_cache, _tile_key(doc_key, i, scale, t[0], t[1]), ox + t[2], oy + t[3], t)
+        else:
+            wanted[(i, None)] = (render_cache, _page_key(doc_key, i, scale), ox, oy, None)
+    cont_wanted = set(wanted)
+    for item_key in [k for k in cont_items if k not in wanted]:
+        canvas.delete(cont_items.pop(item_key)[0])
+    missing = []
+    for item_key, spec in wanted.items():
+        if item_key in cont_items:
+            continue
+        i = item_key[0]
+        if spec is None:
+            ox, oy = layout.origin(i)
+            w, h = layout.sizes[i]
+            bg = canvas.create_rectangle(ox, oy, ox + w, oy + h, fill="white", outline="#999999", tags="page_bg")
+            canvas.tag_lower(bg)
+            cont_items[item_key] = (bg, None)
+            continue
+        cache, cache_key, x, y, tile = spec
+        cached = cache.get(cache_key)
+        if cached is not None:
+            _draw_continuous_item(item_key, x, y, cached[0])
+        else:
+            missing.append((i, tile))
+    if missing:
+        # Primero lo más cercano al centro de la vista
+        missing.sort(key=lambda job: abs(job[0] - center))
+        if render_worker is None:
+            render_worker = RenderWorker()
+            render_worker.start()
+        render_worker.submit_jobs(render_generation, doc, doc_key, scale, missing)
+    for i in range(first, last + 1):
+        _request_page_index(i)
+    if page_label_var is not None:
+        page_label_var.set(f"Página {current_page_index + 1} / {doc.page_count} (continuo)")
+    _update_cache_label()
+
+
+def _draw_continuous_item(item_key, x: int, y: int, photo):
+    item = canvas.create_image(x, y, anchor=tk.NW, image=photo, tags="cpage")
+    # La referencia a la imagen se guarda aunque la caché la desaloje mientras está a la vista
+    cont_items[item_key] = (item, photo)
+    _note_first_render()
+    # Por debajo de selección, marcas y overlays; por encima del fondo de las páginas
+    canvas.tag_lower("cpage")
+    canvas.tag_lower("page_bg")
+
+
+def _schedule_tile_update():
+    """Agrupa varios eventos de scroll/redimensión en una sola actualización de mosaicos."""
+    global tile_update_job
+    if tile_update_job is not None:
+        return
+    if cont_layout is not None:
+        tile_update_job = root.after_idle(_update_continuous_view)
+    elif tiled_page is not None:
+        tile_update_job = root.after_idle(_update_visible_tiles)
+
 
+def _on_xscroll(*args):
+    h_scroll.set(*args)
+    _schedule_tile_update()
+
+
+def _on_yscroll(*args):
+    v_scroll.set(*args)
+    _schedule_tile_update()
 
-def _get_pixmap(page_obj, scale_val) -> Any:
-    """Compatibilidad entre PyMuPDF 1.19+ (get_pixmap) y versiones antiguas (getPixmap)."""
-    mat = fitz.Matrix(scale_val, scale_val)
-    get_pm = getattr(page_obj, "get_pixmap", None)
-    if callable(get_pm):
-        return get_pm(matrix=mat)  # type: ignore[attr-defined]
-    # Fallback antiguo
-    get_pm_old = getattr(page_obj, "getPixmap", None)
-    if callable(get_pm_old):
-        return get_pm_old(matrix=mat)  # type: ignore[attr-defined]
-    raise AttributeError("La página no soporta get_pixmap/getPixmap")
-
-
-def _insert_text(page_obj, point_xy, text, fontsize=12, color=(1, 0, 0)):
-    """Compatibilidad entre insert_text e insertText."""
-    ins = getattr(page_obj, "insert_text", None)
-    if callable(ins):
-        return ins(point_xy, text, fontsize=fontsize, color=color)  # type: ignore[attr-defined]
-    ins_old = getattr(page_obj, "insertText", None)
-    if callable(ins_old):
-        return ins_old(point_xy, text, fontsize=fontsize, color=color)  # type: ignore[attr-defined]
-    raise AttributeError("La página no soporta insert_text/insertText")
 
 def open_pdf():
-    global doc, page, pdf_path
+    """Abre un PDF en segundo plano; el documento actual sigue a la vista hasta que llega el nuevo."""
+    global open_worker, open_timing
     file = filedialog.askopenfilename(title="Seleccionar PDF", filetypes=[("PDF files", "*.pdf")])
     if not file:
         return
-    try:
-        pdf_path = file
-        doc = fitz.open(file)
-        load_page(0)  # Cargar primera página
-    except Exception as e:
-        messagebox.showerror("Error", f"No se pudo abrir el PDF:\n{e}")
+    _stop_open()
+    open_timing = {"inicio": time.perf_counter()}
+    open_worker = OpenWorker(file)
+    open_worker.start()
+    if btn_cancel_open is not None:
+        btn_cancel_open.config(state=tk.NORMAL)
+    _update_open_status()
+
+
+def _stop_open():
+    global open_worker
+    if open_worker is not None:
+        open_worker.stop()
+        open_worker = None
+    if btn_cancel_open is not None:
+        btn_cancel_open.config(state=tk.DISABLED)
+
+
+def on_cancel_open():
+    """Abandona la apertura en curso (fitz.open no se puede interrumpir: su resultado se descarta)."""
+    global open_timing
+    if open_worker is None:
+        return
+    _stop_open()
+    open_timing = None
+    if status_var is not None:
+        status_var.set("Apertura cancelada")
+
+
+def _deliver_open(worker: OpenWorker, msg):
+    """Aplica en el hilo de Tk cada paso de la apertura en segundo plano."""
+    global doc, doc_key, session, open_worker, active_overlay, render_generation
+    global thumb_worker, thumb_layout, thumb_items, search_index, search_worker, search_hits, search_pos
+    kind = msg[0]
+    if kind == "error":
+        _stop_open()
+        if status_var is not None:
+            status_var.set("")
+        messagebox.showerror("Error", f"No se pudo abrir el PDF:\n{msg[1]}")
+        return
+    if kind == "doc":
+        _, document, secs, repaired = msg
+        # El nuevo documento ya está leído: cancelar ya no tiene sentido
+        if btn_cancel_open is not None:
+            btn_cancel_open.config(state=tk.DISABLED)
+        open_timing.update(abrir=secs, reparado=repaired)
+        with doc_lock:
+            _stop_prefetch()
+            # Los trabajos en vuelo del anterior se abandonan antes de tocarlo (abort() lo ve con el candado)
+            render_generation += 1
+            previous, doc = doc, document
+            doc_key = document.key
+            # Cerrarlo ya suelta el archivo (en Windows, si no, bloquea reemplazarlo al guardar)
+            if previous is not None and previous is not document:
+                previous.close()
+        # Los overlays pendientes eran del documento anterior
+        session = Session(document)
+        active_overlay = None
+        _update_overlay_count()
+        # Miniaturas y búsqueda esperan a que termine la lectura de páginas
+        if thumb_worker is not None:
+            thumb_worker.stop()
+            thumb_worker = None
+        if search_worker is not None:
+            search_worker.stop()
+            search_worker = None
+        thumb_layout, thumb_items = None, {}
+        thumb_canvas.delete("all")
+        search_index, search_hits, search_pos = None, [], -1
+        _update_search_label()
+        _set_outline([])
+        root.title(f"{os.path.basename(worker.path)} — {APP_TITLE}")
+        load_page(0)
+        return
+    if kind == "progress":
+        open_timing["progreso"] = msg[1:]
+        return
+    _, toc, metadata = msg
+    open_worker = None
+    open_timing["info"] = time.perf_counter()
+    _start_search_index()
+    _show_thumbnails()
+    _set_outline(toc)
+    title = (metadata.get("title") or "").strip()
+    if title:
+        author = (metadata.get("author") or "").strip()
+        root.title(f"{title}{' — ' + author if author else ''} ({os.path.basename(worker.path)}) — {APP_TITLE}")
+    # El modo continuo esperaba a conocer el tamaño de todas las páginas
+    if _get_boolvar(continuous_var, False) and cont_layout is None:
+        load_page(current_page_index)
+    _update_open_status()
+
 
-def load_page(page_number):
-    global page, img, tk_img, canvas, scale, current_page_index, rect_coords, rect_id, page_label_var
+def _note_first_render():
+    """Marca el momento en que la primera imagen del documento recién abierto llega al canvas."""
+    if open_timing is not None and "abrir" in open_timing and "render" not in open_timing:
+        open_timing["render"] = time.perf_counter()
+        _update_open_status()
+
+
+def _update_open_status():
+    """Progreso de la apertura y, al terminar, su desglose: abrir, primera página e interactivo."""
+    if status_var is None or open_timing is None:
+        return
+    t = open_timing
+    if "abrir" not in t:
+        status_var.set(f"Abriendo… {time.perf_counter() - t['inicio']:.1f} s")
+        return
+    parts = [f"abrir {t['abrir'] * 1000:.0f} ms"]
+    if "render" in t:
+        parts.append(f"1.ª página {(t['render'] - t['inicio']) * 1000:.0f} ms")
+    if "render" in t and "info" in t:
+        parts.append(f"interactivo {(max(t['render'], t['info']) - t['inicio']) * 1000:.0f} ms")
+    elif "info" not in t and "progreso" in t:
+        parts.append("leyendo páginas {}/{}".format(*t["progreso"]))
+    if t.get("reparado"):
+        parts.append("archivo reparado")
+    status_var.set(" · ".join(parts))
+
+
+def _set_outline(toc):
+    """Llena el menú Índice con los marcadores del documento."""
+    if outline_menu is None:
+        return
+    outline_menu.delete(0, tk.END)
+    entries = [(level, title, page_no) for level, title, page_no, *_ in toc if page_no >= 1]
+    for level, title, page_no in entries[:OUTLINE_MAX_ITEMS]:
+        outline_menu.add_command(label="    " * (level - 1) + title, command=lambda p=page_no - 1: load_page(p))
+    if len(entries) > OUTLINE_MAX_ITEMS:
+        outline_menu.add_command(label=f"… {len(entries) - OUTLINE_MAX_ITEMS} más", state=tk.DISABLED)
+    outline_button.config(state=tk.NORMAL if entries else tk.DISABLED)
+
+def load_page(page_number, view=None):
+    """Muestra una página: al instante si está en caché, si no la pide al worker.
+
+    `view` es un (x_frac, y_frac) de scroll a restaurar cuando la página se dibuje.
+    """
+    global page, current_page_index, page_label_var, render_generation, render_worker, pending_view
     if doc is None:
         messagebox.showwarning("Aviso", "Primero abre un archivo PDF.")
         return
@@ -92,44 +1085,92 @@ def load_page(page_number):
         if page_number > total - 1:
             page_number = total - 1
         current_page_index = page_number
-        page = doc[page_number]
-        # Renderizar página como imagen
-        pix: Any = _get_pixmap(page, scale)
-        mode = "RGBA" if pix.alpha else "RGB"
-        img = Image.frombytes(mode, (pix.width, pix.height), pix.samples)
-        tk_img = ImageTk.PhotoImage(img)
-        # Limpiar canvas antes de dibujar
-        canvas.delete("all")
-        canvas.config(scrollregion=(0, 0, pix.width, pix.height))
-        canvas_image = canvas.create_image(0, 0, anchor=tk.NW, image=tk_img)
-        # Reset selección
-        rect_coords = None
-        rect_id = None
+        with doc_lock:
+            page = doc[page_number]
+        render_generation += 1
+        _mark_current_thumb()
+        pending_view = view
         # Actualizar etiqueta de página si existe
         if page_label_var is not None:
             page_label_var.set(f"Página {current_page_index + 1} / {doc.page_count}")
-        # Redibujar overlay si existe
-        _draw_overlay()
+        # Mientras OpenWorker lee el tamaño de las páginas se muestra la página sola
+        sizes_ready = open_worker is None or doc.sizes_loaded
+        if _get_boolvar(continuous_var, False) and sizes_ready:
+            _show_continuous(page_number, view)
+            return
+        if cont_layout is not None:
+            _leave_continuous()
+        if _use_tiles(page, scale):
+            with doc_lock:
+                rect = page.rect
+            _show_tiled_page(int(round(rect.width * scale)), int(round(rect.height * scale)))
+            return
+        # Reutilizar la página ya renderizada a esta escala si está en caché
+        cached = render_cache.get(_page_key(doc_key, page_number, scale))
+        _update_cache_label()
+        if cached is not None:
+            _show_page(*cached)
+            return
+        # Renderizar fuera del hilo de Tk; la página actual sigue visible mientras tanto
+        if render_worker is None:
+            render_worker = RenderWorker()
+            render_worker.start()
+        render_worker.submit(render_generation, doc, doc_key, page_number, scale)
+        if page_label_var is not None:
+            page_label_var.set(f"Página {current_page_index + 1} / {doc.page_count} (renderizando…)")
     except Exception as e:
         messagebox.showerror("Error", f"No se pudo cargar la página {page_number}:\n{e}")
 
+
+def _show_page(photo, width, height):
+    """Dibuja en el canvas la imagen de la página actual."""
+    global tk_img, rect_coords, rect_id, pending_view, tiled_page, preview_img, cont_layout, cont_items
+    tk_img = photo
+    tiled_page = None
+    preview_img = None
+    cont_layout, cont_items = None, {}
+    # Limpiar canvas antes de dibujar
+    canvas.delete("all")
+    canvas.config(scrollregion=(0, 0, width, height))
+    canvas.create_image(0, 0, anchor=tk.NW, image=tk_img)
+    _note_first_render()
+    if pending_view is not None:
+        canvas.xview_moveto(pending_view[0])
+        canvas.yview_moveto(pending_view[1])
+        pending_view = None
+    # Reset selección
+    rect_coords = None
+    rect_id = None
+    if page_label_var is not None and doc is not None:
+        page_label_var.set(f"Página {current_page_index + 1} / {doc.page_count}")
+    _update_cache_label()
+    # Redibujar los overlays de esta página
+    _draw_overlays()
+    _draw_search_hits()
+    # Adelantar el render de las páginas vecinas
+    _schedule_prefetch(current_page_index)
+    _request_page_index(current_page_index)
+
 def on_mouse_down(event):
-    global start_x, start_y, overlay_dragging, overlay_drag_offset, selection_dragging, rect_id
+    global start_x, start_y, overlay_dragging, overlay_drag_offset, selection_dragging, rect_id, selection_page
     cx = canvas.canvasx(event.x)
     cy = canvas.canvasy(event.y)
     # Modo coordenadas: registrar y terminar
     if _get_mode() == 'coords':
         _handle_click_coords(cx, cy)
         return
-    # Si clic sobre el overlay, iniciar drag
-    if overlay_id is not None:
-        items = canvas.find_withtag("current")
-        if items and overlay_id in items:
-            overlay_dragging = True
-            ox, oy = canvas.coords(overlay_id)
-            overlay_drag_offset = (cx - ox, cy - oy)
-            return
-    # Si no, iniciar selección
+    # Si clic sobre un overlay, activarlo e iniciar drag
+    items = canvas.find_withtag("current")
+    ov = overlay_items.get(items[0]) if items else None
+    if ov is not None:
+        if ov is not active_overlay:
+            _select_overlay(ov)
+        overlay_dragging = True
+        ox, oy = canvas.coords(ov.item_id)
+        overlay_drag_offset = (cx - ox, cy - oy)
+        return
+    # Si no, iniciar selección (en la página bajo el cursor)
+    selection_page = _to_pdf(cx, cy)[0]
     start_x, start_y = cx, cy
     selection_dragging = True
     # iniciar rectángulo visual
@@ -138,7 +1179,7 @@ def on_mouse_down(event):
     rect_id = canvas.create_rectangle(start_x, start_y, start_x, start_y, outline='red', width=2, dash=(3, 3))
 
 def on_mouse_up(event):
-    global rect_coords, rect_id, overlay_dragging, overlay_pdf_pos, selection_dragging
+    global rect_coords, rect_id, overlay_dragging, selection_dragging
     cx = canvas.canvasx(event.x)
     cy = canvas.canvasy(event.y)
     if _get_mode() == 'coords':
@@ -146,9 +1187,10 @@ def on_mouse_up(event):
     if overlay_dragging:
         # Finalizar drag y actualizar posición PDF
         overlay_dragging = False
-        if overlay_id is not None:
-            ox, oy = canvas.coords(overlay_id)
-            overlay_pdf_pos = (ox / scale, oy / scale)
+        if active_overlay is not None and active_overlay.item_id is not None:
+            ox, oy = _overlay_baseline(active_overlay, *canvas.coords(active_overlay.item_id))
+            # En modo continuo puede haber caído en otra página: la que queda bajo el punto
+            active_overlay.page, active_overlay.x, active_overlay.y = _to_pdf(ox, oy)
         return
     # Finalizar selección
     selection_dragging = False
@@ -157,13 +1199,20 @@ def on_mouse_up(event):
     # Normalizar coordenadas (x1,y1) = esquina superior-izquierda, (x2,y2) = inferior-derecha
     x1, y1 = min(start_x, end_x), min(start_y, end_y)
     x2, y2 = max(start_x, end_x), max(start_y, end_y)
+    # Ajustar las esquinas a renglones/líneas cercanos
+    _, px1, py1 = _to_pdf(x1, y1, selection_page)
+    _, px2, py2 = _to_pdf(x2, y2, selection_page)
+    sx1, sy1, _ = _snap(px1, py1, selection_page)
+    sx2, sy2, _ = _snap(px2, py2, selection_page)
+    if sx2 > sx1 and sy2 > sy1:
+        (x1, y1), (x2, y2) = _to_canvas(selection_page, sx1, sy1), _to_canvas(selection_page, sx2, sy2)
     rect_coords = (x1, y1, x2, y2)
     # Actualizar rectángulo visual existente
     if rect_id is not None:
         canvas.coords(rect_id, x1, y1, x2, y2)
-    # Calcular coordenadas PDF (dividir por escala)
-    pdf_x1, pdf_y1 = x1 / scale, y1 / scale
-    pdf_x2, pdf_y2 = x2 / scale, y2 / scale
+    # Calcular coordenadas PDF (relativas a la página de la selección)
+    _, pdf_x1, pdf_y1 = _to_pdf(x1, y1, selection_page)
+    _, pdf_x2, pdf_y2 = _to_pdf(x2, y2, selection_page)
     # Actualizar etiqueta y copiar si procede
     if isinstance(rect_label_var, tk.StringVar):
         rect_label_var.set(f"x1={pdf_x1:.2f}, y1={pdf_y1:.2f}, x2={pdf_x2:.2f}, y2={pdf_y2:.2f}")
@@ -187,40 +1236,108 @@ def on_shift_mouse_wheel(event):
         canvas.xview_scroll(-1 if event.delta > 0 else 1, "units")
 
 def zoom_in():
-    global scale
-    if doc is None:
-        return
-    x_frac, y_frac = canvas.xview()[0], canvas.yview()[0]
-    scale = min(scale + 0.5, MAX_SCALE)
-    load_page(current_page_index)
-    canvas.xview_moveto(x_frac)
-    canvas.yview_moveto(y_frac)
+    _zoom_to(scale + 0.5)
 
 def zoom_out():
-    global scale
+    _zoom_to(scale - 0.5)
+
+
+def _zoom_to(new_scale: float):
+    """Cambia la escala mostrando al instante una vista previa; el render nítido se agrupa."""
+    global scale, zoom_job, render_generation
     if doc is None:
         return
-    x_frac, y_frac = canvas.xview()[0], canvas.yview()[0]
-    scale = max(scale - 0.5, MIN_SCALE)
-    load_page(current_page_index)
-    canvas.xview_moveto(x_frac)
-    canvas.yview_moveto(y_frac)
+    new_scale = min(max(new_scale, MIN_SCALE), MAX_SCALE)
+    if new_scale == scale:
+        return
+    view = (canvas.xview()[0], canvas.yview()[0])
+    old_scale = scale
+    scale = new_scale
+    # Lo que esté en vuelo para la escala anterior ya no debe llegar al canvas
+    render_generation += 1
+    # En modo continuo no hay vista previa: el layout se rehace al terminar el zoom
+    if cont_layout is None:
+        _show_zoom_preview(old_scale, view)
+    # Varios pasos seguidos de zoom cuestan un solo render nítido
+    if zoom_job is not None:
+        root.after_cancel(zoom_job)
+    zoom_job = root.after(ZOOM_DEBOUNCE_MS, _finish_zoom)
+
+
+def _finish_zoom():
+    global zoom_job
+    zoom_job = None
+    if doc is not None:
+        load_page(current_page_index, view=(canvas.xview()[0], canvas.yview()[0]))
+
+
+def _show_zoom_preview(old_scale: float, view):
+    """Muestra la zona visible reescalada desde la caché o desde un render rápido de baja resolución."""
+    global preview_img, preview_for, tiled_page, rect_coords, rect_id
+    # Si el worker tiene ocupado el documento no esperamos: el render nítido llegará igual
+    if page is None or not doc_lock.acquire(timeout=0.02):
+        return
+    try:
+        rect = page.rect
+        width, height = int(round(rect.width * scale)), int(round(rect.height * scale))
+        # Fuente 1: la página ya renderizada a la escala anterior
+        source, zoom, sub = None, 1, 1
+        cached = render_cache.peek(_page_key(doc_key, current_page_index, old_scale))
+        # Fuente 2: render a scale/k con k entero, que luego Tk amplía k veces
+        k = max(1, math.ceil(math.sqrt(rect.width * scale * rect.height * scale / PREVIEW_MAX_PIXELS)))
+        if cached is not None:
+            ratio = Fraction(scale / old_scale).limit_denominator(10)
+            # Tk submuestrea antes de ampliar: sólo conviene si no pierde más detalle que el render rápido
+            if old_scale / ratio.denominator >= scale / k:
+                source, zoom, sub = cached[0], ratio.numerator, ratio.denominator
+        if source is None:
+            pix: Any = get_pixmap(page, scale / k, colorspace=render_colorspace)
+            source = tk.PhotoImage(data=pixmap_ppm(pix, render_colorspace), format="PPM")
+            zoom, sub = k, 1
+            del pix
+    finally:
+        doc_lock.release()
+    tiled_page = None
+    rect_coords = None
+    rect_id = None
+    canvas.delete("all")
+    canvas.config(scrollregion=(0, 0, width, height))
+    canvas.create_rectangle(0, 0, width, height, fill="white", outline="", tags="page_bg")
+    canvas.xview_moveto(view[0])
+    canvas.yview_moveto(view[1])
+    # Sólo se amplía la parte visible: el coste no depende del tamaño de la página
+    ratio_f = zoom / sub
+    vx0, vy0 = canvas.canvasx(0), canvas.canvasy(0)
+    fx0, fy0 = max(0, int(vx0 / ratio_f)), max(0, int(vy0 / ratio_f))
+    fx1 = min(source.width(), int((vx0 + canvas.winfo_width()) / ratio_f) + 1)
+    fy1 = min(source.height(), int((vy0 + canvas.winfo_height()) / ratio_f) + 1)
+    preview_img = None
+    if fx1 > fx0 and fy1 > fy0:
+        preview_img = tk.PhotoImage()
+        preview_img.tk.call(preview_img, "copy", source, "-from", fx0, fy0, fx1, fy1,
+                            "-zoom", zoom, zoom, "-subsample", sub, sub)
+        canvas.create_image(fx0 * ratio_f, fy0 * ratio_f, anchor=tk.NW, image=preview_img, tags="preview")
+        preview_for = (doc_key, current_page_index, scale)
+    _draw_overlays()
+    _draw_search_hits()
 
 def on_mouse_move(event):
     # Drag del overlay
-    global overlay_dragging, overlay_drag_offset, overlay_pdf_pos, selection_dragging, rect_id
+    global overlay_dragging, overlay_drag_offset, selection_dragging, rect_id
     if _get_mode() == 'coords':
         return
-    if overlay_dragging and overlay_id is not None:
+    ov = active_overlay
+    if overlay_dragging and ov is not None and ov.item_id is not None:
         cx = canvas.canvasx(event.x)
         cy = canvas.canvasy(event.y)
         dx, dy = overlay_drag_offset
         new_x = cx - dx
         new_y = cy - dy
-        canvas.coords(overlay_id, new_x, new_y)
-        _update_overlay_bg()
-        # Actualizar posición PDF en vivo
-        overlay_pdf_pos = (new_x / scale, new_y / scale)
+        canvas.coords(ov.item_id, new_x, new_y)
+        _update_overlay_bg(ov)
+        _mark_active_overlay()
+        # Actualizar posición PDF en vivo (y la página, si el arrastre cruza a otra en modo continuo)
+        ov.page, ov.x, ov.y = _to_pdf(*_overlay_baseline(ov, new_x, new_y))
     elif selection_dragging and rect_id is not None:
         cx = canvas.canvasx(event.x)
         cy = canvas.canvasy(event.y)
@@ -235,15 +1352,19 @@ def _get_mode() -> str:
 
 def _handle_click_coords(cx: float, cy: float):
     # Dibuja un marcador y actualiza label / portapapeles
+    # Ajustar al renglón/línea más cercano si hay índice de la página
+    page_index, x_pdf, y_pdf = _to_pdf(cx, cy)
+    x_pdf, y_pdf, kind = _snap(x_pdf, y_pdf, page_index)
+    cx, cy = _to_canvas(page_index, x_pdf, y_pdf)
     # Borrar marcador anterior
     canvas.delete(click_marker_tag)
     size = 6
     color = '#00ccff'
     canvas.create_line(cx - size, cy, cx + size, cy, fill=color, width=2, tags=click_marker_tag)
     canvas.create_line(cx, cy - size, cx, cy + size, fill=color, width=2, tags=click_marker_tag)
-    x_pdf, y_pdf = cx / scale, cy / scale
     if isinstance(last_coords_var, tk.StringVar):
-        last_coords_var.set(f"x={x_pdf:.2f}, y={y_pdf:.2f}")
+        where = f"p. {page_index + 1}: " if cont_layout is not None else ""
+        last_coords_var.set(f"{where}x={x_pdf:.2f}, y={y_pdf:.2f}" + (f" ({kind})" if kind else ""))
     if _get_boolvar(auto_copy_coords_var, True):
         try:
             root.clipboard_clear()
@@ -268,43 +1389,24 @@ def prev_page():
         load_page(current_page_index - 1)
 
 def insert_text():
-    global rect_coords, page, doc, pdf_path
+    """Añade el texto pedido como overlay pendiente en la esquina de la selección."""
     if rect_coords is None:
         messagebox.showwarning("Aviso", "Primero selecciona un área con el mouse.")
         return
     if doc is None or page is None:
         messagebox.showwarning("Aviso", "No hay documento o página cargada.")
         return
-    # Tomar punto superior izquierdo del rectángulo
-    x_pdf = rect_coords[0] / scale
-    y_pdf = rect_coords[1] / scale
+    # La línea base va en la esquina inferior izquierda: el texto queda dentro de la selección
+    page_index, x_pdf, y_pdf = _to_pdf(rect_coords[0], rect_coords[3], selection_page)
     texto = simpledialog.askstring("Texto", "Introduce el texto a insertar:")
-    if texto:
-        try:
-            _insert_text(page, (x_pdf, y_pdf), texto, fontsize=12, color=(1, 0, 0))
-            # Guardar PDF nuevo
-            if not pdf_path:
-                raise ValueError("Ruta del PDF original no disponible")
-            base, ext = os.path.splitext(pdf_path)
-            new_file = f"{base}_modificado{ext or '.pdf'}"
-            doc.save(new_file)
-            messagebox.showinfo("Éxito", f"Texto insertado y guardado en:\n{new_file}")
-            # Refrescar la vista para ver el cambio
-            load_page(current_page_index)
-        except Exception as e:
-            messagebox.showerror("Error", f"No se pudo insertar texto o guardar el archivo:\n{e}")
-
-# Utilidades de color
-def _hex_to_rgb01(hex_color: str):
-    hex_color = hex_color.lstrip('#')
-    if len(hex_color) == 3:
-        hex_color = ''.join(c*2 for c in hex_color)
-    if len(hex_color) != 6:
-        return (1.0, 0.0, 0.0)
-    r = int(hex_color[0:2], 16)/255.0
-    g = int(hex_color[2:4], 16)/255.0
-    b = int(hex_color[4:6], 16)/255.0
-    return (r, g, b)
+    if texto and texto.strip():
+        # Se guarda junto con el resto al pulsar "Insertar todo en PDF"
+        ov = Overlay(page_index, x_pdf, y_pdf, texto.strip(), size=12, color="#ff0000",
+                     family=_get_strvar(overlay_font_family_var, "Arial"))
+        session.add(ov)
+        _select_overlay(ov)
+        _draw_one_overlay(ov)
+        _update_overlay_count()
 
 # Utilidades para variables Tkinter seguras
 def _get_strvar(v: Optional[tk.StringVar], default: str) -> str:
@@ -316,108 +1418,395 @@ def _get_intvar(v: Optional[tk.IntVar], default: int) -> int:
 def _get_boolvar(v: Optional[tk.BooleanVar], default: bool) -> bool:
     return v.get() if isinstance(v, tk.BooleanVar) else default
 
-# --- Overlay de texto interactivo ---
-def _draw_overlay():
-    """Dibuja o actualiza el overlay de texto según overlay_pdf_pos y overlay_font_var."""
-    global overlay_id
-    if overlay_pdf_pos is None or overlay_text_var is None or overlay_font_var is None:
-        return
-    text = overlay_text_var.get().strip()
-    if not text:
-        return
+# --- Overlays de texto interactivos (pendientes hasta "Insertar todo") ---
+class Overlay(TextOverlay):
+    """TextOverlay con los items del canvas que lo dibujan mientras su página está a la vista."""
+
+    __slots__ = ("item_id", "bg_id", "drawn")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.item_id = None
+        self.bg_id = None
+        self.drawn = None  # (texto, fuente, color, ancho, alto, ascenso) con que está dibujado item_id
+
+
+def _overlay_from_controls(page_index: int, x: float, y: float, text: Optional[str] = None) -> Overlay:
+    return Overlay(
+        page_index, x, y,
+        text if text is not None else _get_strvar(overlay_text_var, "").strip(),
+        size=max(6, int(_get_intvar(overlay_font_var, 12))),
+        color=_get_strvar(overlay_color_var, "#ff0000"),
+        family=_get_strvar(overlay_font_family_var, "Arial"),
+        bg_color=_get_strvar(overlay_bg_color_var, "#ffffcc") if _get_boolvar(overlay_bg_enabled_var, False) else None,
+    )
+
+
+def _update_overlay_count():
+    if overlay_count_var is not None:
+        pending = session.overlays if session is not None else []
+        pages = len({ov.page for ov in pending})
+        overlay_count_var.set(f"Pendientes: {len(pending)}" + (f" en {pages} pág." if pending else ""))
+
+
+def _overlay_font(family: str, pixels: int) -> tuple:
+    """(tkfont.Font, alto de línea, ascenso) para una familia y tamaño; se crean una sola vez."""
+    key = (family, pixels)
+    entry = overlay_fonts.get(key)
+    if entry is not None:
+        overlay_fonts.move_to_end(key)
+        return entry
+    fnt = tkfont.Font(family=family, size=-pixels)  # Negativo: píxeles; positivo serían puntos
+    entry = overlay_fonts[key] = (fnt, fnt.metrics("linespace"), fnt.metrics("ascent"))
+    if len(overlay_fonts) > FONT_CACHE_SIZE:
+        overlay_fonts.popitem(last=False)
+    return entry
+
+
+def _overlay_bbox(ov: Overlay):
+    """Rectángulo del texto en el canvas a partir de las métricas ya medidas (sin canvas.bbox)."""
+    if ov.item_id is None or ov.drawn is None:
+        return None
+    x, y = canvas.coords(ov.item_id)
+    _text, _font, _color, width, height, _ascent = ov.drawn
+    return x, y, x + width, y + height
+
+
+def _overlay_baseline(ov: Overlay, x: float, y: float):
+    """Esquina superior izquierda del item de texto (anchor nw) -> inicio de la línea base,
+    que es lo que guardan el overlay, Session.commit y las plantillas."""
+    return x, y + (ov.drawn[5] if ov.drawn is not None else 0)
+
+
+def _draw_one_overlay(ov: Overlay):
+    """Crea o actualiza los items de canvas de un overlay.
+
+    Sólo se reconfigura lo que cambió, y el ancho del texto se mide una vez por
+    texto y fuente: con letra grande y mucho zoom, rehacer el texto es lo caro.
+    """
+    x, y = _to_canvas(ov.page, ov.x, ov.y)
     # Tamaño de fuente en canvas proporcional a escala
-    pdf_fontsize = max(6, int(overlay_font_var.get()))
-    canvas_fontsize = max(6, int(round(pdf_fontsize * scale)))
-    family = _get_strvar(overlay_font_family_var, "Arial")
-    fnt = tkfont.Font(family=family, size=canvas_fontsize)
-    x = overlay_pdf_pos[0] * scale
-    y = overlay_pdf_pos[1] * scale
-    if overlay_id is None:
-        overlay_id = canvas.create_text(x, y, text=text, anchor='nw', fill=_get_strvar(overlay_color_var, "#ff0000"), font=fnt)
+    fnt, linespace, ascent = _overlay_font(ov.family, max(6, int(round(ov.size * scale))))
+    # (ov.x, ov.y) es la línea base, como al insertar en el PDF: el item (nw) va un ascenso más arriba
+    y -= ascent
+    prev = ov.drawn
+    if prev is not None and prev[0] == ov.text and prev[1] is fnt:
+        width = prev[3]
     else:
-        canvas.coords(overlay_id, x, y)
-        canvas.itemconfig(overlay_id, text=text, font=fnt, fill=_get_strvar(overlay_color_var, "#ff0000"), anchor='nw')
-    _update_overlay_bg()
-
-
-def _update_overlay_bg():
-    """Crea/actualiza el rectángulo de fondo del overlay si está habilitado."""
-    global overlay_bg_id
-    if overlay_id is None or not _get_boolvar(overlay_bg_enabled_var, False):
-        if overlay_bg_id is not None:
-            canvas.delete(overlay_bg_id)
-            overlay_bg_id = None
+        width = fnt.measure(ov.text)
+    if ov.item_id is None:
+        ov.item_id = canvas.create_text(x, y, text=ov.text, anchor='nw', fill=ov.color, font=fnt, tags="overlay")
+        overlay_items[ov.item_id] = ov
+    else:
+        canvas.coords(ov.item_id, x, y)
+        changes = {}
+        if prev is None or prev[0] != ov.text:
+            changes["text"] = ov.text
+        if prev is None or prev[1] is not fnt:
+            changes["font"] = fnt
+        if prev is None or prev[2] != ov.color:
+            changes["fill"] = ov.color
+        if changes:
+            canvas.itemconfig(ov.item_id, **changes)
+    ov.drawn = (ov.text, fnt, ov.color, width, linespace, ascent)
+    _update_overlay_bg(ov)
+    _mark_active_overlay()
+
+
+def _update_overlay_bg(ov: Optional[Overlay] = None):
+    """Crea/actualiza el rectángulo de fondo de un overlay (por defecto, el activo)."""
+    ov = ov or active_overlay
+    if ov is None or ov.item_id is None:
+        return
+    if ov.bg_color is None:
+        if ov.bg_id is not None:
+            overlay_items.pop(ov.bg_id, None)
+            canvas.delete(ov.bg_id)
+            ov.bg_id = None
         return
-    bbox = canvas.bbox(overlay_id)
+    bbox = _overlay_bbox(ov)
     if not bbox:
         return
     x1, y1, x2, y2 = bbox
     pad = 4
     bx1, by1, bx2, by2 = x1 - pad, y1 - pad, x2 + pad, y2 + pad
-    if overlay_bg_id is None:
-        overlay_bg_id = canvas.create_rectangle(bx1, by1, bx2, by2, fill=_get_strvar(overlay_bg_color_var, "#ffffcc"), outline='')
-        canvas.tag_lower(overlay_bg_id, overlay_id)
+    if ov.bg_id is None:
+        ov.bg_id = canvas.create_rectangle(bx1, by1, bx2, by2, fill=ov.bg_color, outline='', tags="overlay")
+        overlay_items[ov.bg_id] = ov
+        canvas.tag_lower(ov.bg_id, ov.item_id)
     else:
-        canvas.coords(overlay_bg_id, bx1, by1, bx2, by2)
-        canvas.itemconfig(overlay_bg_id, fill=_get_strvar(overlay_bg_color_var, "#ffffcc"))
+        canvas.coords(ov.bg_id, bx1, by1, bx2, by2)
+        canvas.itemconfig(ov.bg_id, fill=ov.bg_color)
+
+
+def _mark_active_overlay():
+    """Recuadro punteado alrededor del overlay activo."""
+    canvas.delete("overlay_active")
+    if active_overlay is None or active_overlay.item_id is None:
+        return
+    bbox = _overlay_bbox(active_overlay)
+    if bbox:
+        canvas.create_rectangle(bbox[0] - 2, bbox[1] - 2, bbox[2] + 2, bbox[3] + 2,
+                                outline="#0078d7", dash=(2, 2), tags="overlay_active")
+
+
+def _draw_overlays():
+    """Vuelve a crear los overlays de la página actual (el canvas se acaba de limpiar)."""
+    global active_overlay
+    canvas.delete("overlay")
+    overlay_items.clear()
+    if session is None:
+        return
+    for ov in session.overlays:
+        ov.item_id = ov.bg_id = ov.drawn = None
+    # En modo continuo se dibujan todos: cada uno en su página
+    if cont_layout is None and active_overlay is not None and active_overlay.page != current_page_index:
+        active_overlay = None
+    for ov in session.overlays:
+        if cont_layout is not None or ov.page == current_page_index:
+            _draw_one_overlay(ov)
+    _mark_active_overlay()
+
+
+def _draw_overlay():
+    """Aplica los controles (texto, tamaño, color, fuente, fondo) al overlay activo.
+
+    El overlay cambia en el acto, pero el canvas se actualiza como mucho una vez por
+    cuadro: teclear o arrastrar la escala de tamaño no encola un redibujado por evento.
+    """
+    global overlay_redraw_job
+    ov = active_overlay
+    if ov is None:
+        return
+    text = _get_strvar(overlay_text_var, "").strip()
+    if not text:
+        return
+    updated = _overlay_from_controls(ov.page, ov.x, ov.y, text)
+    ov.text, ov.size, ov.color, ov.family, ov.bg_color = (
+        updated.text, updated.size, updated.color, updated.family, updated.bg_color)
+    if overlay_redraw_job is None:
+        overlay_redraw_job = root.after(OVERLAY_FRAME_MS, _redraw_active_overlay)
+
+
+def _redraw_active_overlay():
+    global overlay_redraw_job
+    if overlay_redraw_job is not None:
+        root.after_cancel(overlay_redraw_job)
+        overlay_redraw_job = None
+    ov = active_overlay
+    if ov is not None and (cont_layout is not None or ov.page == current_page_index):
+        _draw_one_overlay(ov)
+
+
+def _select_overlay(ov: Optional[Overlay]):
+    """Hace activo un overlay y carga sus propiedades en los controles."""
+    global active_overlay
+    # El redibujado pendiente es del overlay que deja de estar activo
+    _redraw_active_overlay()
+    # Sin overlay activo mientras se cargan los controles: sus callbacks no deben pisar nada
+    active_overlay = None
+    if ov is not None:
+        overlay_text_var.set(ov.text)
+        overlay_font_var.set(ov.size)
+        overlay_color_var.set(ov.color)
+        overlay_font_family_var.set(ov.family)
+        overlay_bg_enabled_var.set(ov.bg_color is not None)
+        if ov.bg_color is not None:
+            overlay_bg_color_var.set(ov.bg_color)
+    active_overlay = ov
+    _mark_active_overlay()
 
 
 def on_overlay_add_update():
-    """Crea o actualiza el overlay en la posición actual o en la selección."""
-    global overlay_pdf_pos, overlay_id
+    """Añade un overlay nuevo en la selección (o en 20,20) con los valores de los controles."""
     if doc is None:
         messagebox.showwarning("Aviso", "Primero abre un archivo PDF.")
         return
-    # Posición inicial: esquina superior-izquierda de la selección o (20,20)
+    if not _get_strvar(overlay_text_var, "").strip():
+        messagebox.showwarning("Aviso", "El texto está vacío.")
+        return
+    # Posición inicial: línea base en la esquina inferior-izquierda de la selección o (20,20)
     if rect_coords is not None:
-        x_canvas, y_canvas = rect_coords[0], rect_coords[1]
+        page_index, x_pdf, y_pdf = _to_pdf(rect_coords[0], rect_coords[3], selection_page)
     else:
-        x_canvas, y_canvas = 20, 20
-    overlay_pdf_pos = (x_canvas / scale, y_canvas / scale)
-    _draw_overlay()
+        page_index, x_pdf, y_pdf = current_page_index, 20 / scale, 20 / scale
+    ov = _overlay_from_controls(page_index, x_pdf, y_pdf)
+    session.add(ov)
+    _select_overlay(ov)
+    _draw_one_overlay(ov)
+    _update_overlay_count()
 
 
 def on_overlay_remove():
-    global overlay_id, overlay_pdf_pos
-    if overlay_id is not None:
-        canvas.delete(overlay_id)
-        overlay_id = None
-        overlay_pdf_pos = None
+    """Quita el overlay activo de la lista de pendientes."""
+    global active_overlay
+    ov = active_overlay
+    if ov is None:
+        return
+    for item in (ov.item_id, ov.bg_id):
+        if item is not None:
+            overlay_items.pop(item, None)
+            canvas.delete(item)
+    session.remove(ov)
+    active_overlay = None
+    _mark_active_overlay()
+    _update_overlay_count()
 
 
 def on_overlay_commit():
-    """Inserta el overlay actual en el PDF y guarda."""
-    global overlay_pdf_pos
-    if doc is None or page is None:
+    """Inserta todos los overlays pendientes y guarda el PDF una sola vez."""
+    global active_overlay, cont_layout, page, render_generation, preview_for
+    if doc is None or page is None or session is None:
         messagebox.showwarning("Aviso", "No hay documento cargado.")
         return
-    if overlay_pdf_pos is None or overlay_text_var is None or overlay_font_var is None:
-        messagebox.showwarning("Aviso", "No hay overlay para insertar.")
-        return
-    texto = overlay_text_var.get().strip()
-    if not texto:
-        messagebox.showwarning("Aviso", "El texto está vacío.")
+    if not any(ov.text for ov in session.overlays):
+        messagebox.showwarning("Aviso", "No hay overlays para insertar.")
         return
     try:
-        pdf_fontsize = max(6, int(_get_intvar(overlay_font_var, 12)))
-        rgb01 = _hex_to_rgb01(_get_strvar(overlay_color_var, "#ff0000"))
-        _insert_text(page, (overlay_pdf_pos[0], overlay_pdf_pos[1]), texto, fontsize=pdf_fontsize, color=rgb01)
-        if not pdf_path:
-            raise ValueError("Ruta del PDF original no disponible")
-        base, ext = os.path.splitext(pdf_path)
-        new_file = f"{base}_modificado{ext or '.pdf'}"
-        doc.save(new_file)
-        messagebox.showinfo("Éxito", f"Texto insertado y guardado en:\n{new_file}")
+        with doc_lock:
+            old_key, touched = doc_key, None
+            try:
+                inserted, touched, mode, seconds, written = session.commit(_get_boolvar(compact_save_var, False))
+            finally:
+                # El guardado puede cambiar el documento de PyMuPDF (pasa a ser la copia guardada):
+                # los trabajos en vuelo se descartan y la página se vuelve a tomar del nuevo
+                render_generation += 1
+                _stop_prefetch()
+                page = doc[min(current_page_index, doc.page_count - 1)]
+                # Con la clave del archivo guardado: el original reabierto no verá estas páginas
+                _rekey_document(old_key, doc.key, range(doc.page_count) if touched is None else touched)
+            preview_for = None
+        active_overlay = None
+        _update_overlay_count()
+        summary = f"Guardado {mode}: {seconds:.2f} s, {format_bytes(written)} escritos"
+        if save_label_var is not None:
+            save_label_var.set(summary)
+        messagebox.showinfo("Éxito", f"{inserted} texto(s) en {len(touched)} página(s) guardados en:\n{session.out_path}\n\n{summary}")
+        if search_worker is not None:
+            search_worker.reindex(touched)
+        for page_index in touched:
+            for item in thumb_items.pop(page_index, ())[:-1]:
+                thumb_canvas.delete(item)
+        _schedule_thumb_update()
+        # En modo continuo, las páginas tocadas se vuelven a dibujar desde cero
+        cont_layout = None
         load_page(current_page_index)
     except Exception as e:
         messagebox.showerror("Error", f"No se pudo insertar texto o guardar el archivo:\n{e}")
 
 
+def _rekey_document(old_key, new_key, touched):
+    """Tras guardar, el documento abierto tiene la clave del archivo guardado (con doc_lock).
+
+    Las cachés e índices pasan a la clave nueva salvo las páginas tocadas, que se descartan;
+    bajo la clave del original no queda nada renderizado desde la copia modificada.
+    """
+    global doc_key, page_indexes_key
+    for cache in (render_cache, tile_cache, thumb_cache):
+        cache.rekey(old_key, new_key, touched)
+    for page_index in touched:
+        page_indexes.pop(page_index, None)
+    if page_indexes_key == old_key:
+        page_indexes_key = new_key
+    if thumb_layout is not None and thumb_layout.key[0] == old_key:
+        thumb_layout.key = (new_key, THUMB_WIDTH)
+    if thumb_worker is not None and thumb_worker.doc_key == old_key:
+        thumb_worker.doc_key = new_key
+    if search_index is not None and search_index.doc_key == old_key:
+        search_index.doc_key = new_key
+    doc_key = new_key
+
+
+def _guess_field_width(ov) -> float:
+    """Ancho máximo propuesto para un campo: hasta el final del renglón dibujado en el
+    que está o, si no hay ninguno cerca, hasta el margen derecho de la página."""
+    index = page_indexes.get(ov.page) if page_indexes_key == doc_key else None
+    seg = index.nearest(ov.x, ov.y, SNAP_RADIUS_PX / scale) if index is not None else None
+    if seg is not None and seg[3] == "línea" and seg[1] > ov.x + 1:
+        return seg[1] - ov.x
+    with doc_lock:
+        page_width = doc[ov.page].rect.width
+    return max(page_width - FIELD_MARGIN_PT - ov.x, 1.0)
+
+
+def on_save_field_to_template():
+    """Guarda el overlay actual como campo de una plantilla JSON para pdf_fill.py."""
+    global template_json_path
+    if doc is None:
+        messagebox.showwarning("Aviso", "Primero abre un archivo PDF.")
+        return
+    ov = active_overlay
+    if ov is None:
+        messagebox.showwarning("Aviso", "Selecciona un overlay para guardarlo como campo.")
+        return
+    name = simpledialog.askstring("Campo", "Nombre del campo (p. ej. nombres, folio_formateado):")
+    if not name:
+        return
+    # Cancelar aquí = campo sin ancho máximo (el texto nunca se recorta)
+    max_width = simpledialog.askfloat("Campo", "Ancho máximo en puntos (Cancelar = sin límite):",
+                                      initialvalue=round(_guess_field_width(ov), 1), minvalue=1)
+    initial = os.path.basename(template_json_path) if template_json_path else "plantilla_campos.json"
+    path = filedialog.asksaveasfilename(title="Plantilla de campos", initialfile=initial, defaultextension=".json",
+                                        filetypes=[("JSON", "*.json")], confirmoverwrite=False)
+    if not path:
+        return
+    try:
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        else:
+            try:
+                template = os.path.relpath(doc.path, os.path.dirname(path))
+            except ValueError:  # Otra unidad en Windows
+                template = os.path.abspath(doc.path)
+            data = {"template": template.replace("\\", "/"), "fields": {}}
+        field = {
+            "page": ov.page,
+            "x": round(ov.x, 2),
+            "y": round(ov.y, 2),
+            "size": ov.size,
+            "color": ov.color,
+        }
+        if max_width is not None:
+            field["max_width"] = round(max_width, 2)
+        data.setdefault("fields", {})[name.strip()] = field
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        template_json_path = path
+        messagebox.showinfo("Plantilla", f"Campo '{name.strip()}' guardado en:\n{path}")
+    except Exception as e:
+        messagebox.showerror("Error", f"No se pudo guardar la plantilla:\n{e}")
+
+
+def on_export_pdflib():
+    """Compila una plantilla de campos a un módulo JS con COORDS para pdf-lib (server/libs)."""
+    global template_json_path
+    path = filedialog.askopenfilename(
+        title="Plantilla de campos a exportar",
+        initialdir=os.path.dirname(template_json_path) if template_json_path else None,
+        filetypes=[("JSON", "*.json")])
+    if not path:
+        return
+    base = os.path.splitext(os.path.basename(path))[0]
+    out = filedialog.asksaveasfilename(title="Módulo para pdf-lib", initialfile=f"{base}.coords.js",
+                                       defaultextension=".js", filetypes=[("JavaScript", "*.js *.mjs")])
+    if not out:
+        return
+    try:
+        spec = load_template(path)
+        source = compile_pdflib_module(spec, os.path.basename(path))
+        write_atomic(out, source.encode("utf-8"))
+        template_json_path = path
+        messagebox.showinfo("Exportar", f"{len(spec['fields'])} campos exportados a:\n{out}")
+    except Exception as e:
+        messagebox.showerror("Error", f"No se pudo exportar la plantilla:\n{e}")
+
+
 def on_copy_coords():
-    if overlay_pdf_pos is None:
+    if active_overlay is None:
         messagebox.showwarning("Aviso", "No hay overlay para copiar coordenadas.")
         return
-    x, y = overlay_pdf_pos
+    x, y = active_overlay.x, active_overlay.y
     try:
         root.clipboard_clear()
         root.clipboard_append(f"x={x:.2f}, y={y:.2f}")
@@ -441,22 +1830,23 @@ def pick_bg_color():
     color = colorchooser.askcolor(color=overlay_bg_color_var.get(), title="Seleccionar color de fondo")
     if color and color[1]:
         overlay_bg_color_var.set(color[1])
-        _update_overlay_bg()
+        _draw_overlay()
 
 
 def on_toggle_bg():
-    _update_overlay_bg()
+    _draw_overlay()
 
 
 def on_align_to_selection():
     """Alinear el overlay a la selección actual con las opciones de alineación."""
-    global overlay_pdf_pos
-    if overlay_id is None or rect_coords is None:
+    ov = active_overlay
+    if ov is None or ov.item_id is None or rect_coords is None:
         messagebox.showwarning("Aviso", "Crea el overlay y selecciona un área primero.")
         return
     x1, y1, x2, y2 = rect_coords
     # Obtener tamaño del texto actual
-    bbox = canvas.bbox(overlay_id)
+    _redraw_active_overlay()
+    bbox = _overlay_bbox(ov)
     if not bbox:
         return
     tw = bbox[2] - bbox[0]
@@ -477,9 +1867,192 @@ def on_align_to_selection():
         ty = (y1 + y2) / 2 - th / 2
     else:  # bottom
         ty = y2 - th
-    canvas.coords(overlay_id, tx, ty)
-    overlay_pdf_pos = (tx / scale, ty / scale)
-    _update_overlay_bg()
+    canvas.coords(ov.item_id, tx, ty)
+    _, ov.x, ov.y = _to_pdf(*_overlay_baseline(ov, tx, ty), ov.page)
+    _update_overlay_bg(ov)
+    _mark_active_overlay()
+
+
+# --- Miniaturas (barra lateral) ---
+def _show_thumbnails():
+    """Prepara la barra de miniaturas del documento recién abierto."""
+    global thumb_worker, thumb_layout, thumb_items
+    if thumb_worker is not None:
+        thumb_worker.stop()
+    sizes = [(THUMB_WIDTH, h * THUMB_WIDTH / w if w else THUMB_WIDTH) for w, h in doc.page_sizes()]
+    thumb_layout = PageLayout((doc_key, THUMB_WIDTH), sizes, 1.0, gap=THUMB_GAP)
+    thumb_items = {}
+    thumb_canvas.delete("all")
+    thumb_canvas.config(scrollregion=(0, 0, thumb_layout.width, thumb_layout.height))
+    thumb_canvas.yview_moveto(0)
+    thumb_worker = ThumbWorker(doc)
+    thumb_worker.start()
+    _update_thumbnails()
+
+
+def _update_thumbnails():
+    """Dibuja las miniaturas visibles de la barra, pide las que faltan y suelta las lejanas."""
+    global thumb_update_job
+    thumb_update_job = None
+    layout = thumb_layout
+    if layout is None or doc is None or layout.key[0] != doc_key:
+        return
+    view_h = thumb_canvas.winfo_height()
+    vy0 = thumb_canvas.canvasy(0)
+    first = layout.page_at(vy0 - view_h / 2)
+    last = layout.page_at(vy0 + view_h * 1.5)
+    for i in [i for i in thumb_items if not first <= i <= last]:
+        for item in thumb_items.pop(i)[:-1]:
+            thumb_canvas.delete(item)
+    missing = []
+    for i in range(first, last + 1):
+        if i in thumb_items:
+            continue
+        ox, oy = layout.origin(i)
+        w, h = layout.sizes[i]
+        bg = thumb_canvas.create_rectangle(ox, oy, ox + w, oy + h, fill="white", outline="#999999")
+        label = thumb_canvas.create_text(ox + w / 2, oy + h + 2, text=str(i + 1), anchor="n", font=("TkDefaultFont", 8))
+        thumb_items[i] = (bg, label, None)
+        cached = thumb_cache.get((doc_key, i, THUMB_WIDTH))
+        if cached is not None:
+            _draw_thumb(i, cached[0])
+        else:
+            missing.append(i)
+    if missing and thumb_worker is not None:
+        thumb_worker.request(missing)
+    _mark_current_thumb()
+
+
+def _draw_thumb(page_index: int, photo):
+    entry = thumb_items.get(page_index)
+    if entry is None or entry[-1] is not None:
+        return
+    ox, oy = thumb_layout.origin(page_index)
+    image = thumb_canvas.create_image(ox, oy, anchor=tk.NW, image=photo)
+    thumb_items[page_index] = (entry[0], entry[1], image, photo)
+
+
+def _mark_current_thumb():
+    """Recuadro en la miniatura de la página actual; la barra la sigue si sale de la vista."""
+    if thumb_layout is None or doc is None or not 0 <= current_page_index < len(thumb_layout.offsets):
+        return
+    thumb_canvas.delete("thumb_current")
+    ox, oy = thumb_layout.origin(current_page_index)
+    w, h = thumb_layout.sizes[current_page_index]
+    thumb_canvas.create_rectangle(ox - 3, oy - 3, ox + w + 3, oy + h + 3, outline="#0078d7", width=3, tags="thumb_current")
+    vy0 = thumb_canvas.canvasy(0)
+    if oy < vy0 or oy + h > vy0 + thumb_canvas.winfo_height():
+        thumb_canvas.yview_moveto(max(0.0, (oy - THUMB_GAP) / thumb_layout.height))
+
+
+def _schedule_thumb_update(*args):
+    global thumb_update_job
+    if args:
+        thumb_scroll.set(*args)
+    if thumb_update_job is None:
+        thumb_update_job = root.after_idle(_update_thumbnails)
+
+
+def on_thumb_click(event):
+    if thumb_layout is None or doc is None:
+        return
+    load_page(thumb_layout.page_at(thumb_canvas.canvasy(event.y)))
+
+
+def on_thumb_wheel(event):
+    if event.delta:
+        thumb_canvas.yview_scroll(-1 if event.delta > 0 else 1, "units")
+
+
+# --- Búsqueda de texto (sobre el índice, nunca sobre el documento) ---
+def _start_search_index():
+    """Empieza a indexar en segundo plano las palabras del documento recién abierto."""
+    global search_index, search_worker, search_hits, search_pos, search_version
+    if search_worker is not None:
+        search_worker.stop()
+    search_index = TextIndex(doc_key, doc.page_count)
+    search_worker = SearchWorker(search_index)
+    search_worker.start()
+    search_hits, search_pos, search_version = [], -1, -1
+
+
+def _update_search_label():
+    if search_label_var is None:
+        return
+    parts = []
+    if _get_strvar(search_var, "").strip():
+        parts.append(f"{search_pos + 1}/{len(search_hits)}" if search_hits else "Sin coincidencias")
+    if search_index is not None and search_index.pages_done < search_index.page_count:
+        parts.append(f"indexando {search_index.pages_done}/{search_index.page_count} págs.")
+    search_label_var.set(" · ".join(parts))
+
+
+def _run_search():
+    """Consulta el índice con el texto de la barra y resalta las coincidencias."""
+    global search_hits, search_pos, search_version
+    query = _get_strvar(search_var, "").strip()
+    if search_index is None:
+        return
+    search_version = search_index.version
+    search_hits = search_index.search(query) if query else []
+    search_pos = min(search_pos, len(search_hits) - 1)
+    _update_search_label()
+    _draw_search_hits()
+
+
+def _draw_search_hits():
+    canvas.delete("search_hit")
+    for i, (page_index, rects) in enumerate(search_hits):
+        if cont_layout is None and page_index != current_page_index:
+            continue
+        color, width = ("#ff6d00", 3) if i == search_pos else ("#ffc400", 2)
+        for r in rects:
+            x0, y0 = _to_canvas(page_index, r.x0, r.y0)
+            x1, y1 = _to_canvas(page_index, r.x1, r.y1)
+            canvas.create_rectangle(x0 - 2, y0 - 2, x1 + 2, y1 + 2, outline=color, width=width, tags="search_hit")
+
+
+def _goto_search_hit(i: int):
+    """Muestra la página de la coincidencia i con ella a la vista."""
+    global search_pos
+    search_pos = i
+    page_index, rects = search_hits[i]
+    if cont_layout is not None:
+        width, height = cont_layout.width, cont_layout.height
+    else:
+        with doc_lock:
+            prect = doc[page_index].rect
+        width, height = prect.width * scale, prect.height * scale
+    hx, hy = _to_canvas(page_index, min(r.x0 for r in rects), min(r.y0 for r in rects))
+    x = hx - canvas.winfo_width() / 4
+    y = hy - canvas.winfo_height() / 2
+    view = (max(0.0, x / width), max(0.0, y / height))
+    if page_index == current_page_index or cont_layout is not None:
+        canvas.xview_moveto(view[0])
+        canvas.yview_moveto(view[1])
+        _draw_search_hits()
+    else:
+        load_page(page_index, view=view)
+    _update_search_label()
+
+
+def on_search():
+    """Nueva búsqueda: salta a la primera coincidencia desde la página actual."""
+    global search_pos
+    if doc is None:
+        return
+    search_pos = -1
+    _run_search()
+    if search_hits:
+        later = [i for i, (p, _) in enumerate(search_hits) if p >= current_page_index]
+        _goto_search_hit(later[0] if later else 0)
+
+
+def on_search_step(delta: int):
+    if not search_hits:
+        on_search()
+        return
+    _goto_search_hit((search_pos + delta) % len(search_hits))
 
 
 # --- Utilidades selección (copiar/limpiar) ---
@@ -502,147 +2075,235 @@ def clear_selection():
         rect_label_var.set("x1=-, y1=-, x2=-, y2=-")
 
 # --- Ventana principal ---
-root = tk.Tk()
-root.title("Herramienta PDF — Seleccionar coordenadas e insertar texto")
-
-# Barra de botones superior
-top_bar = tk.Frame(root)
-top_bar.pack(fill=tk.X)
-
-btn_open = tk.Button(top_bar, text="Abrir PDF", command=open_pdf)
-btn_open.pack(side=tk.LEFT, padx=5, pady=5)
-
-btn_prev = tk.Button(top_bar, text="◀ Página", command=prev_page)
-btn_prev.pack(side=tk.LEFT, padx=5, pady=5)
-
-btn_next = tk.Button(top_bar, text="Página ▶", command=next_page)
-btn_next.pack(side=tk.LEFT, padx=5, pady=5)
-
-btn_zoom_out = tk.Button(top_bar, text="- Zoom", command=zoom_out)
-btn_zoom_out.pack(side=tk.LEFT, padx=5, pady=5)
-
-btn_zoom_in = tk.Button(top_bar, text="+ Zoom", command=zoom_in)
-btn_zoom_in.pack(side=tk.LEFT, padx=5, pady=5)
-
-btn_insert = tk.Button(top_bar, text="Insertar texto en selección", command=insert_text)
-btn_insert.pack(side=tk.RIGHT, padx=5, pady=5)
-
-# Etiqueta de página
-page_label_frame = tk.Frame(root)
-page_label_frame.pack(fill=tk.X)
-page_label_var = tk.StringVar(value="Página -/-")
-page_label = tk.Label(page_label_frame, textvariable=page_label_var)
-page_label.pack(side=tk.LEFT, padx=8)
-
-# Controles de modo
-mode_controls = tk.Frame(root)
-mode_controls.pack(fill=tk.X, padx=6, pady=2)
-mode_var = tk.StringVar(value='move')
-tk.Label(mode_controls, text="Modo:").pack(side=tk.LEFT)
-tk.Radiobutton(mode_controls, text="Mover texto", variable=mode_var, value='move').pack(side=tk.LEFT, padx=4)
-tk.Radiobutton(mode_controls, text="Obtener coords", variable=mode_var, value='coords').pack(side=tk.LEFT, padx=4)
-auto_copy_coords_var = tk.BooleanVar(value=True)
-tk.Checkbutton(mode_controls, text="Copiar coords auto", variable=auto_copy_coords_var).pack(side=tk.LEFT, padx=8)
-last_coords_var = tk.StringVar(value="x=-, y=-")
-tk.Label(mode_controls, text="Click:").pack(side=tk.LEFT, padx=(8, 2))
-tk.Label(mode_controls, textvariable=last_coords_var).pack(side=tk.LEFT)
-tk.Button(mode_controls, text="Limpiar marcas", command=on_clear_markers).pack(side=tk.RIGHT)
-
-# Controles de overlay
-overlay_controls = tk.Frame(root)
-overlay_controls.pack(fill=tk.X, padx=6, pady=4)
-
-tk.Label(overlay_controls, text="Texto:").pack(side=tk.LEFT)
-overlay_text_var = tk.StringVar(value="Texto de ejemplo")
-overlay_entry = tk.Entry(overlay_controls, textvariable=overlay_text_var, width=28)
-overlay_entry.pack(side=tk.LEFT, padx=6)
-overlay_entry.bind('<KeyRelease>', lambda e: _draw_overlay())
-
-tk.Label(overlay_controls, text="Tamaño (pt):").pack(side=tk.LEFT)
-overlay_font_var = tk.IntVar(value=12)
-overlay_font_scale = tk.Scale(overlay_controls, from_=6, to=72, orient=tk.HORIZONTAL, variable=overlay_font_var, command=lambda _: _draw_overlay())
-overlay_font_scale.pack(side=tk.LEFT, padx=6)
-
-btn_overlay_add = tk.Button(overlay_controls, text="Añadir/Actualizar", command=on_overlay_add_update)
-btn_overlay_add.pack(side=tk.LEFT, padx=4)
-
-btn_overlay_remove = tk.Button(overlay_controls, text="Eliminar", command=on_overlay_remove)
-btn_overlay_remove.pack(side=tk.LEFT, padx=4)
-
-btn_overlay_commit = tk.Button(overlay_controls, text="Insertar en PDF", command=on_overlay_commit)
-btn_overlay_commit.pack(side=tk.LEFT, padx=4)
-
-btn_copy_coords = tk.Button(overlay_controls, text="Copiar coords", command=on_copy_coords)
-btn_copy_coords.pack(side=tk.LEFT, padx=4)
-
-# Fila 2 de controles: color, fondo, fuente y alineación
-overlay_controls2 = tk.Frame(root)
-overlay_controls2.pack(fill=tk.X, padx=6, pady=2)
-
-overlay_color_var = tk.StringVar(value="#ff0000")
-tk.Button(overlay_controls2, text="Color texto", command=pick_text_color).pack(side=tk.LEFT)
-
-overlay_bg_enabled_var = tk.BooleanVar(value=False)
-tk.Checkbutton(overlay_controls2, text="Fondo", variable=overlay_bg_enabled_var, command=on_toggle_bg).pack(side=tk.LEFT, padx=6)
-
-overlay_bg_color_var = tk.StringVar(value="#ffffcc")
-tk.Button(overlay_controls2, text="Color fondo", command=pick_bg_color).pack(side=tk.LEFT)
-
-tk.Label(overlay_controls2, text="Fuente:").pack(side=tk.LEFT, padx=(10, 0))
-overlay_font_family_var = tk.StringVar(value="Arial")
-tk.Entry(overlay_controls2, textvariable=overlay_font_family_var, width=12).pack(side=tk.LEFT)
-tk.Button(overlay_controls2, text="Aplicar fuente", command=_draw_overlay).pack(side=tk.LEFT, padx=4)
-
-tk.Label(overlay_controls2, text="Alineación:").pack(side=tk.LEFT, padx=(10, 0))
-align_h_var = tk.StringVar(value='left')
-align_v_var = tk.StringVar(value='top')
-tk.OptionMenu(overlay_controls2, align_h_var, 'left', 'center', 'right').pack(side=tk.LEFT)
-tk.OptionMenu(overlay_controls2, align_v_var, 'top', 'middle', 'bottom').pack(side=tk.LEFT)
-tk.Button(overlay_controls2, text="Alinear a selección", command=on_align_to_selection).pack(side=tk.LEFT, padx=6)
-
-# Controles de selección
-selection_controls = tk.Frame(root)
-selection_controls.pack(fill=tk.X, padx=6, pady=2)
-rect_label_var = tk.StringVar(value="x1=-, y1=-, x2=-, y2=-")
-tk.Label(selection_controls, text="Rect:").pack(side=tk.LEFT)
-tk.Label(selection_controls, textvariable=rect_label_var).pack(side=tk.LEFT, padx=(2, 10))
-
-auto_copy_rect_var = tk.BooleanVar(value=True)
-tk.Checkbutton(selection_controls, text="Copiar rect auto", variable=auto_copy_rect_var).pack(side=tk.LEFT)
-
-show_rect_dialog_var = tk.BooleanVar(value=False)
-tk.Checkbutton(selection_controls, text="Mostrar diálogo rect", variable=show_rect_dialog_var).pack(side=tk.LEFT, padx=6)
-
-tk.Button(selection_controls, text="Copiar rect", command=copy_rect_to_clipboard).pack(side=tk.LEFT, padx=6)
-tk.Button(selection_controls, text="Limpiar selección", command=clear_selection).pack(side=tk.LEFT)
-
-# Contenedor con scrollbars
-canvas_frame = tk.Frame(root)
-canvas_frame.pack(fill=tk.BOTH, expand=True)
-
-v_scroll = tk.Scrollbar(canvas_frame, orient=tk.VERTICAL)
-h_scroll = tk.Scrollbar(canvas_frame, orient=tk.HORIZONTAL)
-
-canvas = tk.Canvas(canvas_frame, bg="gray", xscrollcommand=h_scroll.set, yscrollcommand=v_scroll.set)
-
-v_scroll.config(command=canvas.yview)
-h_scroll.config(command=canvas.xview)
-
-v_scroll.pack(side=tk.RIGHT, fill=tk.Y)
-h_scroll.pack(side=tk.BOTTOM, fill=tk.X)
-canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-
-# Bindings de interacción
-canvas.bind("<ButtonPress-1>", on_mouse_down)
-canvas.bind("<ButtonRelease-1>", on_mouse_up)
-canvas.bind("<MouseWheel>", on_mouse_wheel)
-canvas.bind("<Shift-MouseWheel>", on_shift_mouse_wheel)
-canvas.bind("<B1-Motion>", on_mouse_move)
-
-# Atajos de teclado
-root.bind('+', lambda e: zoom_in())
-root.bind('-', lambda e: zoom_out())
-root.bind('<Right>', lambda e: next_page())
-root.bind('<Left>', lambda e: prev_page())
-
-root.mainloop()
+def main():
+    """Crea la ventana y entra al bucle de Tk: importar este módulo no abre nada."""
+    global root, canvas, v_scroll, h_scroll, thumb_canvas, thumb_scroll, outline_button, outline_menu
+    global btn_cancel_open, status_var, page_label_var, cache_label_var, cache_mb_var, prefetch_radius_var
+    global tiled_var, disk_cache_var, render_mode_var, continuous_var, search_var, search_label_var, mode_var
+    global auto_copy_coords_var, snap_var, last_coords_var, overlay_text_var, overlay_font_var
+    global overlay_count_var, compact_save_var, save_label_var, overlay_color_var, overlay_bg_enabled_var
+    global overlay_bg_color_var, overlay_font_family_var, align_h_var, align_v_var, rect_label_var
+    global auto_copy_rect_var, show_rect_dialog_var
+    root = tk.Tk()
+    root.title(APP_TITLE)
+
+    # Barra de botones superior
+    top_bar = tk.Frame(root)
+    top_bar.pack(fill=tk.X)
+
+    btn_open = tk.Button(top_bar, text="Abrir PDF", command=open_pdf)
+    btn_open.pack(side=tk.LEFT, padx=5, pady=5)
+
+    outline_button = tk.Menubutton(top_bar, text="Índice ▾", relief=tk.RAISED, state=tk.DISABLED)
+    outline_menu = tk.Menu(outline_button, tearoff=False)
+    outline_button.config(menu=outline_menu)
+    outline_button.pack(side=tk.LEFT, padx=5, pady=5)
+
+    btn_prev = tk.Button(top_bar, text="◀ Página", command=prev_page)
+    btn_prev.pack(side=tk.LEFT, padx=5, pady=5)
+
+    btn_next = tk.Button(top_bar, text="Página ▶", command=next_page)
+    btn_next.pack(side=tk.LEFT, padx=5, pady=5)
+
+    btn_zoom_out = tk.Button(top_bar, text="- Zoom", command=zoom_out)
+    btn_zoom_out.pack(side=tk.LEFT, padx=5, pady=5)
+
+    btn_zoom_in = tk.Button(top_bar, text="+ Zoom", command=zoom_in)
+    btn_zoom_in.pack(side=tk.LEFT, padx=5, pady=5)
+
+    btn_insert = tk.Button(top_bar, text="Insertar texto en selección", command=insert_text)
+    btn_insert.pack(side=tk.RIGHT, padx=5, pady=5)
+
+    # Etiqueta de página
+    page_label_frame = tk.Frame(root)
+    page_label_frame.pack(fill=tk.X)
+    page_label_var = tk.StringVar(value="Página -/-")
+    page_label = tk.Label(page_label_frame, textvariable=page_label_var)
+    page_label.pack(side=tk.LEFT, padx=8)
+    cache_label_var = tk.StringVar(value=render_cache.summary())
+    tk.Label(page_label_frame, textvariable=cache_label_var, fg="gray").pack(side=tk.LEFT, padx=8)
+    cache_mb_var = tk.IntVar(value=RENDER_CACHE_MB)
+    cache_spin = tk.Spinbox(page_label_frame, from_=16, to=4096, increment=16, width=6, textvariable=cache_mb_var, command=on_cache_budget_change)
+    cache_spin.pack(side=tk.RIGHT, padx=4)
+    cache_spin.bind('<Return>', lambda e: on_cache_budget_change())
+    prefetch_radius_var = tk.IntVar(value=PREFETCH_RADIUS)
+    tk.Spinbox(page_label_frame, from_=0, to=5, width=3, textvariable=prefetch_radius_var, command=lambda: _schedule_prefetch(current_page_index)).pack(side=tk.RIGHT, padx=4)
+    tk.Label(page_label_frame, text="Precarga ±").pack(side=tk.RIGHT)
+    tiled_var = tk.BooleanVar(value=True)
+    tk.Checkbutton(page_label_frame, text="Mosaicos en zoom alto", variable=tiled_var, command=lambda: load_page(current_page_index) if doc is not None else None).pack(side=tk.RIGHT, padx=6)
+    tk.Label(page_label_frame, text="Caché (MB):").pack(side=tk.RIGHT)
+    disk_cache_var = tk.BooleanVar(value=True)
+    tk.Checkbutton(page_label_frame, text="Caché en disco", variable=disk_cache_var,
+                   command=lambda: setattr(disk_cache, "enabled", disk_cache_var.get())).pack(side=tk.RIGHT, padx=6)
+    render_mode_var = tk.StringVar(value=RENDER_MODES[RENDER_COLORSPACE])
+    tk.OptionMenu(page_label_frame, render_mode_var, *RENDER_MODES.values(), command=on_render_mode_change).pack(side=tk.RIGHT, padx=4)
+    tk.Label(page_label_frame, text="Vista:").pack(side=tk.RIGHT)
+    continuous_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(page_label_frame, text="Continuo", variable=continuous_var, command=lambda: load_page(current_page_index) if doc is not None else None).pack(side=tk.RIGHT, padx=6)
+
+    # Barra de búsqueda
+    search_bar = tk.Frame(root)
+    search_bar.pack(fill=tk.X, padx=6, pady=2)
+    tk.Label(search_bar, text="Buscar:").pack(side=tk.LEFT)
+    search_var = tk.StringVar(value="")
+    search_entry = tk.Entry(search_bar, textvariable=search_var, width=32)
+    search_entry.pack(side=tk.LEFT, padx=6)
+    search_entry.bind('<Return>', lambda e: on_search())
+    tk.Button(search_bar, text="◀", command=lambda: on_search_step(-1)).pack(side=tk.LEFT)
+    tk.Button(search_bar, text="▶", command=lambda: on_search_step(1)).pack(side=tk.LEFT, padx=(2, 6))
+    search_label_var = tk.StringVar(value="")
+    tk.Label(search_bar, textvariable=search_label_var, fg="gray").pack(side=tk.LEFT)
+
+    # Controles de modo
+    mode_controls = tk.Frame(root)
+    mode_controls.pack(fill=tk.X, padx=6, pady=2)
+    mode_var = tk.StringVar(value='move')
+    tk.Label(mode_controls, text="Modo:").pack(side=tk.LEFT)
+    tk.Radiobutton(mode_controls, text="Mover texto", variable=mode_var, value='move').pack(side=tk.LEFT, padx=4)
+    tk.Radiobutton(mode_controls, text="Obtener coords", variable=mode_var, value='coords').pack(side=tk.LEFT, padx=4)
+    auto_copy_coords_var = tk.BooleanVar(value=True)
+    tk.Checkbutton(mode_controls, text="Copiar coords auto", variable=auto_copy_coords_var).pack(side=tk.LEFT, padx=8)
+    snap_var = tk.BooleanVar(value=True)
+    tk.Checkbutton(mode_controls, text="Ajustar a renglones", variable=snap_var).pack(side=tk.LEFT, padx=4)
+    last_coords_var = tk.StringVar(value="x=-, y=-")
+    tk.Label(mode_controls, text="Click:").pack(side=tk.LEFT, padx=(8, 2))
+    tk.Label(mode_controls, textvariable=last_coords_var).pack(side=tk.LEFT)
+    tk.Button(mode_controls, text="Limpiar marcas", command=on_clear_markers).pack(side=tk.RIGHT)
+
+    # Controles de overlay
+    overlay_controls = tk.Frame(root)
+    overlay_controls.pack(fill=tk.X, padx=6, pady=4)
+
+    tk.Label(overlay_controls, text="Texto:").pack(side=tk.LEFT)
+    overlay_text_var = tk.StringVar(value="Texto de ejemplo")
+    overlay_entry = tk.Entry(overlay_controls, textvariable=overlay_text_var, width=28)
+    overlay_entry.pack(side=tk.LEFT, padx=6)
+    overlay_entry.bind('<KeyRelease>', lambda e: _draw_overlay())
+
+    tk.Label(overlay_controls, text="Tamaño (pt):").pack(side=tk.LEFT)
+    overlay_font_var = tk.IntVar(value=12)
+    overlay_font_scale = tk.Scale(overlay_controls, from_=6, to=72, orient=tk.HORIZONTAL, variable=overlay_font_var, command=lambda _: _draw_overlay())
+    overlay_font_scale.pack(side=tk.LEFT, padx=6)
+
+    btn_overlay_add = tk.Button(overlay_controls, text="Añadir", command=on_overlay_add_update)
+    btn_overlay_add.pack(side=tk.LEFT, padx=4)
+
+    btn_overlay_remove = tk.Button(overlay_controls, text="Eliminar", command=on_overlay_remove)
+    btn_overlay_remove.pack(side=tk.LEFT, padx=4)
+
+    btn_overlay_commit = tk.Button(overlay_controls, text="Insertar todo en PDF", command=on_overlay_commit)
+    btn_overlay_commit.pack(side=tk.LEFT, padx=4)
+
+    overlay_count_var = tk.StringVar(value="Pendientes: 0")
+    tk.Label(overlay_controls, textvariable=overlay_count_var).pack(side=tk.LEFT, padx=4)
+
+    compact_save_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(overlay_controls, text="Compactar al guardar", variable=compact_save_var).pack(side=tk.LEFT, padx=4)
+    save_label_var = tk.StringVar(value="")
+    tk.Label(overlay_controls, textvariable=save_label_var).pack(side=tk.LEFT, padx=4)
+
+    btn_copy_coords = tk.Button(overlay_controls, text="Copiar coords", command=on_copy_coords)
+    btn_copy_coords.pack(side=tk.LEFT, padx=4)
+
+    btn_save_field = tk.Button(overlay_controls, text="Guardar en plantilla", command=on_save_field_to_template)
+    btn_save_field.pack(side=tk.LEFT, padx=4)
+    tk.Button(overlay_controls, text="Exportar a pdf-lib", command=on_export_pdflib).pack(side=tk.LEFT, padx=4)
+
+    # Fila 2 de controles: color, fondo, fuente y alineación
+    overlay_controls2 = tk.Frame(root)
+    overlay_controls2.pack(fill=tk.X, padx=6, pady=2)
+
+    overlay_color_var = tk.StringVar(value="#ff0000")
+    tk.Button(overlay_controls2, text="Color texto", command=pick_text_color).pack(side=tk.LEFT)
+
+    overlay_bg_enabled_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(overlay_controls2, text="Fondo", variable=overlay_bg_enabled_var, command=on_toggle_bg).pack(side=tk.LEFT, padx=6)
+
+    overlay_bg_color_var = tk.StringVar(value="#ffffcc")
+    tk.Button(overlay_controls2, text="Color fondo", command=pick_bg_color).pack(side=tk.LEFT)
+
+    tk.Label(overlay_controls2, text="Fuente:").pack(side=tk.LEFT, padx=(10, 0))
+    overlay_font_family_var = tk.StringVar(value="Arial")
+    tk.Entry(overlay_controls2, textvariable=overlay_font_family_var, width=12).pack(side=tk.LEFT)
+    tk.Button(overlay_controls2, text="Aplicar fuente", command=_draw_overlay).pack(side=tk.LEFT, padx=4)
+
+    tk.Label(overlay_controls2, text="Alineación:").pack(side=tk.LEFT, padx=(10, 0))
+    align_h_var = tk.StringVar(value='left')
+    align_v_var = tk.StringVar(value='top')
+    tk.OptionMenu(overlay_controls2, align_h_var, 'left', 'center', 'right').pack(side=tk.LEFT)
+    tk.OptionMenu(overlay_controls2, align_v_var, 'top', 'middle', 'bottom').pack(side=tk.LEFT)
+    tk.Button(overlay_controls2, text="Alinear a selección", command=on_align_to_selection).pack(side=tk.LEFT, padx=6)
+
+    # Controles de selección
+    selection_controls = tk.Frame(root)
+    selection_controls.pack(fill=tk.X, padx=6, pady=2)
+    rect_label_var = tk.StringVar(value="x1=-, y1=-, x2=-, y2=-")
+    tk.Label(selection_controls, text="Rect:").pack(side=tk.LEFT)
+    tk.Label(selection_controls, textvariable=rect_label_var).pack(side=tk.LEFT, padx=(2, 10))
+
+    auto_copy_rect_var = tk.BooleanVar(value=True)
+    tk.Checkbutton(selection_controls, text="Copiar rect auto", variable=auto_copy_rect_var).pack(side=tk.LEFT)
+
+    show_rect_dialog_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(selection_controls, text="Mostrar diálogo rect", variable=show_rect_dialog_var).pack(side=tk.LEFT, padx=6)
+
+    tk.Button(selection_controls, text="Copiar rect", command=copy_rect_to_clipboard).pack(side=tk.LEFT, padx=6)
+    tk.Button(selection_controls, text="Limpiar selección", command=clear_selection).pack(side=tk.LEFT)
+
+    # Línea de estado: progreso y tiempos de la última apertura
+    status_bar = tk.Frame(root)
+    status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+    status_var = tk.StringVar(value="")
+    tk.Label(status_bar, textvariable=status_var, fg="gray", anchor=tk.W).pack(side=tk.LEFT, padx=8)
+    btn_cancel_open = tk.Button(status_bar, text="Cancelar apertura", command=on_cancel_open, state=tk.DISABLED)
+    btn_cancel_open.pack(side=tk.RIGHT, padx=5, pady=2)
+
+    # Contenedor con scrollbars
+    canvas_frame = tk.Frame(root)
+    canvas_frame.pack(fill=tk.BOTH, expand=True)
+
+    v_scroll = tk.Scrollbar(canvas_frame, orient=tk.VERTICAL)
+    h_scroll = tk.Scrollbar(canvas_frame, orient=tk.HORIZONTAL)
+
+    canvas = tk.Canvas(canvas_frame, bg="gray", xscrollcommand=_on_xscroll, yscrollcommand=_on_yscroll)
+
+    v_scroll.config(command=canvas.yview)
+    h_scroll.config(command=canvas.xview)
+
+    # Barra de miniaturas a la izquierda
+    thumb_frame = tk.Frame(canvas_frame)
+    thumb_frame.pack(side=tk.LEFT, fill=tk.Y)
+    thumb_scroll = tk.Scrollbar(thumb_frame, orient=tk.VERTICAL)
+    thumb_canvas = tk.Canvas(thumb_frame, bg="#d9d9d9", width=THUMB_WIDTH + 2 * THUMB_GAP, yscrollcommand=_schedule_thumb_update)
+    thumb_scroll.config(command=thumb_canvas.yview)
+    thumb_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+    thumb_canvas.pack(side=tk.LEFT, fill=tk.Y)
+    thumb_canvas.bind("<ButtonPress-1>", on_thumb_click)
+    thumb_canvas.bind("<MouseWheel>", on_thumb_wheel)
+    thumb_canvas.bind("<Configure>", lambda e: _schedule_thumb_update())
+
+    v_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+    h_scroll.pack(side=tk.BOTTOM, fill=tk.X)
+    canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+    # Bindings de interacción
+    canvas.bind("<ButtonPress-1>", on_mouse_down)
+    canvas.bind("<ButtonRelease-1>", on_mouse_up)
+    canvas.bind("<MouseWheel>", on_mouse_wheel)
+    canvas.bind("<Shift-MouseWheel>", on_shift_mouse_wheel)
+    canvas.bind("<B1-Motion>", on_mouse_move)
+    canvas.bind("<Configure>", lambda e: _schedule_tile_update())
+
+    # Atajos de teclado
+    root.bind('+', lambda e: zoom_in())
+    root.bind('-', lambda e: zoom_out())
+    root.bind('<Right>', lambda e: next_page())
+    root.bind('<Left>', lambda e: prev_page())
+    root.bind('<Control-f>', lambda e: search_entry.focus_set())
+
+    root.after(RENDER_POLL_MS, _poll_workers)
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Benchmark del pipeline de render de pdf_coor.py.
+
+Genera PDFs de prueba y mide, por escala, los ms/página y el pico de RSS de:
+
+- ``pil``: pixmap.samples -> Image.frombytes -> ImageTk.PhotoImage (pipeline anterior)
+- ``ppm``: pdf_engine.get_pixmap + pixmap_ppm -> tk.PhotoImage(data=...) (pipeline actual)
+- ``pgm``: igual que ``ppm`` pero rasterizando en grises (modo de vista "Grises")
+
+Cada combinación (pipeline, escala) corre en un proceso hijo para que el pico de
+RSS sea el de esa combinación y no el acumulado. Sin display (servidor, CI) se
+mide sólo la parte previa a Tk.
+
+Uso:
+    python pdf_coor_bench.py                       # escalas por defecto
+    python pdf_coor_bench.py --scales 1 3 5 --pages 10
+    python pdf_coor_bench.py --save base.json      # guardar resultados
+    python pdf_coor_bench.py --baseline base.json  # falla si empeora más de --tolerance
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+import fitz  # PyMuPDF
+
+from pdf_engine import get_pixmap, pixmap_ppm
+
+DEFAULT_SCALES = [1.0, 2.0, 3.0, 5.0]
+PIPELINES = ["pil", "ppm", "pgm"]
+
+
+def make_test_pdf(path: str, pages: int):
+    """PDF A4 con texto denso, líneas de formulario y una imagen (simula un escaneo)."""
+    doc = fitz.open()
+    # Imagen gris de 1200x1600 como "página escaneada"
+    scan = fitz.Pixmap(fitz.csGRAY, fitz.IRect(0, 0, 1200, 1600), False)
+    scan.set_rect(scan.irect, (200,))
+    scan_png = scan.tobytes("png")
+    for i in range(pages):
+        p = doc.new_page(width=595, height=842)
+        if i % 2:
+            p.insert_image(p.rect, stream=scan_png)
+        for row in range(60):
+            p.insert_text((40, 40 + row * 13), f"Página {i + 1} · renglón {row} · Nombre del tutor ______ Folio ____", fontsize=9)
+        for row in range(20):
+            p.draw_line((300, 60 + row * 38), (560, 60 + row * 38), color=(0, 0, 0), width=0.5)
+    doc.save(path)
+    doc.close()
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import psutil  # type: ignore
+        info = psutil.Process().memory_info()
+        peak = getattr(info, "peak_wset", None) or getattr(info, "peak_rss", None)
+        if peak:
+            return peak / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reporta KB, macOS bytes
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        return None
+
+
+def run_child(pdf: str, pipeline: str, scale_val: float) -> dict:
+    """Renderiza todas las páginas con un pipeline y devuelve sus métricas."""
+    root = None
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+        root.withdraw()
+    except Exception:
+        tk = None  # type: ignore[assignment]
+    if pipeline == "pil":
+        from PIL import Image, ImageTk
+    doc = fitz.open(pdf)
+    times = []
+    for page_obj in doc:
+        t0 = time.perf_counter()
+        if pipeline == "pil":
+            pix = page_obj.get_pixmap(matrix=fitz.Matrix(scale_val, scale_val), alpha=False)
+            img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+            photo = ImageTk.PhotoImage(img) if root is not None else None
+        else:
+            colorspace = "gray" if pipeline == "pgm" else "rgb"
+            pix = get_pixmap(page_obj, scale_val, colorspace=colorspace)
+            data = pixmap_ppm(pix, colorspace)
+            del pix
+            photo = tk.PhotoImage(data=data, format="PPM") if root is not None else None
+            del data
+        times.append((time.perf_counter() - t0) * 1000)
+        del photo
+    return {
+        "pipeline": pipeline,
+        "scale": scale_val,
+        "pages": len(times),
+        "ms_per_page": sum(times) / len(times),
+        "peak_rss_mb": _peak_rss_mb(),
+        "tk": root is not None,
+    }
+
+
+def run_all(pdf: str, scales, pipelines) -> list:
+    results = []
+    for scale_val in scales:
+        for pipeline in pipelines:
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", pdf, pipeline, str(scale_val)],
+                capture_output=True, text=True,
+            )
+            if out.returncode != 0:
+                print(f"[{pipeline} x{scale_val}] falló:\n{out.stderr}", file=sys.stderr)
+                continue
+            results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def print_table(results):
+    print(f"{'pipeline':<8} {'escala':>6} {'ms/pág':>9} {'pico RSS (MB)':>14}  tk")
+    for r in results:
+        rss = f"{r['peak_rss_mb']:.1f}" if r["peak_rss_mb"] is not None else "-"
+        print(f"{r['pipeline']:<8} {r['scale']:>6.1f} {r['ms_per_page']:>9.1f} {rss:>14}  {'sí' if r['tk'] else 'no'}")
+
+
+def compare(results, baseline, tolerance: float) -> list:
+    """Lista de regresiones (ms/página o RSS) respecto a una ejecución guardada."""
+    base = {(b["pipeline"], b["scale"]): b for b in baseline}
+    problems = []
+    for r in results:
+        b = base.get((r["pipeline"], r["scale"]))
+        if b is None:
+            continue
+        if r["ms_per_page"] > b["ms_per_page"] * (1 + tolerance):
+            problems.append(f"{r['pipeline']} x{r['scale']}: {b['ms_per_page']:.1f} -> {r['ms_per_page']:.1f} ms/pág")
+        if r["peak_rss_mb"] and b.get("peak_rss_mb") and r["peak_rss_mb"] > b["peak_rss_mb"] * (1 + tolerance):
+            problems.append(f"{r['pipeline']} x{r['scale']}: {b['peak_rss_mb']:.1f} -> {r['peak_rss_mb']:.1f} MB RSS")
+    return problems
+
+
+def main(argv=None) -> int:
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] == "--child":
+        pdf, pipeline, scale_val = argv[1], argv[2], float(argv[3])
+        print(json.dumps(run_child(pdf, pipeline, scale_val)))
+        return 0
+    parser = argparse.ArgumentParser(description="Benchmark de render de pdf_coor")
+    parser.add_argument("--scales", type=float, nargs="+", default=DEFAULT_SCALES)
+    parser.add_argument("--pages", type=int, default=6)
+    parser.add_argument("--pipelines", nargs="+", choices=PIPELINES, default=PIPELINES)
+    parser.add_argument("--pdf", help="PDF a medir (por defecto se genera uno de prueba)")
+    parser.add_argument("--save", help="Guardar resultados en JSON")
+    parser.add_argument("--baseline", help="JSON de una ejecución anterior para detectar regresiones")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Margen permitido frente a --baseline (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf = args.pdf
+        if not pdf:
+            pdf = os.path.join(tmp, "bench.pdf")
+            make_test_pdf(pdf, args.pages)
+        results = run_all(pdf, args.scales, args.pipelines)
+    print_table(results)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        if problems:
+            print("\nRegresiones:")
+            for p in problems:
+                print(f"  - {p}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1165 @@
+"""Motor sin interfaz de pdf_coor: documentos, render, coordenadas y relleno de plantillas.
+
+No importa Tk ni PIL, así que lo pueden usar scripts por lotes, el servicio de
+pdf_fill.py y procesos worker sin abrir ninguna ventana. pdf_coor.py es la interfaz
+Tk encima de este módulo.
+
+    from pdf_engine import Session, TextOverlay
+
+    session = Session.open("contrato.pdf")
+    session.add(TextOverlay(0, 95, 152, "Ana Pérez", size=10, color="#000000"))
+    inserted, pages, mode, seconds, written = session.commit()
+
+Cada PdfDocument lleva su propio candado y su estado (no hay globales), de modo
+que un proceso puede tener varios documentos abiertos a la vez.
+"""
+import bisect
+import hashlib
+import json
+import math
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import fitz  # PyMuPDF
+
+RENDER_COLORSPACE = "rgb"  # Modo de render por defecto (ver RENDER_MODES)
+RENDER_MODES = {"rgb": "Color", "gray": "Grises", "mono": "Blanco y negro"}
+MONO_THRESHOLD = 160  # Nivel de gris a partir del cual un píxel es blanco en modo "mono"
+PAGE_GAP_PX = 12  # Separación entre páginas del modo continuo
+SNAP_GRID_PT = 24  # Lado de cada celda del índice espacial, en puntos PDF
+SNAP_FLAT_PT = 1.5  # Tolerancia para considerar horizontal un trazo
+SNAP_MIN_LENGTH_PT = 8  # Trazos más cortos no cuentan como renglón
+DEFAULT_FONT = "helv"
+DEFAULT_SIZE = 10
+DEFAULT_COLOR = "#000000"
+
+
+# --- Compatibilidad entre versiones de PyMuPDF ---
+def get_pixmap(page_obj, scale_val, clip=None, colorspace: str = "rgb") -> Any:
+    """Compatibilidad entre PyMuPDF 1.19+ (get_pixmap) y versiones antiguas (getPixmap).
+
+    `clip` (en puntos PDF) limita el render a ese rectángulo de la página. Con
+    `colorspace` "gray" o "mono" se rasteriza a un byte por píxel.
+    """
+    mat = fitz.Matrix(scale_val, scale_val)
+    cs = fitz.csRGB if colorspace == "rgb" else fitz.csGRAY
+    get_pm = getattr(page_obj, "get_pixmap", None)
+    if callable(get_pm):
+        return get_pm(matrix=mat, clip=clip, colorspace=cs, alpha=False)  # type: ignore[attr-defined]
+    # Fallback antiguo
+    get_pm_old = getattr(page_obj, "getPixmap", None)
+    if callable(get_pm_old):
+        return get_pm_old(matrix=mat, clip=clip, colorspace=cs, alpha=False)  # type: ignore[attr-defined]
+    raise AttributeError("La página no soporta get_pixmap/getPixmap")
+
+_MONO_TABLE = bytes(0 if v < MONO_THRESHOLD else 255 for v in range(256))
+
+
+def pixmap_ppm(pix, colorspace: str = "rgb") -> bytes:
+    """Compatibilidad entre tobytes (1.18+) y getImageData: PPM (o PGM si es gris) sin compresión.
+
+    Tk lee el PPM directamente, sin pasar por PIL: una sola copia de los píxeles.
+    En "mono" el gris se umbraliza a blanco y negro (sigue siendo un PGM de 8 bits:
+    Tk no lee PBM).
+    """
+    if colorspace == "mono":
+        header = f"P5\n{pix.width} {pix.height}\n255\n".encode("ascii")
+        return header + bytes(pix.samples).translate(_MONO_TABLE)
+    to_bytes = getattr(pix, "tobytes", None)
+    if callable(to_bytes):
+        return to_bytes("ppm")  # type: ignore[misc]
+    get_data_old = getattr(pix, "getImageData", None)
+    if callable(get_data_old):
+        return get_data_old("ppm")  # type: ignore[misc]
+    raise AttributeError("El pixmap no soporta tobytes/getImageData")
+
+
+def insert_text(page_obj, point_xy, text, fontsize=12, color=(1, 0, 0), rotate=0):
+    """Compatibilidad entre insert_text e insertText."""
+    ins = getattr(page_obj, "insert_text", None)
+    if callable(ins):
+        return ins(point_xy, text, fontsize=fontsize, color=color, rotate=rotate)  # type: ignore[attr-defined]
+    ins_old = getattr(page_obj, "insertText", None)
+    if callable(ins_old):
+        return ins_old(point_xy, text, fontsize=fontsize, color=color, rotate=rotate)  # type: ignore[attr-defined]
+    raise AttributeError("La página no soporta insert_text/insertText")
+
+
+def can_save_incrementally(document) -> bool:
+    """Compatibilidad entre can_save_incrementally y canSaveIncrementally."""
+    can = getattr(document, "can_save_incrementally", None) or getattr(document, "canSaveIncrementally", None)
+    try:
+        return bool(can()) if callable(can) else False
+    except Exception:
+        return False
+
+
+def is_dirty(document) -> bool:
+    """Compatibilidad entre is_dirty e isDirty; ante la duda, con cambios."""
+    dirty = getattr(document, "is_dirty", None)
+    if dirty is None:
+        dirty = getattr(document, "isDirty", True)
+    return bool(dirty)
+
+
+def make_doc_key(path: str):
+    """Clave estable del archivo: ruta absoluta + tamaño + fecha de modificación."""
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+
+def hex_to_rgb01(hex_color: str, default=(0.0, 0.0, 0.0)):
+    """"#rrggbb" o "#rgb" a (r, g, b) entre 0 y 1; `default` si no es un color válido."""
+    hex_color = hex_color.lstrip('#')
+    if len(hex_color) == 3:
+        hex_color = ''.join(c*2 for c in hex_color)
+    if len(hex_color) != 6:
+        return default
+    r = int(hex_color[0:2], 16)/255.0
+    g = int(hex_color[2:4], 16)/255.0
+    b = int(hex_color[4:6], 16)/255.0
+    return (r, g, b)
+
+
+def format_bytes(n: int) -> str:
+    if n < 1024:
+        return f"{n} B"
+    if n < 1024 * 1024:
+        return f"{n / 1024:.1f} KB"
+    return f"{n / (1024 * 1024):.1f} MB"
+
+
+# --- Archivos y cachés ---
+def user_cache_dir(*parts) -> str:
+    """Carpeta de caché del usuario: LOCALAPPDATA en Windows, XDG_CACHE_HOME o ~/.cache en el resto."""
+    base = os.environ.get("LOCALAPPDATA") if os.name == "nt" else os.environ.get("XDG_CACHE_HOME")
+    base = base or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pdf_coor", *parts)
+
+
+def _file_sha1(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def write_atomic(path: str, data: bytes):
+    """Escribe a un temporal y lo renombra: otra instancia nunca lee un archivo a medias."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def ppm_size(data) -> Optional[tuple]:
+    """(ancho, alto) de un PPM/PGM binario completo, o None si está truncado o no lo es."""
+    parts = bytes(data[:32]).split(maxsplit=4)
+    if len(parts) < 4 or parts[0] not in (b"P6", b"P5"):
+        return None
+    try:
+        width, height, maxval = int(parts[1]), int(parts[2]), int(parts[3])
+    except ValueError:
+        return None
+    channels = 3 if parts[0] == b"P6" else 1
+    header = len(b" ".join(parts[:4])) + 1
+    if maxval != 255 or len(data) != header + width * height * channels:
+        return None
+    return width, height
+
+
+class RenderCache:
+    """Caché LRU de páginas renderizadas con presupuesto en bytes.
+
+    Las claves son (doc_key, índice de página, escala). Al superar el presupuesto
+    se descartan primero las entradas usadas hace más tiempo.
+    """
+
+    def __init__(self, max_bytes: int, label: str = "Caché"):
+        self.max_bytes = max_bytes
+        self.label = label
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, key) -> Any:
+        """Como get(), pero sin alterar el orden LRU ni los contadores."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry is not None else None
+
+    def contains(self, key) -> bool:
+        """Consulta sin alterar el orden LRU ni los contadores."""
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key, value, nbytes: int):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            # Una entrada mayor que todo el presupuesto no se guarda
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self.current_bytes += nbytes
+            self._evict()
+
+    def rekey(self, old_key, new_key, drop_pages=()):
+        """Pasa las entradas de un documento a otra clave (tras guardarlo en otro archivo),
+        descartando las de `drop_pages`; el orden LRU se conserva."""
+        drop = set(drop_pages)
+        with self._lock:
+            entries: "OrderedDict[tuple, tuple[Any, int]]" = OrderedDict()
+            for key, entry in self._entries.items():
+                if key[0] == old_key:
+                    if key[1] in drop:
+                        self.current_bytes -= entry[1]
+                        continue
+                    key = (new_key,) + key[1:]
+                if key in entries:
+                    self.current_bytes -= entries[key][1]
+                entries[key] = entry
+            self._entries = entries
+
+    def invalidate(self, key_doc, page_index: Optional[int] = None):
+        """Descarta las entradas de un documento (o de una sola de sus páginas)."""
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] == key_doc and (page_index is None or key[1] == page_index):
+                    self.current_bytes -= self._entries.pop(key)[1]
+
+    def set_max_bytes(self, max_bytes: int):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def summary(self) -> str:
+        mb = self.current_bytes / (1024 * 1024)
+        return f"{self.label}: {self.hits} aciertos / {self.misses} fallos · {len(self._entries)} elem. · {mb:.1f}/{self.max_bytes / (1024 * 1024):.0f} MB"
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self.current_bytes -= nbytes
+
+
+class DiskRasterCache:
+    """Caché en disco de páginas renderizadas, compartida entre sesiones e instancias.
+
+    Cada página es un PPM (cabecera corta + píxeles crudos), así que un acierto es
+    mapear el archivo y pasárselo a Tk sin decodificar nada. Las claves son
+    (hash del contenido, página, escala, espacio de color); el orden LRU es la fecha
+    de modificación, que se renueva en cada acierto. Un alias (ruta, tamaño, fecha)
+    -> hash evita releer el archivo entero al reabrirlo. Varias instancias pueden
+    compartir la carpeta: se escribe a un temporal y se renombra, y los fallos al
+    borrar o reemplazar un archivo que otra tiene abierto (Windows) se ignoran.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = True  # Lo cambia la interfaz; los workers sólo lo leen
+        self._lock = threading.Lock()
+        self._written = max_bytes  # Fuerza un repaso del tamaño con la primera escritura
+
+    def path(self, content_hash: str, page_index: int, scale_val: float, colorspace: str) -> str:
+        return os.path.join(self.directory, content_hash[:2],
+                            f"{content_hash}_{page_index}_{scale_val:g}_{colorspace}.ppm")
+
+    def _alias_path(self, doc_key) -> str:
+        name = hashlib.sha1(repr(doc_key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, "alias", f"{name}.txt")
+
+    def lookup_hash(self, doc_key) -> Optional[str]:
+        """Hash del contenido ya calculado para esta clave (make_doc_key), o None."""
+        path = self._alias_path(doc_key)
+        try:
+            with open(path, "r", encoding="ascii") as f:
+                h = f.read().strip()
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return h if len(h) == 40 else None
+
+    def remember_hash(self, doc_key, content_hash: str):
+        try:
+            write_atomic(self._alias_path(doc_key), content_hash.encode("ascii"))
+        except OSError:
+            pass
+
+    def get(self, path: str) -> Optional[bytes]:
+        try:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if ppm_size(mm) is None:
+                    raise ValueError(path)
+                data = mm[:]
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)  # Recién usado
+        except OSError:
+            pass
+        return data
+
+    def put(self, path: str, data: bytes):
+        try:
+            write_atomic(path, data)
+        except OSError:
+            return
+        with self._lock:
+            self._written += len(data)
+            # Repasar el tamaño total cuesta un listado: sólo cada ~10% del tope escrito
+            if self._written < self.max_bytes // 10:
+                return
+            self._written = 0
+        self.evict()
+
+    def evict(self):
+        """Borra los archivos usados hace más tiempo hasta quedar en el 90% del tope."""
+        files = []
+        total = 0
+        try:
+            for sub in os.scandir(self.directory):
+                if not sub.is_dir():
+                    continue
+                for entry in os.scandir(sub.path):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((st.st_mtime, st.st_size, entry.path))
+                    total += st.st_size
+        except OSError:
+            return
+        if total <= self.max_bytes:
+            return
+        files.sort()
+        target = self.max_bytes * 9 // 10
+        for _mtime, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass  # Otra instancia lo está usando o ya lo borró
+
+
+# --- Coordenadas: disposición de páginas y ajuste a renglones ---
+class PageLayout:
+    """Posición en el canvas de cada página del modo continuo: una columna, centradas."""
+
+    __slots__ = ("key", "offsets", "sizes", "width", "height")
+
+    def __init__(self, key, sizes_pt, scale_val: float, gap: int = PAGE_GAP_PX):
+        self.key = key
+        self.sizes = [(int(round(w * scale_val)), int(round(h * scale_val))) for w, h in sizes_pt]
+        self.width = max((w for w, _ in self.sizes), default=0) + 2 * gap
+        self.offsets = []
+        y = gap
+        for _, h in self.sizes:
+            self.offsets.append(y)
+            y += h + gap
+        self.height = y
+
+    def origin(self, page_index: int):
+        return (self.width - self.sizes[page_index][0]) // 2, self.offsets[page_index]
+
+    def page_at(self, y: float) -> int:
+        """Página cuya franja (incluida la separación inferior) contiene la coordenada y."""
+        i = bisect.bisect_right(self.offsets, y) - 1
+        return min(max(i, 0), len(self.offsets) - 1)
+
+
+class PageIndex:
+    """Rejilla uniforme de segmentos horizontales de una página para ajustar clics.
+
+    Cada segmento es (x0, x1, y, tipo), en coordenadas de pantalla de la página
+    (ya rotada) y en puntos PDF: líneas base de texto ("texto"), líneas dibujadas,
+    bordes de recuadros y renglones de guiones bajos ("línea"). Una consulta sólo
+    mira las celdas dentro del radio, así que no depende de cuántos elementos
+    tenga la página.
+    """
+
+    __slots__ = ("cell", "segments", "grid")
+
+    def __init__(self, segments, cell: float = SNAP_GRID_PT):
+        self.cell = cell
+        self.segments = segments
+        self.grid: Dict[tuple, List[int]] = {}
+        for i, (x0, x1, y, _kind) in enumerate(segments):
+            cy = int(y // cell)
+            for cx in range(int(x0 // cell), int(x1 // cell) + 1):
+                self.grid.setdefault((cx, cy), []).append(i)
+
+    def __len__(self):
+        return len(self.segments)
+
+    def nearest(self, x: float, y: float, radius: float):
+        """Segmento más cercano a (x, y) dentro de `radius`, o None."""
+        cell = self.cell
+        best, best_d = None, radius
+        seen = set()
+        for cy in range(int((y - radius) // cell), int((y + radius) // cell) + 1):
+            for cx in range(int((x - radius) // cell), int((x + radius) // cell) + 1):
+                for i in self.grid.get((cx, cy), ()):
+                    if i in seen:
+                        continue
+                    seen.add(i)
+                    x0, x1, sy, _kind = self.segments[i]
+                    dx = max(x0 - x, 0.0, x - x1)
+                    d = math.hypot(dx, sy - y)
+                    if d <= best_d:
+                        best, best_d = self.segments[i], d
+        return best
+
+    def snap(self, x: float, y: float, radius: float):
+        """(x, y, tipo) ajustado al segmento más cercano; tipo None si no hay ninguno cerca."""
+        seg = self.nearest(x, y, radius)
+        if seg is None:
+            return x, y, None
+        x0, x1, sy, kind = seg
+        # En x se ajusta al inicio o fin del renglón si está cerca; si no, se queda dentro
+        if abs(x - x0) <= radius:
+            x = x0
+        elif abs(x - x1) <= radius:
+            x = x1
+        else:
+            x = min(max(x, x0), x1)
+        return x, sy, kind
+
+
+def build_page_index(page_obj) -> PageIndex:
+    """Extrae líneas base de texto y trazos horizontales. Llamar con el candado del documento tomado."""
+    get_text = getattr(page_obj, "get_text", None) or getattr(page_obj, "getText")
+    get_drawings = getattr(page_obj, "get_drawings", None) or getattr(page_obj, "getDrawings", None)
+    rot = page_obj.rotation_matrix if hasattr(page_obj, "rotation_matrix") else fitz.Matrix(1, 1)
+    text = get_text("dict")
+    drawings = get_drawings() if callable(get_drawings) else []
+    segments = []
+
+    def add(p, q, kind):
+        # A coordenadas de pantalla; sólo interesan los tramos que quedan horizontales
+        p, q = fitz.Point(p) * rot, fitz.Point(q) * rot
+        if abs(p.y - q.y) <= SNAP_FLAT_PT and abs(p.x - q.x) >= SNAP_MIN_LENGTH_PT:
+            segments.append((min(p.x, q.x), max(p.x, q.x), (p.y + q.y) / 2, kind))
+
+    for block in text.get("blocks", ()):
+        for line in block.get("lines", ()):
+            for span in line.get("spans", ()):
+                x0, _y0, x1, _y1 = span["bbox"]
+                base_y = span["origin"][1]
+                kind = "línea" if span["text"].strip().strip("_.") == "" else "texto"
+                add((x0, base_y), (x1, base_y), kind)
+    for path in drawings:
+        for item in path.get("items", ()):
+            if item[0] == "l":
+                add(item[1], item[2], "línea")
+            elif item[0] == "re":
+                r = item[1]
+                if r.height <= SNAP_FLAT_PT * 2:
+                    add((r.x0, (r.y0 + r.y1) / 2), (r.x1, (r.y0 + r.y1) / 2), "línea")
+                else:
+                    # Los cuatro bordes: con la página rotada los horizontales son otros
+                    for p, q in ((r.tl, r.tr), (r.bl, r.br), (r.tl, r.bl), (r.tr, r.br)):
+                        add(p, q, "línea")
+    return PageIndex(segments)
+
+
+# --- Búsqueda de texto ---
+def _normalize_word(word: str) -> str:
+    """Minúsculas, sin acentos ni puntuación en los extremos: "Folio:" -> "folio"."""
+    word = unicodedata.normalize("NFD", word.lower())
+    word = "".join(c for c in word if not unicodedata.combining(c))
+    return word.strip(".,;:!?¿¡()[]{}\"'«»*")
+
+
+class TextIndex:
+    """Índice invertido de palabras con su rectángulo en pantalla, página por página.
+
+    Se llena en segundo plano (SearchWorker) y se consulta desde el hilo de Tk;
+    una consulta sólo recorre las apariciones de la primera palabra buscada.
+    """
+
+    def __init__(self, key_doc, page_count: int):
+        self.doc_key = key_doc
+        self.page_count = page_count
+        self.version = 0  # Cambia con cada página indexada o reindexada
+        self._lock = threading.Lock()
+        self._words: Dict[int, list] = {}  # página -> [(normalizada, fitz.Rect)] en orden de lectura
+        self._postings: Dict[str, List[tuple]] = {}  # palabra -> [(página, posición)]
+
+    @property
+    def pages_done(self) -> int:
+        return len(self._words)
+
+    def add_page(self, page_index: int, words):
+        """Indexa (o reemplaza) una página; `words` es [(texto, fitz.Rect)] en orden de lectura."""
+        entries = [(w, r) for w, r in ((_normalize_word(t), r) for t, r in words) if w]
+        with self._lock:
+            if page_index in self._words:
+                for token in {w for w, _ in self._words[page_index]}:
+                    self._postings[token] = [p for p in self._postings[token] if p[0] != page_index]
+            self._words[page_index] = entries
+            for pos, (token, _rect) in enumerate(entries):
+                self._postings.setdefault(token, []).append((page_index, pos))
+            self.version += 1
+
+    def search(self, query: str, limit: int = 500):
+        """Lista de (página, [rects]) de la frase buscada; la última palabra vale como prefijo."""
+        tokens = [t for t in (_normalize_word(w) for w in query.split()) if t]
+        if not tokens:
+            return []
+        hits = []
+        with self._lock:
+            if len(tokens) == 1:
+                starts = [p for token, postings in self._postings.items() if token.startswith(tokens[0]) for p in postings]
+            else:
+                starts = list(self._postings.get(tokens[0], ()))
+            for page_index, pos in sorted(starts):
+                words = self._words[page_index]
+                if pos + len(tokens) > len(words):
+                    continue
+                if all(words[pos + i][0] == tokens[i] for i in range(1, len(tokens) - 1)) and \
+                        words[pos + len(tokens) - 1][0].startswith(tokens[-1]):
+                    hits.append((page_index, [words[pos + i][1] for i in range(len(tokens))]))
+                    if len(hits) >= limit:
+                        break
+        return hits
+
+
+# --- Documentos y sesiones de edición ---
+class TextOverlay:
+    """Texto pendiente de insertar en una página; posición en coordenadas de pantalla
+    (puntos PDF sobre la página rotada, origen arriba a la izquierda del CropBox)."""
+
+    __slots__ = ("page", "x", "y", "text", "size", "color", "family", "bg_color")
+
+    def __init__(self, page_index: int, x: float, y: float, text: str, size: int = 12,
+                 color: str = "#ff0000", family: str = "Arial", bg_color: Optional[str] = None):
+        self.page = page_index
+        self.x = x
+        self.y = y
+        self.text = text
+        self.size = size
+        self.color = color
+        self.family = family
+        self.bg_color = bg_color  # None = sin fondo
+
+
+class PdfDocument:
+    """Un PDF abierto con su candado y lo que se sabe de él: clave, hash, tamaños y páginas tocadas.
+
+    Todo uso del documento de PyMuPDF (`doc`, o `documento[i]`) va con `lock` tomado.
+    Los métodos de esta clase lo toman solos y, como es reentrante, también se pueden
+    llamar con él tomado. Quien comparte el documento con sus hilos (la interfaz Tk)
+    pasa su propio candado.
+    """
+
+    def __init__(self, path: str, lock=None, disk_cache: Optional[DiskRasterCache] = None):
+        self.path = path
+        self.lock = lock if lock is not None else threading.RLock()
+        self.disk_cache = disk_cache
+        self.doc = fitz.open(path)
+        # Tras guardar pasa a ser la del archivo guardado: el original conserva la suya y sus
+        # entradas de caché (quien guarda mueve las de las páginas no tocadas, ver RenderCache.rekey)
+        self.key = make_doc_key(path)
+        self.saved_paths: set = set()  # Archivos donde ya se guardó algo en esta sesión
+        self.modified_pages: set = set()  # Cambiadas en memoria: ya no coinciden con el hash del archivo
+        # Si el archivo ya se abrió antes (misma ruta, tamaño y fecha) el hash está en la caché
+        self._content_hash: Optional[str] = disk_cache.lookup_hash(self.key) if disk_cache is not None else None
+        self._hash_lock = threading.Lock()
+        self._sizes: Optional[list] = None
+
+    def __getitem__(self, page_index: int):
+        return self.doc[page_index]
+
+    def __len__(self) -> int:
+        return self.doc.page_count
+
+    @property
+    def page_count(self) -> int:
+        return self.doc.page_count
+
+    @property
+    def is_repaired(self) -> bool:
+        """MuPDF tuvo que reconstruir la tabla de objetos al abrirlo (archivo dañado)."""
+        return bool(getattr(self.doc, "is_repaired", getattr(self.doc, "isRepaired", False)))
+
+    def close(self):
+        """Suelta el archivo; cerrar dos veces no hace nada."""
+        with self.lock:
+            if not getattr(self.doc, "is_closed", False):
+                self.doc.close()
+
+    @property
+    def sizes_loaded(self) -> bool:
+        return self._sizes is not None
+
+    def page_sizes(self, progress: Optional[Callable[[int, int], bool]] = None) -> Optional[list]:
+        """(ancho, alto) en puntos de cada página ya rotada; se leen una sola vez.
+
+        Se leen página a página con el candado, sin frenar al render. Si
+        `progress(leídas, total)` devuelve False se abandona y se devuelve None.
+        """
+        if self._sizes is None:
+            with self.lock:
+                total = self.doc.page_count
+            sizes = []
+            for i in range(total):
+                with self.lock:
+                    r = self.doc[i].rect
+                sizes.append((r.width, r.height))
+                if progress is not None and progress(i + 1, total) is False:
+                    return None
+            self._sizes = sizes
+        return self._sizes
+
+    def outline(self) -> list:
+        """Índice (marcadores) del PDF: [nivel, título, página desde 1]."""
+        with self.lock:
+            get_toc = getattr(self.doc, "get_toc", None) or getattr(self.doc, "getToC")
+            return get_toc(simple=True)
+
+    def metadata(self) -> Dict[str, Any]:
+        with self.lock:
+            return dict(self.doc.metadata or {})
+
+    def content_hash(self) -> str:
+        """SHA-1 del archivo tal como se abrió, calculado una sola vez ("" si no se puede leer).
+
+        Lee el archivo entero: se llama desde un hilo de fondo (OpenWorker), nunca antes
+        de pintar. Quien no puede esperar usa known_content_hash.
+        """
+        with self._hash_lock:
+            if self._content_hash is None:
+                key = self.key  # Un guardado puede cambiarla mientras tanto: el alias va con la leída
+                try:
+                    self._content_hash = _file_sha1(key[0])
+                except OSError:
+                    self._content_hash = ""
+                if self._content_hash and self.disk_cache is not None:
+                    self.disk_cache.remember_hash(key, self._content_hash)
+            return self._content_hash
+
+    @property
+    def known_content_hash(self) -> Optional[str]:
+        """El hash si ya se conoce (alias en la caché o ya calculado); None sin bloquear."""
+        return self._content_hash or None
+
+    def disk_path(self, page_index: int, scale_val: float, colorspace: str = RENDER_COLORSPACE) -> Optional[str]:
+        """Ruta de la página en la caché en disco, o None si no aplica (sin caché, desactivada,
+        página modificada o hash aún sin calcular: no se lee el archivo entero antes de pintar)."""
+        cache = self.disk_cache
+        if cache is None or not cache.enabled or page_index in self.modified_pages:
+            return None
+        h = self.known_content_hash
+        return cache.path(h, page_index, scale_val, colorspace) if h else None
+
+    def render(self, page_index: int, scale_val: float, clip=None, colorspace: str = RENDER_COLORSPACE,
+               abort: Optional[Callable[[], bool]] = None) -> Optional[tuple]:
+        """(ancho, alto, PPM) de la página, o sólo de `clip` (en puntos PDF) si se indica.
+
+        Las páginas completas pasan por la caché en disco. `abort()` se consulta con el
+        candado tomado justo antes de rasterizar: si devuelve True no se renderiza y se
+        devuelve None.
+        """
+        disk = self.disk_path(page_index, scale_val, colorspace) if clip is None else None
+        data = self.disk_cache.get(disk) if disk else None
+        if data is not None:
+            width, height = ppm_size(data)
+            return width, height, data
+        with self.lock:
+            if abort is not None and abort():
+                return None
+            pix: Any = get_pixmap(self.doc[page_index], scale_val, clip=clip, colorspace=colorspace)
+        # La codificación PPM no necesita el documento: fuera del candado
+        width, height, data = pix.width, pix.height, pixmap_ppm(pix, colorspace)
+        del pix
+        if disk:
+            self.disk_cache.put(disk, data)
+        return width, height, data
+
+    def page_index(self, page_index: int) -> PageIndex:
+        """Índice espacial de renglones de una página (ver PageIndex)."""
+        with self.lock:
+            return build_page_index(self.doc[page_index])
+
+    def words(self, page_index: int) -> list:
+        """[(texto, fitz.Rect en pantalla)] de una página, en orden de lectura."""
+        with self.lock:
+            page_obj = self.doc[page_index]
+            get_text = getattr(page_obj, "get_text", None) or getattr(page_obj, "getText")
+            raw = get_text("words")
+            rot = page_obj.rotation_matrix if hasattr(page_obj, "rotation_matrix") else fitz.Matrix(1, 1)
+        raw.sort(key=lambda w: (w[5], w[6], w[7]))  # bloque, línea, palabra
+        return [(w[4], (fitz.Rect(w[:4]) * rot).normalize()) for w in raw]
+
+    def insert_overlays(self, overlays) -> List[int]:
+        """Escribe los textos en sus páginas. Devuelve las páginas tocadas (pasan a modified_pages)."""
+        touched = sorted({ov.page for ov in overlays})
+        with self.lock:
+            for page_index in touched:
+                page_obj = self.doc[page_index]
+                for ov in overlays:
+                    if ov.page == page_index:
+                        # insert_text trabaja sin rotar: se deshace la rotación y se gira el texto con la página
+                        insert_text(page_obj, fitz.Point(ov.x, ov.y) * page_obj.derotation_matrix, ov.text,
+                                    fontsize=ov.size, color=hex_to_rgb01(ov.color, (1.0, 0.0, 0.0)),
+                                    rotate=page_obj.rotation)
+        self.modified_pages.update(touched)
+        return touched
+
+    def _swap(self, new_doc):
+        old, self.doc = self.doc, new_doc
+        if not getattr(old, "is_closed", False):
+            old.close()
+
+    def _prepare_incremental(self, out_path: str) -> bool:
+        """Deja como documento de trabajo una copia en out_path que admita guardado incremental.
+
+        La primera vez se copia el archivo original tal cual (sin reescribir objetos) y se
+        reabre; a partir de ahí cada guardado sólo añade los objetos modificados al final.
+        """
+        if _same_file(getattr(self.doc, "name", None), out_path):
+            return can_save_incrementally(self.doc)
+        src = getattr(self.doc, "name", None)
+        # Sólo si lo que hay en memoria es exactamente el archivo en disco, y nunca encima
+        # de un archivo que ya tiene guardados anteriores de este documento
+        if not src or not os.path.isfile(src) or is_dirty(self.doc) or make_doc_key(src) != self.key:
+            return False
+        if any(_same_file(p, out_path) for p in self.saved_paths):
+            return False
+        shutil.copyfile(src, out_path)
+        new_doc = fitz.open(out_path)
+        if not can_save_incrementally(new_doc):
+            new_doc.close()
+            return False
+        self._swap(new_doc)
+        return True
+
+    def save(self, out_path: str, compact: bool = False,
+             apply_changes: Optional[Callable[["PdfDocument"], Any]] = None) -> tuple:
+        """Aplica los cambios con apply_changes(documento) y guarda en out_path.
+
+        Incremental siempre que se pueda; completo (con garbage/deflate si `compact`) si no.
+        Después `doc` es siempre el archivo guardado (los siguientes guardados parten de él)
+        y `key` pasa a ser la de out_path. Devuelve (modo, segundos, bytes escritos).
+        """
+        with self.lock:
+            t0 = time.perf_counter()
+            incremental = not compact and self._prepare_incremental(out_path)
+            if apply_changes is not None:
+                apply_changes(self)
+            if incremental:
+                before = os.path.getsize(out_path)
+                self.doc.save(out_path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+                mode, written = "incremental", os.path.getsize(out_path) - before
+            else:
+                opts = {"garbage": 3, "deflate": True} if compact else {}
+                mode = "compactado" if compact else "completo"
+                if not _same_file(getattr(self.doc, "name", None), out_path):
+                    self.doc.save(out_path, **opts)
+                else:
+                    # Un guardado completo no puede escribir sobre el archivo abierto: temporal, cerrar y reemplazar
+                    # (en Windows el archivo no se puede reemplazar mientras está abierto)
+                    tmp = out_path + ".tmp"
+                    self.doc.save(tmp, **opts)
+                    self.doc.close()
+                    os.replace(tmp, out_path)
+                # Seguir desde lo guardado: el siguiente guardado no debe partir del original
+                self._swap(fitz.open(out_path))
+                written = os.path.getsize(out_path)
+            self.saved_paths.add(os.path.abspath(out_path))
+            self.key = make_doc_key(out_path)
+            return mode, time.perf_counter() - t0, written
+
+
+def _same_file(a: Optional[str], b: Optional[str]) -> bool:
+    return bool(a and b) and os.path.normcase(os.path.abspath(a)) == os.path.normcase(os.path.abspath(b))
+
+
+def default_output_path(path: str) -> str:
+    """contrato.pdf -> contrato_modificado.pdf (el original nunca se sobrescribe)."""
+    base, ext = os.path.splitext(path)
+    return f"{base}_modificado{ext or '.pdf'}"
+
+
+class Session:
+    """Sesión de edición de un documento: los overlays pendientes y el archivo donde se guardan."""
+
+    def __init__(self, document: PdfDocument, out_path: Optional[str] = None):
+        self.document = document
+        self.out_path = out_path or default_output_path(document.path)
+        self.overlays: List[TextOverlay] = []  # En orden de creación
+
+    @classmethod
+    def open(cls, path: str, out_path: Optional[str] = None, **kwargs) -> "Session":
+        """Abre el PDF (kwargs van a PdfDocument) y empieza una sesión sobre él."""
+        return cls(PdfDocument(path, **kwargs), out_path)
+
+    def add(self, overlay: TextOverlay) -> TextOverlay:
+        self.overlays.append(overlay)
+        return overlay
+
+    def remove(self, overlay: TextOverlay):
+        self.overlays.remove(overlay)
+
+    def on_page(self, page_index: int) -> List[TextOverlay]:
+        return [ov for ov in self.overlays if ov.page == page_index]
+
+    def commit(self, compact: bool = False) -> tuple:
+        """Inserta todos los overlays con texto y guarda una sola vez en out_path.
+
+        Devuelve (overlays insertados, páginas tocadas, modo, segundos, bytes escritos).
+        Lanza ValueError si no hay nada que insertar.
+        """
+        pending = [ov for ov in self.overlays if ov.text]
+        if not pending:
+            raise ValueError("No hay overlays para insertar.")
+        touched: List[int] = []
+        mode, seconds, written = self.document.save(
+            self.out_path, compact, lambda document: touched.extend(document.insert_overlays(pending)))
+        self.overlays.clear()
+        return len(pending), touched, mode, seconds, written
+
+
+
+# --- Relleno de plantillas (ver pdf_fill.py) ---
+# Las coordenadas de los campos son las de pantalla del editor: puntos PDF sobre la
+# página ya rotada, con origen arriba a la izquierda del área visible (CropBox) e
+# (x, y) = inicio de la línea base. TemplateFiller, pdf_user_point (pdf-lib) y
+# PdfDocument.insert_overlays las convierten igual, así que las tres salidas coinciden.
+def fit_text(font, text: str, size: float, max_width: Optional[float], ellipsis: str = "…") -> str:
+    """Recorta `text` con "…" para que no pase de max_width puntos (None = sin límite).
+
+    Es la misma regla que fitText() en los módulos generados para pdf-lib, para que
+    pdf_fill y el servidor corten los textos en el mismo sitio.
+    """
+    if max_width is None or font.text_length(text, fontsize=size) <= max_width:
+        return text
+    limit = max_width - font.text_length(ellipsis, fontsize=size)
+    used = 0.0
+    for i, ch in enumerate(text):
+        used += font.text_length(ch, fontsize=size)
+        if used > limit:
+            return text[:i].rstrip() + ellipsis
+    return text
+
+
+def load_template(path: str) -> Dict[str, Any]:
+    """Lee y normaliza una plantilla de campos. Lanza ValueError si es inválida."""
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    if not isinstance(raw, dict) or not isinstance(raw.get("fields"), dict) or not raw.get("template"):
+        raise ValueError(f"{path}: se esperaba un objeto con 'template' y 'fields'")
+    base_dir = os.path.dirname(os.path.abspath(path))
+    template_pdf = raw["template"]
+    if not os.path.isabs(template_pdf):
+        template_pdf = os.path.join(base_dir, template_pdf)
+    fields = []
+    for name, spec in raw["fields"].items():
+        try:
+            fields.append({
+                "name": name,
+                "page": int(spec.get("page", 0)),
+                "x": float(spec["x"]),
+                "y": float(spec["y"]),
+                "size": float(spec.get("size", DEFAULT_SIZE)),
+                "color": hex_to_rgb01(spec.get("color", DEFAULT_COLOR)),
+                "font": spec.get("font", DEFAULT_FONT),
+                "max_width": float(spec["max_width"]) if spec.get("max_width") is not None else None,
+            })
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"{path}: campo '{name}' inválido ({e})")
+    return {"template": template_pdf, "fields": fields}
+
+
+class TemplateFiller:
+    """Plantilla cargada una sola vez: bytes del PDF, fuentes y campos validados.
+
+    Cada fila vuelve a abrir la plantilla (desde los bytes, o desde el archivo de salida
+    si se guarda incremental), escribe los campos con un TextWriter por página y color,
+    y guarda. Lo que se ahorra por fila es leer el disco, validar y cargar las fuentes.
+    """
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.fields = spec["fields"]
+        with open(spec["template"], "rb") as f:
+            self.pdf_bytes = f.read()
+        with fitz.open("pdf", self.pdf_bytes) as template:
+            for fld in self.fields:
+                if not 0 <= fld["page"] < template.page_count:
+                    raise ValueError(f"Campo '{fld['name']}': la plantilla no tiene página {fld['page']}")
+            # Guardado incremental = plantilla intacta + sólo los objetos nuevos al final
+            self.incremental = can_save_incrementally(template)
+        self._fonts: Dict[str, Any] = {}
+        for fld in self.fields:
+            self._font(fld["font"])
+
+    def _font(self, name: str):
+        font = self._fonts.get(name)
+        if font is None:
+            if name.lower().endswith((".ttf", ".otf")):
+                font = fitz.Font(fontfile=name)
+            else:
+                font = fitz.Font(fontname=name)
+            self._fonts[name] = font
+        return font
+
+    def apply(self, doc, row: Dict[str, Any]) -> int:
+        """Escribe en `doc` los valores de la fila. Devuelve cuántos campos se escribieron."""
+        writers: Dict[tuple, Any] = {}
+        written = 0
+        for fld in self.fields:
+            value = row.get(fld["name"])
+            text = "" if value is None else str(value).strip()
+            if not text:
+                continue
+            key = (fld["page"], fld["color"])
+            page_obj = doc[fld["page"]]
+            tw = writers.get(key)
+            if tw is None:
+                tw = writers[key] = fitz.TextWriter(page_obj.rect)
+            font = self._font(fld["font"])
+            text = fit_text(font, text, fld["size"], fld["max_width"])
+            tw.append(writer_point(page_obj, fld["x"], fld["y"]), text, font=font, fontsize=fld["size"])
+            written += 1
+        for (page_index, color), tw in writers.items():
+            # Girado con la página: en pantalla se lee horizontal, como en el editor
+            tw.write_text(doc[page_index], color=color, matrix=fitz.Matrix(doc[page_index].rotation))
+        return written
+
+    def fill_to_file(self, row: Dict[str, Any], out_path: str):
+        if self.incremental:
+            with open(out_path, "wb") as f:
+                f.write(self.pdf_bytes)
+            doc = fitz.open(out_path)
+            try:
+                self.apply(doc, row)
+                doc.save(out_path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+            finally:
+                doc.close()
+            return
+        doc = fitz.open("pdf", self.pdf_bytes)
+        try:
+            self.apply(doc, row)
+            doc.save(out_path, garbage=1, deflate=True)
+        finally:
+            doc.close()
+
+    def fill_to_bytes(self, row: Dict[str, Any]) -> bytes:
+        # PyMuPDF sólo guarda incremental sobre el archivo del que se abrió el documento,
+        # así que se pasa por un temporal; aun así, con el contrato (600 KB) sale unas
+        # cuatro veces más rápido que reescribirlo completo con tobytes()
+        if self.incremental:
+            fd, tmp = tempfile.mkstemp(suffix=".pdf")
+            os.close(fd)
+            try:
+                self.fill_to_file(row, tmp)
+                with open(tmp, "rb") as f:
+                    return f.read()
+            finally:
+                os.remove(tmp)
+        doc = fitz.open("pdf", self.pdf_bytes)
+        try:
+            self.apply(doc, row)
+            return doc.tobytes(deflate=True)
+        finally:
+            doc.close()
+
+
+# --- Exportación a pdf-lib (server/libs/contracts.js) ---
+# Nombre PostScript de la fuente base-14 -> clave de StandardFonts en pdf-lib
+PDFLIB_STANDARD_FONTS = {
+    "Helvetica": "Helvetica",
+    "Helvetica-Bold": "HelveticaBold",
+    "Helvetica-Oblique": "HelveticaOblique",
+    "Helvetica-BoldOblique": "HelveticaBoldOblique",
+    "Times-Roman": "TimesRoman",
+    "Times-Bold": "TimesRomanBold",
+    "Times-Italic": "TimesRomanItalic",
+    "Times-BoldItalic": "TimesRomanBoldItalic",
+    "Courier": "Courier",
+    "Courier-Bold": "CourierBold",
+    "Courier-Oblique": "CourierOblique",
+    "Courier-BoldOblique": "CourierBoldOblique",
+}
+# Lo que WinAnsi (la codificación de las fuentes estándar de pdf-lib) tiene fuera de U+0020..U+00FF
+WINANSI_EXTRA = "€‚ƒ„…†‡ˆ‰Š‹ŒŽ‘’“”•–—˜™š›œžŸ"
+
+_PDFLIB_HELPERS_JS = """
+function advance(metrics, ch) {
+  const c = ch.codePointAt(0);
+  const w = c - metrics.first < metrics.widths.length && c >= metrics.first
+    ? metrics.widths[c - metrics.first]
+    : metrics.extra[ch];
+  return w == null ? metrics.missing : w;
+}
+
+/** Ancho en puntos de `text` con la fuente y el tamaño del campo (sin medir nada en pdf-lib). */
+export function textWidth(text, field, size = field.size) {
+  const metrics = FONT_METRICS[field.font];
+  let units = 0;
+  for (const ch of String(text)) units += advance(metrics, ch);
+  return (units * size) / 1000;
+}
+
+/** Recorta `text` con "…" para que quepa en field.maxWidth (null = sin límite). */
+export function fitText(text, field, ellipsis = '\\u2026') {
+  const t = String(text ?? '').trim();
+  if (field.maxWidth == null || textWidth(t, field) <= field.maxWidth) return t;
+  const metrics = FONT_METRICS[field.font];
+  const limit = (field.maxWidth * 1000) / field.size - textWidth(ellipsis, field, 1000);
+  let used = 0;
+  let end = 0;
+  for (const ch of t) {
+    used += advance(metrics, ch);
+    if (used > limit) break;
+    end += ch.length;
+  }
+  return t.slice(0, end).trimEnd() + ellipsis;
+}
+"""
+
+
+def pdf_user_point(page_obj, x: float, y: float) -> tuple:
+    """(x, y) de pantalla (página ya rotada, origen arriba a la izquierda del CropBox)
+    -> espacio de usuario del PDF (origen abajo a la izquierda), que es el de pdf-lib.
+
+    No se usa page.transformation_matrix: en páginas rotadas con CropBox desplazado
+    no descuenta el desplazamiento.
+    """
+    p = fitz.Point(x, y) * page_obj.derotation_matrix
+    crop, media = page_obj.cropbox, page_obj.mediabox
+    return p.x + crop.x0, media.y1 - crop.y0 - p.y
+
+
+def writer_point(page_obj, x: float, y: float) -> tuple:
+    """Dónde hacer TextWriter.append para que write_text(página, matrix=Matrix(rotación))
+    deje la línea base en (x, y) de pantalla, como pdf_user_point.
+
+    write_text voltea y con la altura de page.rect y antepone un desplazamiento por
+    CropBox/MediaBox (más la diferencia alto - ancho en páginas a 90/270); aquí se deshace.
+    """
+    ux, uy = pdf_user_point(page_obj, x, y)
+    rect, cb, mb = page_obj.rect, page_obj.cropbox_position, page_obj.mediabox
+    delta = rect.height - rect.width if page_obj.rotation in (90, 270) else 0
+    v = fitz.Point(ux - cb.x, uy - cb.y - mb.y0 + delta) * ~fitz.Matrix(page_obj.rotation)
+    return v.x, rect.height - v.y
+
+
+def glyph_advances(font) -> Dict[str, Any]:
+    """Avances en milésimas de em para todo WinAnsi: widths[c - first] de U+0020 a U+00FF y
+    `extra` para el resto. `missing` (el avance más ancho) cubre cualquier otro carácter
+    sin quedarse corto al recortar."""
+    def adv(ch):
+        return round(font.glyph_advance(ord(ch)) * 1000) if font.has_glyph(ord(ch)) else None
+
+    widths = [adv(chr(c)) if not 0x7F <= c <= 0x9F else None for c in range(0x20, 0x100)]
+    extra = {ch: adv(ch) for ch in WINANSI_EXTRA if adv(ch) is not None}
+    known = [w for w in widths if w is not None] + list(extra.values())
+    return {"first": 0x20, "widths": widths, "extra": extra, "missing": max(known, default=1000)}
+
+
+def compile_pdflib_module(spec: Dict[str, Any], source: str = "") -> str:
+    """Genera un módulo ES con COORDS, FONT_METRICS, textWidth() y fitText() para pdf-lib.
+
+    Cada campo queda con x/y en el espacio de usuario del PDF (descontados alto de
+    página, CropBox y /Rotate), `rotate` para que el texto salga derecho en páginas
+    rotadas, maxWidth en puntos y la fuente como clave de StandardFonts (o fontFile
+    para .ttf/.otf). La salida no lleva fecha: la misma plantilla da el mismo archivo.
+    Lanza ValueError si una fuente no se puede usar en pdf-lib.
+    """
+    metrics: Dict[str, Any] = {}
+    coords: Dict[str, Any] = {}
+    template = fitz.open(spec["template"])
+    try:
+        for fld in spec["fields"]:
+            if not 0 <= fld["page"] < template.page_count:
+                raise ValueError(f"Campo '{fld['name']}': la plantilla no tiene página {fld['page']}")
+            name = fld["font"]
+            font_file = None
+            if name.lower().endswith((".ttf", ".otf")):
+                font = fitz.Font(fontfile=name)
+                key, font_file = os.path.splitext(os.path.basename(name))[0], name.replace("\\", "/")
+            else:
+                font = fitz.Font(fontname=name)
+                key = PDFLIB_STANDARD_FONTS.get(font.name)
+                if key is None:
+                    raise ValueError(f"Campo '{fld['name']}': la fuente '{name}' no tiene equivalente en pdf-lib")
+            if key not in metrics:
+                metrics[key] = glyph_advances(font)
+            page_obj = template[fld["page"]]
+            x, y = pdf_user_point(page_obj, fld["x"], fld["y"])
+            entry = {
+                "page": fld["page"],
+                "x": round(x, 2),
+                "y": round(y, 2),
+                "size": fld["size"],
+                "font": key,
+                "color": [round(c, 4) for c in fld["color"]],
+                "rotate": page_obj.rotation,
+                "maxWidth": round(fld["max_width"], 2) if fld["max_width"] is not None else None,
+            }
+            if font_file:
+                entry["fontFile"] = font_file
+            coords[fld["name"]] = entry
+        info = {
+            "file": os.path.basename(spec["template"]),
+            "sha1": _file_sha1(spec["template"]),
+            "pages": template.page_count,
+        }
+    finally:
+        template.close()
+
+    out = [
+        f"// Generado por pdf_coor a partir de {source or 'una plantilla de campos'}. No editar a mano:",
+        "// recalibrar en pdf_coor y volver a exportar.",
+        "//",
+        "// x, y: línea base del texto en el espacio de usuario del PDF (origen abajo a la izquierda).",
+        "// Uso con pdf-lib:",
+        "//   const f = COORDS.nombres;",
+        "//   pdfDoc.getPage(f.page).drawText(fitText(valor, f), {",
+        "//     x: f.x, y: f.y, size: f.size, font: fuentes[f.font], color: rgb(...f.color), rotate: degrees(f.rotate),",
+        "//   });",
+        "// donde fuentes[clave] = await pdfDoc.embedFont(StandardFonts[clave]).",
+        "",
+        f"export const TEMPLATE = {json.dumps(info, ensure_ascii=False)};",
+        "",
+        "// Avances en milésimas de em (ver glyph_advances en pdf_engine.py)",
+        "export const FONT_METRICS = {",
+    ]
+    out += [f"  {json.dumps(key)}: {json.dumps(m, ensure_ascii=False)}," for key, m in metrics.items()]
+    out += ["};", "", "export const COORDS = {"]
+    out += [f"  {json.dumps(name, ensure_ascii=False)}: {json.dumps(c, ensure_ascii=False)},"
+            for name, c in coords.items()]
+    out.append("};")
+    return "\n".join(out) + "\n" + _PDFLIB_HELPERS_JS
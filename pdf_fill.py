@@ -0,0 +1,388 @@
+"""Relleno de plantillas PDF sin interfaz, con las coordenadas calibradas en pdf_coor.py.
+
+Plantilla de campos (JSON). Las coordenadas son las que muestra pdf_coor: puntos PDF
+sobre la página tal como se ve (ya rotada), con origen arriba a la izquierda del área
+visible (CropBox) y x, y = inicio de la línea base. Con /Rotate o CropBox desplazado
+el texto cae igual que en el editor, horizontal en pantalla:
+
+    {
+      "template": "client/public/CONTRATO_C_E_E_A.pdf",
+      "fields": {
+        "nombres": {"page": 0, "x": 95, "y": 152, "size": 10},
+        "folio_formateado": {"x": 450, "y": 92, "size": 12, "color": "#bf0000", "font": "hebo"}
+      }
+    }
+
+``template`` es relativo al JSON. ``font`` acepta los nombres base-14 de PyMuPDF
+(helv, hebo, tiro, cour…) o la ruta a un .ttf/.otf. ``max_width`` (puntos, opcional)
+recorta el texto con "…" para que no se salga del renglón. Valores por defecto:
+page 0, size 10, color negro, font helv, sin ancho máximo.
+
+La carga de plantillas y el relleno (``load_template``, ``TemplateFiller``) están en
+pdf_engine.py; aquí quedan el CLI por lotes y el servicio.
+
+Uso:
+    python pdf_fill.py batch plantilla.json alumnos.csv -o contratos/ --name "{folio_formateado}.pdf"
+    python pdf_fill.py batch plantilla.json alumnos.jsonl -o contratos/ --workers 8
+    python pdf_fill.py serve --templates plantillas/ --port 8765 --workers 4
+    python pdf_fill.py pdflib plantilla.json -o server/libs/contratoCoords.js
+
+``pdflib`` genera un módulo ES con COORDS (ya en coordenadas de pdf-lib, origen abajo
+a la izquierda) y tablas de avances de la fuente, para que el servidor Node recorte
+con fitText() sin medir texto (lo mismo que el botón "Exportar a pdf-lib" de pdf_coor).
+
+Servicio local (``serve``), sólo en 127.0.0.1 por defecto:
+    POST /fill/<plantilla>   cuerpo JSON {campo: valor}  -> application/pdf
+    GET  /templates          plantillas disponibles
+    GET  /metrics            latencias p50/p95/p99 por plantilla
+    GET  /health
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional
+
+from pdf_engine import TemplateFiller, compile_pdflib_module, load_template, write_atomic
+
+CHUNK_SIZE = 64  # Filas por tarea enviada al pool (menos ida y vuelta entre procesos)
+SERVICE_PORT = 8765
+METRICS_WINDOW = 1000  # Peticiones recientes usadas para los percentiles
+MAX_BODY_BYTES = 1024 * 1024
+
+
+def read_rows(path: str) -> Iterator[Dict[str, Any]]:
+    """Filas de un CSV (con encabezados) o de un JSONL (un objeto por línea)."""
+    if path.lower().endswith((".jsonl", ".ndjson")):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            yield from csv.DictReader(f)
+
+
+_SAFE_NAME = re.compile(r'[<>:"/\\|?*\x00-\x1f]+')
+
+
+def output_name(pattern: str, row: Dict[str, Any], index: int) -> str:
+    """Nombre de archivo a partir del patrón (`{campo}` y `{_n}` = número de fila)."""
+    values = {k: ("" if v is None else str(v)) for k, v in row.items()}
+    values["_n"] = index
+    try:
+        name = pattern.format(**values)
+    except (KeyError, IndexError, ValueError):
+        name = f"{index:05d}.pdf"
+    name = _SAFE_NAME.sub("_", name).strip() or f"{index:05d}.pdf"
+    return name if name.lower().endswith(".pdf") else name + ".pdf"
+
+
+# --- Pool de procesos: cada worker carga la plantilla una vez ---
+_worker_filler: Optional[TemplateFiller] = None
+
+
+def _init_worker(spec: Dict[str, Any]):
+    global _worker_filler
+    _worker_filler = TemplateFiller(spec)
+
+
+def _fill_chunk(jobs: List[tuple]) -> List[tuple]:
+    """Rellena un bloque de (índice, fila, ruta). Devuelve los errores (índice, mensaje)."""
+    errors = []
+    assert _worker_filler is not None
+    for index, row, out_path in jobs:
+        try:
+            _worker_filler.fill_to_file(row, out_path)
+        except Exception as e:
+            errors.append((index, str(e)))
+    return errors
+
+
+def fill_batch(spec: Dict[str, Any], rows, out_dir: str, name_pattern: str = "{_n:05d}.pdf",
+               workers: Optional[int] = None) -> Dict[str, Any]:
+    """Genera un PDF por fila en `out_dir` usando un pool de procesos."""
+    os.makedirs(out_dir, exist_ok=True)
+    t0 = time.perf_counter()
+    chunks: List[List[tuple]] = [[]]
+    used = set()
+    total = 0
+    for index, row in enumerate(rows):
+        name = output_name(name_pattern, row, index)
+        # Nombres repetidos (p. ej. folio vacío) no se pisan entre sí
+        if name in used:
+            name = f"{os.path.splitext(name)[0]}_{index:05d}.pdf"
+        used.add(name)
+        if len(chunks[-1]) >= CHUNK_SIZE:
+            chunks.append([])
+        chunks[-1].append((index, row, os.path.join(out_dir, name)))
+        total += 1
+    errors: List[tuple] = []
+    if total:
+        workers = workers or os.cpu_count() or 1
+        workers = max(1, min(workers, len(chunks)))
+        if workers == 1:
+            _init_worker(spec)
+            for chunk in chunks:
+                errors.extend(_fill_chunk(chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(spec,)) as pool:
+                futures = [pool.submit(_fill_chunk, chunk) for chunk in chunks]
+                for fut in as_completed(futures):
+                    errors.extend(fut.result())
+    elapsed = time.perf_counter() - t0
+    return {"total": total, "ok": total - len(errors), "errors": sorted(errors), "seconds": elapsed}
+
+
+# --- Servicio local: plantillas, fuentes y campos en caliente en cada worker ---
+_worker_templates: Dict[str, tuple] = {}  # ruta JSON -> ((mtime JSON, mtime PDF), TemplateFiller, ruta PDF)
+
+
+def _warm_filler(path: str) -> TemplateFiller:
+    """Filler en caché del proceso; se recarga si cambió en disco el JSON o el PDF de la plantilla."""
+    mtime = os.stat(path).st_mtime_ns
+    cached = _worker_templates.get(path)
+    if cached is None or cached[0] != (mtime, os.stat(cached[2]).st_mtime_ns):
+        spec = load_template(path)
+        # La fecha del PDF se toma antes de leerlo: si cambia mientras tanto, se recarga la próxima vez
+        stamp = (mtime, os.stat(spec["template"]).st_mtime_ns)
+        cached = _worker_templates[path] = (stamp, TemplateFiller(spec), spec["template"])
+    return cached[1]
+
+
+def _init_service_worker(paths: List[str]):
+    for path in paths:
+        try:
+            _warm_filler(path)
+        except Exception:
+            pass  # Una plantilla rota se reporta cuando se pide
+
+
+def _service_fill(path: str, values: Dict[str, Any]) -> tuple:
+    t0 = time.perf_counter()
+    data = _warm_filler(path).fill_to_bytes(values)
+    return data, (time.perf_counter() - t0) * 1000
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Rango más cercano: el menor valor con al menos pct% de la muestra por debajo o igual
+    k = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+class LatencyStats:
+    """Ventana deslizante de latencias por plantilla (thread-safe)."""
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+        self._counts: Dict[str, List[int]] = {}  # plantilla -> [ok, errores]
+
+    def record(self, template: str, total_ms: float, fill_ms: float, ok: bool):
+        # Los errores sólo se cuentan: su latencia (sin relleno) falsearía los percentiles
+        with self._lock:
+            samples = self._samples.setdefault(template, deque(maxlen=self.window))
+            if ok:
+                samples.append((total_ms, fill_ms))
+            counts = self._counts.setdefault(template, [0, 0])
+            counts[0 if ok else 1] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        out = {}
+        with self._lock:
+            for template, samples in self._samples.items():
+                total = sorted(s[0] for s in samples)
+                fill = sorted(s[1] for s in samples)
+                ok, errors = self._counts[template]
+                out[template] = {
+                    "ok": ok,
+                    "errors": errors,
+                    "window": len(samples),
+                    "total_ms": {p: round(_percentile(total, q), 2) for p, q in (("p50", 50), ("p95", 95), ("p99", 99))},
+                    "fill_ms": {p: round(_percentile(fill, q), 2) for p, q in (("p50", 50), ("p95", 95), ("p99", 99))},
+                }
+        return out
+
+
+class FillService:
+    """Pool de procesos con las plantillas de una carpeta precargadas en cada worker."""
+
+    def __init__(self, templates_dir: str, workers: Optional[int] = None):
+        self.templates_dir = os.path.abspath(templates_dir)
+        self.workers = workers or os.cpu_count() or 1
+        self.stats = LatencyStats()
+        paths = [self.template_path(n) for n in self.template_names()]
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_service_worker,
+                                        initargs=([p for p in paths if p],))
+
+    def template_names(self) -> List[str]:
+        try:
+            return sorted(n[:-5] for n in os.listdir(self.templates_dir) if n.endswith(".json"))
+        except OSError:
+            return []
+
+    def template_path(self, name: str) -> Optional[str]:
+        # Sólo nombres simples: nada de rutas fuera de la carpeta de plantillas
+        if not re.fullmatch(r"[\w.-]+", name) or name.startswith("."):
+            return None
+        path = os.path.join(self.templates_dir, name if name.endswith(".json") else name + ".json")
+        return path if os.path.isfile(path) else None
+
+    def fill(self, name: str, values: Dict[str, Any]) -> tuple:
+        """Devuelve (bytes del PDF, ms de relleno en el worker)."""
+        path = self.template_path(name)
+        if path is None:
+            raise FileNotFoundError(name)
+        return self.pool.submit(_service_fill, path, values).result()
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _make_handler(service: FillService):
+    class FillHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive para el cliente Node
+
+        def log_message(self, format, *args):  # noqa: A002 - firma de BaseHTTPRequestHandler
+            pass
+
+        def _send_json(self, status: int, payload: Any, close: bool = False):
+            """`close`: el cuerpo de la petición quedó sin leer; se cierra la conexión
+            para que esos bytes no se lean como la siguiente petición (keep-alive)."""
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            if close:
+                self.send_header("Connection", "close")
+                self.close_connection = True
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, {"ok": True, "workers": service.workers})
+            elif self.path == "/templates":
+                self._send_json(200, {"templates": service.template_names()})
+            elif self.path == "/metrics":
+                self._send_json(200, service.stats.snapshot())
+            else:
+                self._send_json(404, {"error": "Ruta no encontrada"})
+
+        def do_POST(self):
+            if not self.path.startswith("/fill/"):
+                self._send_json(404, {"error": "Ruta no encontrada"})
+                return
+            t0 = time.perf_counter()
+            name = self.path[len("/fill/"):]
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                self._send_json(400, {"error": "Content-Length inválido"}, close=True)
+                return
+            if length > MAX_BODY_BYTES:
+                self._send_json(413, {"error": "Cuerpo demasiado grande"}, close=True)
+                return
+            try:
+                values = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(values, dict):
+                    raise ValueError("Se esperaba un objeto JSON {campo: valor}")
+            except ValueError as e:
+                self._send_json(400, {"error": f"JSON inválido: {e}"})
+                return
+            try:
+                data, fill_ms = service.fill(name, values)
+            except FileNotFoundError:
+                self._send_json(404, {"error": f"Plantilla '{name}' no encontrada"})
+                return
+            except Exception as e:
+                service.stats.record(name, (time.perf_counter() - t0) * 1000, 0.0, ok=False)
+                self._send_json(500, {"error": str(e)})
+                return
+            total_ms = (time.perf_counter() - t0) * 1000
+            service.stats.record(name, total_ms, fill_ms, ok=True)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("X-Fill-Ms", f"{fill_ms:.2f}")
+            self.send_header("X-Total-Ms", f"{total_ms:.2f}")
+            self.end_headers()
+            self.wfile.write(data)
+
+    return FillHandler
+
+
+def serve(templates_dir: str, host: str = "127.0.0.1", port: int = SERVICE_PORT, workers: Optional[int] = None):
+    service = FillService(templates_dir, workers)
+    httpd = ThreadingHTTPServer((host, port), _make_handler(service))
+    httpd.daemon_threads = True
+    print(f"Servicio de relleno en http://{host}:{port} · {service.workers} workers · plantillas: {', '.join(service.template_names()) or '(ninguna)'}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        service.close()
+
+
+def _cmd_serve(args) -> int:
+    serve(args.templates, args.host, args.port, args.workers)
+    return 0
+
+
+def _cmd_batch(args) -> int:
+    spec = load_template(args.template)
+    stats = fill_batch(spec, read_rows(args.rows), args.out, args.name, args.workers)
+    rate = stats["ok"] / stats["seconds"] if stats["seconds"] else 0.0
+    print(f"{stats['ok']}/{stats['total']} PDFs en {stats['seconds']:.2f} s ({rate:.0f}/s) -> {args.out}")
+    for index, msg in stats["errors"]:
+        print(f"  fila {index}: {msg}", file=sys.stderr)
+    return 1 if stats["errors"] else 0
+
+
+def _cmd_pdflib(args) -> int:
+    spec = load_template(args.template)
+    out = args.out or os.path.splitext(args.template)[0] + ".coords.js"
+    write_atomic(os.path.abspath(out), compile_pdflib_module(spec, os.path.basename(args.template)).encode("utf-8"))
+    print(f"{len(spec['fields'])} campos -> {out}")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Relleno de plantillas PDF calibradas con pdf_coor")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_batch = sub.add_parser("batch", help="Un PDF por fila de un CSV/JSONL")
+    p_batch.add_argument("template", help="Plantilla de campos (JSON)")
+    p_batch.add_argument("rows", help="Filas: .csv con encabezados o .jsonl")
+    p_batch.add_argument("-o", "--out", default="salida_pdf", help="Carpeta de salida")
+    p_batch.add_argument("--name", default="{_n:05d}.pdf", help="Patrón de nombre, p. ej. '{folio_formateado}.pdf'")
+    p_batch.add_argument("--workers", type=int, default=None, help="Procesos (por defecto, núcleos de CPU)")
+    p_batch.set_defaults(func=_cmd_batch)
+    p_serve = sub.add_parser("serve", help="Servicio HTTP local con plantillas en caliente")
+    p_serve.add_argument("--templates", default="plantillas", help="Carpeta con las plantillas de campos (*.json)")
+    p_serve.add_argument("--host", default="127.0.0.1")
+    p_serve.add_argument("--port", type=int, default=SERVICE_PORT)
+    p_serve.add_argument("--workers", type=int, default=None, help="Procesos de relleno (por defecto, núcleos de CPU)")
+    p_serve.set_defaults(func=_cmd_serve)
+    p_js = sub.add_parser("pdflib", help="Módulo JS con COORDS y métricas de fuente para pdf-lib")
+    p_js.add_argument("template", help="Plantilla de campos (JSON)")
+    p_js.add_argument("-o", "--out", default=None, help="Archivo .js (por defecto, junto a la plantilla)")
+    p_js.set_defaults(func=_cmd_pdflib)
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
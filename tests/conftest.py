@@ -0,0 +1,5 @@
+import os
+import sys
+
+# pdf_engine.py, pdf_fill.py y pdf_coor.py viven en la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
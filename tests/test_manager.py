@@ -0,0 +1,131 @@
+"""Partes de client/src/components/tools/manager.py que no necesitan ventana."""
+import os
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "client", "src", "components", "tools"))
+import manager  # noqa: E402
+
+
+def _sample(t, latency_ms, api_ok=True, db_ok=True):
+    return {"time": t, "latency_ms": latency_ms, "status": 200 if api_ok else None, "api_ok": api_ok,
+            "db_ok": db_ok if api_ok else None, "error": None, "server_time": None}
+
+
+def test_health_percentiles_only_cover_their_window():
+    stats = manager.HealthStats()
+    now = 10_000.0
+    for age, latency in ((900, 500.0), (200, 100.0), (50, 10.0), (30, 20.0), (10, None)):
+        stats.add(_sample(now - age, latency, api_ok=latency is not None))
+    assert stats.percentiles(60, now) == (2, 10.0, 20.0, 20.0)  # Sin la muestra caída (sin latencia)
+    assert stats.percentiles(300, now) == (3, 20.0, 100.0, 100.0)
+    assert stats.percentiles(900, now) == (4, 20.0, 500.0, 500.0)
+    assert [s["event"] for s in stats.events()] == ["ok -> api caída"]
+
+
+@pytest.mark.parametrize("body", [b"null", b"[1, 2]", b'"ok"'])
+def test_health_check_counts_unexpected_json_as_failed(body):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        monitor = manager.HealthMonitor(port=httpd.server_address[1])
+        sample = monitor.check()
+        monitor._close()
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+    assert sample["error"] == "respuesta JSON inesperada"
+    assert manager.HealthStats.state_of(sample) == "api caída"
+
+
+def test_port_probe_counts_failures_as_down_and_closes_sockets(monkeypatch):
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    closed_port = socket.socket()
+    closed_port.bind(("127.0.0.1", 0))  # Reservado pero sin escuchar
+    opened = []
+    real_socket = socket.socket
+
+    def tracking_socket(*args):
+        s = real_socket(*args)
+        opened.append(s)
+        return s
+
+    monkeypatch.setattr(manager.socket, "socket", tracking_socket)
+    up, down = listener.getsockname()[1], closed_port.getsockname()[1]
+    try:
+        results = manager.PortMonitor([up, down, "no-es-puerto", 70000], timeout=1.0).probe_all()
+    finally:
+        listener.close()
+        closed_port.close()
+    assert results[up] is not None and results[up] >= 0
+    assert results[down] is None and results["no-es-puerto"] is None and results[70000] is None
+    assert len(opened) == 4 and all(s.fileno() == -1 for s in opened)
+
+
+def _run(scheduler, timeout=10.0):
+    """Lo que hace pump_jobs, sin Tk: devuelve [(id, evento)] en orden."""
+    events = []
+    deadline = time.time() + timeout
+    while any(j.status in manager.JOB_ACTIVE for j in scheduler.jobs):
+        assert time.time() < deadline, "los trabajos no terminaron"
+        for job in scheduler.running:
+            job.proc.drain()
+            if scheduler.reap(job): events.append((job.id, job.status))
+        started, dropped = scheduler.schedule()
+        events += [(j.id, "corriendo") for j in started] + [(j.id, j.status) for j in dropped]
+        time.sleep(0.01)
+    return events
+
+
+def test_jobs_sharing_a_lock_run_in_submission_order():
+    scheduler = manager.JobScheduler(max_concurrency=3)
+    first = scheduler.submit(f'"{sys.executable}" -c "import time; time.sleep(0.3)"', locks={manager.LOCK_GIT})
+    second = scheduler.submit("echo dos", locks={manager.LOCK_GIT})
+    free = scheduler.submit("echo libre")
+    events = _run(scheduler)
+    assert events.index((free.id, "corriendo")) < events.index((first.id, "ok"))  # Sin lock no espera
+    assert events.index((first.id, "ok")) < events.index((second.id, "corriendo"))
+    assert [j.status for j in scheduler.jobs] == ["ok", "ok", "ok"]
+
+
+def test_failed_dependency_skips_dependents_unless_unchecked():
+    scheduler = manager.JobScheduler()
+    failed = scheduler.submit("exit 3")
+    skipped = scheduler.submit("echo nunca", after=[failed])
+    unchecked = scheduler.submit("exit 128", check=False)  # Como taskkill sin nada que matar
+    follows = scheduler.submit("echo sigue", after=[unchecked])
+    _run(scheduler)
+    assert (failed.status, failed.returncode) == ("error", 3)
+    assert skipped.status == "omitido" and skipped.proc is None
+    assert (unchecked.status, unchecked.returncode) == ("ok", 128)
+    assert follows.status == "ok"
+
+
+def test_job_that_cannot_launch_keeps_its_error(monkeypatch):
+    def broken(*args):
+        raise OSError("sin shell")
+
+    monkeypatch.setattr(manager, "StreamedProcess", broken)
+    scheduler = manager.JobScheduler()
+    job = scheduler.submit("echo x")
+    assert job.error is None
+    assert scheduler.schedule() == ([], [job])
+    assert (job.status, job.error) == ("error", "sin shell")
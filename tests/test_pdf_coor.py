@@ -0,0 +1,150 @@
+"""Lógica de pdf_coor que no necesita pantalla: se sustituyen los pocos widgets que toca."""
+import types
+
+import fitz  # PyMuPDF
+import pytest
+
+import pdf_coor
+from pdf_engine import RENDER_COLORSPACE, Session, TextOverlay, make_doc_key
+
+
+@pytest.fixture
+def editor(tmp_path, monkeypatch):
+    doc = fitz.open()
+    for _ in range(3):
+        doc.new_page(width=400, height=600)
+    path = str(tmp_path / "contrato.pdf")
+    doc.save(path)
+    doc.close()
+    session = Session.open(path)
+    monkeypatch.setattr(pdf_coor, "session", session)
+    monkeypatch.setattr(pdf_coor, "doc", session.document)
+    monkeypatch.setattr(pdf_coor, "doc_key", session.document.key)
+    monkeypatch.setattr(pdf_coor, "page", session.document[0])
+    monkeypatch.setattr(pdf_coor, "current_page_index", 0)
+    monkeypatch.setattr(pdf_coor, "page_indexes", {0: "índice 0", 1: "índice 1"})
+    monkeypatch.setattr(pdf_coor, "page_indexes_key", session.document.key)
+    monkeypatch.setattr(pdf_coor, "messagebox", types.SimpleNamespace(showinfo=lambda *a: None, showerror=pytest.fail,
+                                                                     showwarning=pytest.fail))
+    monkeypatch.setattr(pdf_coor, "load_page", lambda *a, **k: None)
+    monkeypatch.setattr(pdf_coor, "_schedule_thumb_update", lambda: None)
+    monkeypatch.setattr(pdf_coor, "_update_overlay_count", lambda: None)
+    for cache in ("render_cache", "tile_cache", "thumb_cache"):
+        monkeypatch.setattr(pdf_coor, cache, pdf_coor.RenderCache(1 << 20))
+    yield session
+    session.document.close()
+
+
+def test_commit_rekeys_caches_and_drops_touched_pages(editor):
+    """Lo renderizado desde la copia guardada nunca queda con la clave del original."""
+    original_key = pdf_coor.doc_key
+    for page_index in range(3):
+        pdf_coor.render_cache.put(pdf_coor._page_key(original_key, page_index, 1.0), f"p{page_index}", 10)
+        pdf_coor.tile_cache.put(pdf_coor._tile_key(original_key, page_index, 1.0, 0, 0), f"t{page_index}", 10)
+        pdf_coor.thumb_cache.put((original_key, page_index, pdf_coor.THUMB_WIDTH), f"m{page_index}", 10)
+    editor.add(TextOverlay(1, 100.0, 150.0, "HOLA"))
+    pdf_coor.on_overlay_commit()
+
+    new_key = pdf_coor.doc_key
+    assert new_key == make_doc_key(editor.out_path) != original_key
+    for cache in (pdf_coor.render_cache, pdf_coor.tile_cache, pdf_coor.thumb_cache):
+        assert not any(key[0] == original_key for key in cache._entries)
+        assert sorted(key[1] for key in cache._entries) == [0, 2]  # La página 1 se tocó
+    assert pdf_coor.render_cache.peek((new_key, 0, 1.0, RENDER_COLORSPACE)) == "p0"
+    assert pdf_coor.page_indexes == {0: "índice 0"}
+    assert pdf_coor.page_indexes_key == new_key
+
+
+
+def test_opening_another_file_closes_the_previous_document(editor, tmp_path, monkeypatch):
+    previous = editor.document
+    other = str(tmp_path / "otro.pdf")
+    with fitz.open() as doc:
+        doc.new_page()
+        doc.save(other)
+    document = pdf_coor.PdfDocument(other, lock=pdf_coor.doc_lock)
+    widget = types.SimpleNamespace(delete=lambda *a: None, title=lambda *a: None, config=lambda **k: None)
+    for name in ("thumb_canvas", "root"):
+        monkeypatch.setattr(pdf_coor, name, widget)
+    monkeypatch.setattr(pdf_coor, "open_timing", {})
+    monkeypatch.setattr(pdf_coor, "_update_search_label", lambda: None)
+    monkeypatch.setattr(pdf_coor, "_set_outline", lambda items: None)
+    generation = pdf_coor.render_generation
+    pdf_coor._deliver_open(types.SimpleNamespace(path=other), ("doc", document, 0.0, False))
+    assert previous.doc.is_closed
+    assert pdf_coor.doc is document and pdf_coor.doc_key == document.key
+    assert pdf_coor.render_generation > generation  # Lo que se estaba renderizando del anterior se abandona
+    document.close()
+
+
+def test_overlay_is_drawn_from_its_baseline(editor, monkeypatch):
+    """(x, y) del overlay es la línea base, como en el PDF: el item (nw) sube un ascenso y al soltarlo se deshace."""
+    items = {}
+
+    def create_text(x, y, **options):
+        items[7] = [x, y]
+        assert options["anchor"] == "nw"
+        return 7
+
+    def coords(item_id, *xy):
+        if xy:
+            items[item_id] = list(xy)
+        return items[item_id]
+
+    fnt = types.SimpleNamespace(measure=lambda text: 10 * len(text))
+    monkeypatch.setattr(pdf_coor, "scale", 2.0)
+    monkeypatch.setattr(pdf_coor, "cont_layout", None)
+    monkeypatch.setattr(pdf_coor, "_overlay_font", lambda family, pixels: (fnt, 30, 24))
+    monkeypatch.setattr(pdf_coor, "_mark_active_overlay", lambda: None)
+    monkeypatch.setattr(pdf_coor, "overlay_items", {})
+    monkeypatch.setattr(pdf_coor, "canvas", types.SimpleNamespace(create_text=create_text, coords=coords,
+                                                                  canvasx=lambda x: x, canvasy=lambda y: y))
+    ov = pdf_coor.Overlay(0, 100.0, 150.0, "HOLA")
+    pdf_coor._draw_one_overlay(ov)
+    assert items[7] == [200.0, 300.0 - 24]
+    assert pdf_coor._overlay_bbox(ov) == (200.0, 276.0, 240.0, 306.0)
+
+    monkeypatch.setattr(pdf_coor, "active_overlay", ov)
+    monkeypatch.setattr(pdf_coor, "overlay_dragging", True)
+    monkeypatch.setattr(pdf_coor, "_get_mode", lambda: "move")
+    pdf_coor.on_mouse_up(types.SimpleNamespace(x=0, y=0))
+    assert (ov.page, ov.x, ov.y) == (0, pytest.approx(100), pytest.approx(150))
+
+
+def test_overlay_font_size_is_in_pixels(monkeypatch):
+    created = []
+
+    class FakeFont:
+        def __init__(self, **options):
+            created.append(options)
+
+        def metrics(self, name):
+            return {"linespace": 30, "ascent": 24}[name]
+
+    monkeypatch.setattr(pdf_coor.tkfont, "Font", FakeFont)
+    monkeypatch.setattr(pdf_coor, "overlay_fonts", pdf_coor.OrderedDict())
+    fnt, linespace, ascent = pdf_coor._overlay_font("Arial", 24)
+    assert created == [{"family": "Arial", "size": -24}]  # El canvas ya está escalado: píxeles, no puntos
+    assert (linespace, ascent) == (30, 24)
+    assert pdf_coor._overlay_font("Arial", 24)[0] is fnt
+
+
+def test_overlay_drag_across_pages_commits_to_drop_page(editor, monkeypatch):
+    """Arrastrar un overlay a la página siguiente en modo continuo lo guarda en esa página."""
+    monkeypatch.setattr(pdf_coor, "scale", 1.0)
+    monkeypatch.setattr(pdf_coor, "cont_layout", pdf_coor.PageLayout((pdf_coor.doc_key, 1.0), [(400, 600)] * 3, 1.0))
+    ov = pdf_coor.Overlay(0, 100.0, 550.0, "HOLA")
+    ov.item_id = 1
+    ov.drawn = ("HOLA", None, "#000000", 40, 30, 24)  # El item (nw) queda un ascenso, 24, sobre la línea base
+    editor.add(ov)
+    ox, oy = pdf_coor.cont_layout.origin(1)
+    monkeypatch.setattr(pdf_coor, "active_overlay", ov)
+    monkeypatch.setattr(pdf_coor, "overlay_dragging", True)
+    monkeypatch.setattr(pdf_coor, "_get_mode", lambda: "move")
+    monkeypatch.setattr(pdf_coor, "canvas", types.SimpleNamespace(canvasx=lambda x: x, canvasy=lambda y: y,
+                                                                  coords=lambda *a: (ox + 100, oy + 16)))
+    pdf_coor.on_mouse_up(types.SimpleNamespace(x=0, y=0))
+    assert (ov.page, ov.x, ov.y) == (1, pytest.approx(100), pytest.approx(40))
+    pdf_coor.on_overlay_commit()
+    with fitz.open(editor.out_path) as out:
+        assert [p.get_text().strip() for p in out] == ["", "HOLA", ""]
@@ -0,0 +1,177 @@
+import os
+
+import fitz  # PyMuPDF
+import pytest
+
+import pdf_engine
+from pdf_engine import DiskRasterCache, PdfDocument, RenderCache, Session, TemplateFiller, TextOverlay, make_doc_key
+
+
+def _screen_bbox(page, text):
+    words = page.get_text("words")
+    assert [w[4] for w in words] == [text]
+    return (fitz.Rect(words[0][:4]) * page.rotation_matrix).normalize()
+
+
+def _template(tmp_path, rotation, cropbox=None):
+    doc = fitz.open()
+    page = doc.new_page(width=400, height=600)
+    if cropbox:
+        page.set_cropbox(fitz.Rect(cropbox))
+    page.set_rotation(rotation)
+    path = str(tmp_path / "plantilla.pdf")
+    doc.save(path)
+    doc.close()
+    return path
+
+
+@pytest.mark.parametrize("cropbox", [None, (20, 30, 380, 560)])
+@pytest.mark.parametrize("rotation", [0, 90, 180, 270])
+def test_fill_places_text_at_screen_coordinates(tmp_path, rotation, cropbox):
+    """El campo cae donde se ve en el editor: (x, y) de pantalla, línea base, texto horizontal."""
+    field = {"name": "nombre", "page": 0, "x": 100.0, "y": 150.0, "size": 12.0,
+             "color": (0, 0, 0), "font": "helv", "max_width": None}
+    filler = TemplateFiller({"template": _template(tmp_path, rotation, cropbox), "fields": [field]})
+    out = fitz.open("pdf", filler.fill_to_bytes({"nombre": "HOLA"}))
+    bbox = _screen_bbox(out[0], "HOLA")
+    width = fitz.Font("helv").text_length("HOLA", fontsize=12)
+    assert bbox.x0 == pytest.approx(100, abs=0.5)
+    assert bbox.x1 == pytest.approx(100 + width, abs=0.5)
+    # Horizontal en pantalla: la caja es más ancha que alta y la línea base queda dentro
+    assert bbox.width > bbox.height
+    assert bbox.y0 < 150 < bbox.y1
+
+
+@pytest.mark.parametrize("cropbox", [None, (20, 30, 380, 560)])
+@pytest.mark.parametrize("rotation", [0, 90, 180, 270])
+def test_overlays_match_template_fill(tmp_path, rotation, cropbox):
+    """Un overlay del editor y un campo de plantilla en el mismo punto caen en el mismo sitio."""
+    path = _template(tmp_path, rotation, cropbox)
+    document = PdfDocument(path)
+    document.insert_overlays([TextOverlay(0, 100.0, 150.0, "HOLA", size=12)])
+    overlay_bbox = _screen_bbox(document[0], "HOLA")
+    document.close()
+    field = {"name": "n", "page": 0, "x": 100.0, "y": 150.0, "size": 12.0,
+             "color": (0, 0, 0), "font": "helv", "max_width": None}
+    filled = fitz.open("pdf", TemplateFiller({"template": path, "fields": [field]}).fill_to_bytes({"n": "HOLA"}))
+    fill_bbox = _screen_bbox(filled[0], "HOLA")
+    assert overlay_bbox.x0 == pytest.approx(fill_bbox.x0, abs=0.5)
+    assert overlay_bbox.y1 == pytest.approx(fill_bbox.y1, abs=0.5)
+    assert overlay_bbox.width > overlay_bbox.height
+
+
+def test_render_never_hashes_the_file(tmp_path, monkeypatch):
+    """El primer render no lee el archivo entero; el alias hace que al reabrir se use la caché en disco."""
+    path = _template(tmp_path, 0)
+    cache = DiskRasterCache(str(tmp_path / "cache"), 64 * 1024 * 1024)
+    hashed = []
+    real_sha1 = pdf_engine._file_sha1
+    monkeypatch.setattr(pdf_engine, "_file_sha1", lambda p: hashed.append(p) or real_sha1(p))
+
+    first = PdfDocument(path, disk_cache=cache)
+    assert first.disk_path(0, 1.0) is None
+    assert first.render(0, 1.0) is not None
+    assert hashed == []
+    content_hash = first.content_hash()  # Lo que hace OpenWorker después de pintar
+    assert first.disk_path(0, 1.0) is not None
+    first.close()
+
+    second = PdfDocument(path, disk_cache=cache)
+    assert second.known_content_hash == content_hash
+    assert second.disk_path(0, 1.0) is not None
+    second.close()
+    assert len(hashed) == 1
+
+
+def _cached_size(directory):
+    return sum(entry.stat().st_size for sub in os.scandir(directory) if sub.is_dir() for entry in os.scandir(sub.path))
+
+
+def test_disk_cache_stays_under_its_budget_evicting_least_recently_used(tmp_path):
+    cache = DiskRasterCache(str(tmp_path / "cache"), 10_000)
+    ppm = b"P6\n18 18\n255\n" + bytes(18 * 18 * 3)
+    old = os.path.getmtime(tmp_path) - 1000
+    paths = [cache.path("%040x" % i, 0, 1.0, "rgb") for i in range(30)]
+    for i, path in enumerate(paths):
+        cache.put(path, ppm)
+        os.utime(path, (old + i, old + i))  # Orden de escritura explícito, sin depender de la resolución del reloj
+        if i == 5:
+            assert cache.get(paths[0]) == ppm  # Leerla la renueva
+        assert _cached_size(cache.directory) <= cache.max_bytes
+    kept = [os.path.exists(path) for path in paths]
+    assert kept[0] and not any(kept[1:10]) and all(kept[-9:])
+
+
+def _two_page_pdf(tmp_path):
+    doc = fitz.open()
+    for _ in range(2):
+        doc.new_page(width=400, height=600)
+    path = str(tmp_path / "contrato.pdf")
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def _page_texts(path):
+    with fitz.open(path) as doc:
+        return [page.get_text().strip() for page in doc]
+
+
+def _commit(session, page_index, text, compact=False):
+    session.add(TextOverlay(page_index, 100.0, 150.0, text))
+    return session.commit(compact)[2]
+
+
+@pytest.mark.parametrize("first", ["compactado", "completo", "incremental"])
+def test_commits_accumulate_in_output(tmp_path, first):
+    """Cada guardado parte del anterior, sea cual sea su modo; el original no se toca."""
+    path = _two_page_pdf(tmp_path)
+    original = open(path, "rb").read()
+    session = Session.open(path)
+    if first == "completo":
+        # Cambiar la fecha del original impide la copia incremental: guardado completo
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    modes = [_commit(session, 0, "PRIMERO", compact=first == "compactado"), _commit(session, 1, "SEGUNDO")]
+    assert modes == [first, "incremental"]
+    assert _page_texts(session.out_path) == ["PRIMERO", "SEGUNDO"]
+    assert open(path, "rb").read() == original
+    session.document.close()
+
+
+def test_never_copies_original_over_earlier_commits(tmp_path):
+    path = _two_page_pdf(tmp_path)
+    session = Session.open(path)
+    _commit(session, 0, "PRIMERO")
+    # Documento reabierto por otra vía sobre el original: el guardado no puede partir de él
+    # si out_path ya tiene guardados de esta sesión
+    document = session.document
+    document._swap(fitz.open(path))
+    document.key = make_doc_key(path)
+    assert _commit(session, 1, "SEGUNDO") == "completo"
+    document.close()
+
+
+def test_save_rekeys_document_to_output(tmp_path):
+    """Tras guardar, la clave es la del archivo guardado: el original reabierto no comparte cachés."""
+    path = _two_page_pdf(tmp_path)
+    session = Session.open(path)
+    original_key = session.document.key
+    _commit(session, 0, "PRIMERO")
+    assert session.document.key == make_doc_key(session.out_path)
+    assert make_doc_key(path) == original_key != session.document.key
+    session.document.close()
+
+
+def test_render_cache_rekey_drops_touched_pages():
+    cache = RenderCache(10_000)
+    for page_index in range(3):
+        cache.put(("viejo", page_index, 1.0, "rgb"), f"p{page_index}", 100)
+    cache.put(("otro", 0, 1.0, "rgb"), "otro", 100)
+    cache.rekey("viejo", "nuevo", drop_pages=[1])
+    assert cache.peek(("nuevo", 0, 1.0, "rgb")) == "p0"
+    assert cache.peek(("nuevo", 1, 1.0, "rgb")) is None
+    assert cache.peek(("nuevo", 2, 1.0, "rgb")) == "p2"
+    assert cache.peek(("viejo", 0, 1.0, "rgb")) is None
+    assert cache.peek(("otro", 0, 1.0, "rgb")) == "otro"
+    assert cache.current_bytes == 300
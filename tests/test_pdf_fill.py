@@ -0,0 +1,111 @@
+import json
+import os
+import socket
+import threading
+from http.server import ThreadingHTTPServer
+
+import fitz  # PyMuPDF
+import pytest
+
+import pdf_fill
+from pdf_fill import FillService, LatencyStats, _make_handler, _percentile
+
+
+@pytest.mark.parametrize("n", [1, 2, 10, 99, 100, 101, 102, 1000])
+@pytest.mark.parametrize("pct", [50, 95, 99])
+def test_percentile_nearest_rank(n, pct):
+    """Con los valores 1..n el percentil por rango más cercano es ceil(pct·n/100)."""
+    values = [float(v) for v in range(1, n + 1)]
+    expected = max(1, -(-pct * n // 100))
+    assert _percentile(values, pct) == expected
+
+
+def test_percentile_known_values():
+    assert _percentile([float(v) for v in range(1, 103)], 50) == 51.0  # No 52: sin redondeo bancario
+    assert _percentile([15, 20, 35, 40, 50], 40) == 20
+    assert _percentile([], 50) == 0.0
+
+
+def _read_response(f):
+    status = f.readline().decode()
+    headers = {}
+    while True:
+        line = f.readline().decode().strip()
+        if not line:
+            break
+        key, _, value = line.partition(":")
+        headers[key.strip().lower()] = value.strip()
+    body = f.read(int(headers.get("content-length", 0)))
+    return int(status.split()[1]), headers, body
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_fill, "MAX_BODY_BYTES", 64)
+    service = FillService(str(tmp_path), workers=1)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(service))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd.server_address
+    httpd.shutdown()
+    httpd.server_close()
+    service.close()
+
+
+def test_oversized_body_closes_keepalive_connection(server):
+    """El 413 deja el cuerpo sin leer: la conexión se cierra en vez de leerlo como otra petición."""
+    body = json.dumps({"nombre": "x" * 200}).encode()
+    request = (b"POST /fill/contrato HTTP/1.1\r\nHost: x\r\nContent-Type: application/json\r\n"
+               b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+    followup = b"GET /health HTTP/1.1\r\nHost: x\r\n\r\n"
+    with socket.create_connection(server, timeout=5) as sock:
+        sock.sendall(request + followup)
+        f = sock.makefile("rb")
+        status, headers, _ = _read_response(f)
+        assert status == 413
+        assert headers.get("connection") == "close"
+        assert f.read() == b""  # Nada más: ni un 400 por los restos del cuerpo
+
+
+def test_keepalive_survives_normal_requests(server):
+    with socket.create_connection(server, timeout=5) as sock:
+        sock.sendall(b"GET /health HTTP/1.1\r\nHost: x\r\n\r\n" * 2)
+        f = sock.makefile("rb")
+        assert _read_response(f)[0] == 200
+        assert _read_response(f)[0] == 200
+
+
+def test_latency_percentiles_skip_errors():
+    stats = LatencyStats()
+    for ms in (10.0, 20.0, 30.0):
+        stats.record("contrato", ms, ms / 2, ok=True)
+    stats.record("contrato", 1.0, 0.0, ok=False)
+    stats.record("roto", 1.0, 0.0, ok=False)
+    snapshot = stats.snapshot()
+    assert snapshot["contrato"]["ok"] == 3 and snapshot["contrato"]["errors"] == 1
+    assert snapshot["contrato"]["window"] == 3
+    assert snapshot["contrato"]["fill_ms"]["p50"] == 10.0
+    assert snapshot["roto"] == {"ok": 0, "errors": 1, "window": 0, "total_ms": {"p50": 0.0, "p95": 0.0, "p99": 0.0},
+                                "fill_ms": {"p50": 0.0, "p95": 0.0, "p99": 0.0}}
+
+
+def test_warm_filler_reloads_when_the_pdf_changes(tmp_path, monkeypatch):
+    """Reemplazar el PDF de la plantilla sin tocar el JSON también recarga el filler."""
+    pdf = tmp_path / "contrato.pdf"
+    with fitz.open() as doc:
+        doc.new_page()
+        doc.save(str(pdf))
+    spec = tmp_path / "contrato.json"
+    spec.write_text(json.dumps({"template": "contrato.pdf", "fields": {"nombre": {"x": 50, "y": 50}}}))
+    monkeypatch.setattr(pdf_fill, "_worker_templates", {})
+    first = pdf_fill._warm_filler(str(spec))
+    assert pdf_fill._warm_filler(str(spec)) is first
+    with fitz.open() as doc:
+        doc.new_page()
+        doc.new_page()
+        doc.save(str(pdf))
+    stat = os.stat(pdf)
+    os.utime(pdf, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    second = pdf_fill._warm_filler(str(spec))
+    assert second is not first
+    with fitz.open("pdf", second.pdf_bytes) as doc:
+        assert doc.page_count == 2